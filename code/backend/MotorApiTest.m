@@ -37,7 +37,7 @@ classdef MotorApiTest < matlab.unittest.TestCase
             % Move somewhere first (+30 deg on right hand)
             targetDeg = 30;
             targetTick = MotorApiTest.deg_to_tick(tc.RIGHT_CENTER_TICK, targetDeg);
-            jr = MotorApiTest.httpPost(tc.BaseURL + "/api/motor/move", struct("position", targetDeg));
+            jr = MotorApiTest.httpPost(tc.BaseURL + "/api/motor/move", struct("position", targetDeg, "wait", true));
             tc.verifyEqual(int32(jr.target_tick), targetTick); % Convert to int32
 
             % Now set center to current
@@ -57,13 +57,21 @@ classdef MotorApiTest < matlab.unittest.TestCase
             % We can't directly inspect fake registers here; this only validates clamping works
         end
 
+        function test_move_returns_id_and_long_polls(tc)
+            jr = MotorApiTest.httpPost(tc.BaseURL + "/api/motor/move", struct("position", 5));
+            tc.verifyEqual(string(jr.status), "moving");
+            done = MotorApiTest.httpGet(tc.BaseURL + "/api/motor/move/" + string(jr.move_id) + "?wait=10");
+            tc.verifyEqual(string(done.status), "arrived");
+            tc.verifyEqual(int32(done.target_tick), int32(jr.target_tick));
+        end
+
         function test_move_left_hand_inverts_sign(tc)
             % Switch to left
             r = MotorApiTest.httpPost(tc.BaseURL + "/api/motor/hand", struct("hand","left"));
             tc.verifyEqual(int32(r.center_tick), int32(tc.LEFT_CENTER_TICK)); % Convert both to int32
 
             % Move +30 => requested_degrees should be -30
-            j = MotorApiTest.httpPost(tc.BaseURL + "/api/motor/move", struct("position", 30));
+            j = MotorApiTest.httpPost(tc.BaseURL + "/api/motor/move", struct("position", 30, "wait", true));
             tc.verifyEqual(j.requested_degrees, -30.0);
 
             expectedTick = int32(tc.LEFT_CENTER_TICK + (-30.0 * (4095/360.0)));
@@ -128,7 +136,7 @@ classdef MotorApiTest < matlab.unittest.TestCase
         end
 
         function test_torque_endpoint_and_offset_snapshot(tc)
-            MotorApiTest.httpPost(tc.BaseURL + "/api/motor/move", struct("position", 15));
+            MotorApiTest.httpPost(tc.BaseURL + "/api/motor/move", struct("position", 15, "wait", true));
             rOff = MotorApiTest.httpPost(tc.BaseURL + "/api/motor/torque", struct("torque", false));
             tc.verifyFalse(rOff.torque);
             rOn = MotorApiTest.httpPost(tc.BaseURL + "/api/motor/torque", struct("torque", true));
@@ -0,0 +1,232 @@
+"""
+Serial bus worker for the RehaGrip Dynamixel motor.
+
+The Dynamixel SDK is blocking: every `read*TxRx`/`write*TxRx` call holds the
+caller until the status packet comes back over the 57600-baud link. Calling it
+from an `async def` FastAPI handler stalls the whole event loop, so one slow
+request (a homing move, a burst of status polls) freezes every other client,
+including the emergency stop.
+
+`BusWorker` is the single owner of `portHandler`/`packetHandler`. It runs one
+background thread that pulls commands from a priority queue and executes them
+in order. Callers get a `concurrent.futures.Future` back (`submit`) or can
+`await` the result directly from asyncio code (`run`, `read4`, `write1`, ...).
+
+Priorities:
+-----------
+- `PRIORITY_EMERGENCY` — torque cut-off; jumps ahead of everything queued.
+- `PRIORITY_COMMAND`   — motion and configuration commands from the API.
+- `PRIORITY_TELEMETRY` — background status reads; served when the bus is idle.
+
+Shadow cache:
+-------------
+The worker keeps a write-through `RegisterCache` of the RAM registers we set
+(torque enable, operating mode, profile acceleration/velocity, goal position).
+A write whose value matches the cached one is dropped without touching the bus.
+The cache is cleared on torque-off (the motor may be moved by hand), on reboot
+and on reconnect, and a failed write forgets that register. Torque-off writes
+are never skipped.
+"""
+
+import asyncio
+import itertools
+import queue
+import threading
+from concurrent.futures import Future
+
+PRIORITY_EMERGENCY = 0
+PRIORITY_COMMAND = 10
+PRIORITY_TELEMETRY = 20
+
+COMM_SUCCESS = 0
+
+
+class RegisterCache:
+    def __init__(self, registers, torque_addr):
+        """
+        Args:
+            registers: Control table addresses whose last written value is tracked
+            torque_addr (int): Torque Enable address; writing 0 clears the cache
+        """
+        self.registers = frozenset(registers)
+        self.torque_addr = torque_addr
+        self._values = {}
+
+    def matches(self, addr, value):
+        """True if writing `value` to `addr` would not change anything."""
+        if addr == self.torque_addr and value == 0:
+            return False
+        return addr in self.registers and self._values.get(addr) == value
+
+    def record(self, addr, value, ok=True):
+        if addr not in self.registers:
+            return
+        if not ok:
+            self._values.pop(addr, None)
+            return
+        if addr == self.torque_addr and value == 0:
+            self._values.clear()
+        self._values[addr] = value
+
+    def invalidate(self):
+        self._values.clear()
+
+
+class BusWorker:
+    def __init__(self, port_handler, packet_handler, dxl_id, cache=None):
+        """
+        Args:
+            port_handler: Opened Dynamixel `PortHandler` (owned by the worker from now on)
+            packet_handler: Dynamixel `PacketHandler` for the protocol in use
+            dxl_id (int): ID of the motor on the bus
+            cache (RegisterCache): Optional shadow cache used to skip redundant writes
+        """
+        self.port = port_handler
+        self.packet = packet_handler
+        self.dxl_id = dxl_id
+        self.cache = cache
+        self.writes_skipped = 0
+
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()  # FIFO order within one priority level
+        self._thread = None
+        self._running = False
+
+    # ----- Lifecycle -----
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="dxl-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        if self._thread is None:
+            return
+        self._running = False
+        self._queue.put((PRIORITY_EMERGENCY, next(self._seq), None, None))
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _loop(self):
+        while self._running:
+            _, _, fn, future = self._queue.get()
+            if fn is None:
+                continue
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(self.port, self.packet)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    # ----- Command submission -----
+    def submit(self, fn, priority=PRIORITY_COMMAND):
+        """
+        Queue `fn(port_handler, packet_handler)` for execution on the bus thread.
+
+        Returns:
+            concurrent.futures.Future resolving to whatever `fn` returns
+        """
+        future = Future()
+        self._queue.put((priority, next(self._seq), fn, future))
+        return future
+
+    async def run(self, fn, priority=PRIORITY_COMMAND):
+        """Await `fn(port_handler, packet_handler)` without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, priority))
+
+    # ----- Register helpers -----
+    def _read4(self, addr):
+        return lambda port, packet: packet.read4ByteTxRx(port, self.dxl_id, addr)[0]
+
+    def _write(self, size, addr, value):
+        value = int(value)
+
+        def fn(port, packet):
+            if self.cache is not None and self.cache.matches(addr, value):
+                self.writes_skipped += 1
+                return COMM_SUCCESS, 0
+            writer = packet.write1ByteTxRx if size == 1 else packet.write4ByteTxRx
+            result, error = writer(port, self.dxl_id, addr, value)
+            if self.cache is not None:
+                self.cache.record(addr, value, ok=result == COMM_SUCCESS and not error)
+            return result, error
+        return fn
+
+    def _write1(self, addr, value):
+        return self._write(1, addr, value)
+
+    def _write4(self, addr, value):
+        return self._write(4, addr, value)
+
+    def _write_block(self, addr, data, ack=True, registers=None):
+        data = [int(b) & 0xFF for b in data]
+
+        def fn(port, packet):
+            cached = self.cache is not None and registers
+            if cached and all(self.cache.matches(a, v) for a, v in registers.items()):
+                self.writes_skipped += 1
+                return COMM_SUCCESS, 0
+            if ack:
+                result, error = packet.writeTxRx(port, self.dxl_id, addr, len(data), data)
+            else:
+                result, error = packet.writeTxOnly(port, self.dxl_id, addr, len(data), data), 0
+            if cached:
+                for a, v in registers.items():
+                    self.cache.record(a, v, ok=result == COMM_SUCCESS and not error)
+            return result, error
+        return fn
+
+    def invalidate_cache(self):
+        """Forget all shadowed register values (reconnect, reboot, manual intervention)."""
+        if self.cache is not None:
+            self.submit(lambda port, packet: self.cache.invalidate(), PRIORITY_EMERGENCY)
+
+    async def reboot(self):
+        def fn(port, packet):
+            result, error = packet.reboot(port, self.dxl_id)
+            if self.cache is not None:
+                self.cache.invalidate()
+            return result, error
+        return await self.run(fn)
+
+    async def read4(self, addr, priority=PRIORITY_COMMAND):
+        return await self.run(self._read4(addr), priority)
+
+    async def write1(self, addr, value, priority=PRIORITY_COMMAND):
+        return await self.run(self._write1(addr, value), priority)
+
+    async def write4(self, addr, value, priority=PRIORITY_COMMAND):
+        return await self.run(self._write4(addr, value), priority)
+
+    async def write_block(self, addr, data, ack=True, registers=None, priority=PRIORITY_COMMAND):
+        """
+        Write a contiguous run of registers in one packet.
+
+        Args:
+            addr (int): First control table address
+            data (list): Raw bytes to write
+            ack (bool): Wait for the status packet (False uses writeTxOnly)
+            registers (dict): {address: value} of cached registers covered by the block
+        """
+        return await self.run(self._write_block(addr, data, ack, registers), priority)
+
+    def submit_write1(self, addr, value, priority=PRIORITY_COMMAND):
+        """Queue a 1-byte write from any thread without waiting; returns the Future."""
+        return self.submit(self._write1(addr, value), priority)
+
+    def read4_sync(self, addr, priority=PRIORITY_COMMAND):
+        """Blocking variant for startup code that runs before the event loop exists."""
+        return self.submit(self._read4(addr), priority).result()
+
+    def write1_sync(self, addr, value, priority=PRIORITY_COMMAND):
+        return self.submit(self._write1(addr, value), priority).result()
+
+    def write4_sync(self, addr, value, priority=PRIORITY_COMMAND):
+        return self.submit(self._write4(addr, value), priority).result()
+
+    def write_block_sync(self, addr, data, ack=True, registers=None, priority=PRIORITY_COMMAND):
+        return self.submit(self._write_block(addr, data, ack, registers), priority).result()
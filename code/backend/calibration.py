@@ -0,0 +1,174 @@
+"""
+Persistent load cell calibration profiles.
+
+`LoadCellMonitor.calibrate_system` calibrates interactively from one known
+weight, and the resulting offset/scale only live in memory: every start of
+`HX711` resets them to 0 and 1, so the backend reported raw counts as "kg"
+until someone re-ran the CLI. Calibration is now a stored profile per sensor,
+kept next to the motor presets (`$XDG_STATE_HOME/rehagrip/loadcell_calibration.json`,
+or `LOADCELL_CALIBRATION_FILE`) and applied to the sampler at startup.
+
+A profile is a least-squares line through any number of (raw, kg) points,
+with compression as positive kg and tension (hanging weights) as negative kg.
+With `split=True` compression and tension get separate scale factors that
+meet at the zero offset, for cells that respond asymmetrically. Fits are
+vectorized NumPy and report their residuals so a bad point is visible.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from loadcell import LinearScale
+
+CALIBRATION_VERSION = "1.0"
+
+
+def resolve_calibration_path() -> Path:
+    env = os.getenv("LOADCELL_CALIBRATION_FILE")
+    if env:
+        p = Path(env).expanduser()
+        p.parent.mkdir(parents=True, exist_ok=True)
+        return p
+
+    xdg_state = os.getenv("XDG_STATE_HOME")
+    if not xdg_state:
+        xdg_state = str(Path.home() / ".local" / "state")
+    app_dir = Path(xdg_state) / "rehagrip"
+    app_dir.mkdir(parents=True, exist_ok=True)
+    return app_dir / "loadcell_calibration.json"
+
+
+class CalibrationProfile(LinearScale):
+    def __init__(self, sensor, offset, scale, tension_scale=None, points=(),
+                 rms_error_kg=0.0, max_error_kg=0.0, created=None):
+        """
+        Args:
+            sensor (str): Sensor name the profile belongs to
+            offset (float): Raw value at zero load
+            scale (float): kg per raw count (compression side, or both sides)
+            tension_scale (float): kg per raw count below the offset (None: same as `scale`)
+            points (list): [raw, kg] pairs the profile was fitted from
+        """
+        super().__init__(offset, scale)
+        self.sensor = sensor
+        self.tension_scale = tension_scale
+        self.points = [list(p) for p in points]
+        self.rms_error_kg = rms_error_kg
+        self.max_error_kg = max_error_kg
+        self.created = created or time.time()
+
+    def to_kg(self, raw_value):
+        delta = raw_value - self.offset
+        if self.tension_scale is not None and delta * self.scale < 0:
+            return delta * self.tension_scale
+        return delta * self.scale
+
+    def to_dict(self):
+        return {
+            "sensor": self.sensor,
+            "offset": self.offset,
+            "scale": self.scale,
+            "tension_scale": self.tension_scale,
+            "points": self.points,
+            "rms_error_kg": self.rms_error_kg,
+            "max_error_kg": self.max_error_kg,
+            "created": self.created,
+        }
+
+    def copy(self):
+        """Independent copy for a sampler, so in-session offset changes stay out of the store."""
+        return CalibrationProfile.from_dict(self.to_dict())
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["sensor"], float(data["offset"]), float(data["scale"]),
+                   data.get("tension_scale"), data.get("points", ()),
+                   data.get("rms_error_kg", 0.0), data.get("max_error_kg", 0.0), data.get("created"))
+
+
+def fit_calibration(sensor, points, split=False):
+    """
+    Least-squares calibration from (raw, kg) points.
+
+    Args:
+        sensor (str): Sensor name for the profile
+        points (iterable): (raw, kg) pairs; kg > 0 compression, kg < 0 tension, 0 unloaded
+        split (bool): Fit separate compression and tension scales through a shared offset
+
+    Returns:
+        CalibrationProfile
+
+    Raises:
+        ValueError: Fewer than two distinct raw values, or a degenerate fit
+    """
+    data = np.asarray(list(points), dtype=np.float64).reshape(-1, 2)
+    raw, kg = data[:, 0], data[:, 1]
+    if len(np.unique(raw)) < 2 or len(np.unique(kg)) < 2:
+        raise ValueError("Calibration needs at least two points with different loads")
+
+    # kg = scale * raw + intercept
+    design = np.column_stack([raw, np.ones_like(raw)])
+    (scale, intercept), *_ = np.linalg.lstsq(design, kg, rcond=None)
+    if scale == 0:
+        raise ValueError("Raw value does not change with load; check the wiring")
+    offset = -intercept / scale
+    tension_scale = None
+
+    if split:
+        unloaded = kg == 0
+        if unloaded.any():
+            offset = raw[unloaded].mean()
+        delta = raw - offset
+        sides = {}
+        for name, mask in (("compression", kg > 0), ("tension", kg < 0)):
+            if not mask.any():
+                raise ValueError(f"Split calibration needs at least one {name} point")
+            # Line through the offset: scale = sum(d * kg) / sum(d^2)
+            sides[name] = float(np.dot(delta[mask], kg[mask]) / np.dot(delta[mask], delta[mask]))
+        scale, tension_scale = sides["compression"], sides["tension"]
+
+    profile = CalibrationProfile(sensor, float(offset), float(scale), tension_scale, data.tolist())
+    errors = np.array([profile.to_kg(r) for r in raw]) - kg
+    profile.rms_error_kg = float(np.sqrt(np.mean(errors ** 2)))
+    profile.max_error_kg = float(np.abs(errors).max())
+    return profile
+
+
+class CalibrationStore:
+    def __init__(self, path=None):
+        self.path = Path(path) if path else resolve_calibration_path()
+        self.profiles = self._load()
+
+    def _load(self):
+        try:
+            if not self.path.exists():
+                return {}
+            with self.path.open("r") as f:
+                data = json.load(f)
+            profiles = {name: CalibrationProfile.from_dict(p) for name, p in data.get("profiles", {}).items()}
+            print(f"✓ Loaded {len(profiles)} load cell calibration profile(s) from {self.path}")
+            return profiles
+        except Exception as e:
+            print(f"⚠ Error loading load cell calibration from {self.path}: {e}")
+            return {}
+
+    def get(self, sensor):
+        return self.profiles.get(sensor)
+
+    def save(self, profile):
+        """Store `profile` under its sensor name and rewrite the file."""
+        self.profiles[profile.sensor] = profile
+        data = {
+            "profiles": {name: p.to_dict() for name, p in self.profiles.items()},
+            "last_updated": time.time(),
+            "version": CALIBRATION_VERSION,
+        }
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("w") as f:
+            json.dump(data, f, indent=2)
+        tmp.replace(self.path)
+        print(f"✓ Saved load cell calibration '{profile.sensor}' to {self.path}")
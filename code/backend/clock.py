@@ -0,0 +1,92 @@
+"""
+Injectable clocks for the RehaGrip backend.
+
+Everything that waits or measures time (bus latency in the simulator, the
+telemetry poller, move settling in `server.py`) goes through a clock object
+instead of calling `time.sleep`/`time.monotonic` directly. Production uses
+`MonotonicClock`; simulations and tests can swap in a faster one.
+
+Clocks:
+-------
+- `MonotonicClock` — real time (`time.monotonic`).
+- `ScaledClock`    — real threads, but time runs `speedup`× faster. Works with
+  the full server (bus worker, poller) on the simulated motor.
+- `ManualClock`    — fully virtual: time only advances when someone sleeps, so
+  runs are deterministic. For single-threaded scripts and tests driving
+  `SimPacketHandler` directly (e.g. a 10,000-cycle endurance run).
+
+The server picks `ScaledClock` when `REHAGRIP_CLOCK_SPEEDUP` is set (> 1),
+otherwise `MonotonicClock`.
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+
+class MonotonicClock:
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    async def asleep(self, seconds):
+        await asyncio.sleep(max(0.0, seconds))
+
+
+class ScaledClock:
+    def __init__(self, speedup):
+        """
+        Args:
+            speedup (float): How many simulated seconds pass per real second
+        """
+        if speedup <= 0:
+            raise ValueError("speedup must be positive")
+        self.speedup = speedup
+        self._real_start = time.monotonic()
+
+    def now(self):
+        return (time.monotonic() - self._real_start) * self.speedup
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.speedup)
+
+    async def asleep(self, seconds):
+        await asyncio.sleep(max(0.0, seconds) / self.speedup)
+
+
+class ManualClock:
+    def __init__(self, start=0.0):
+        self._t = start
+        self._lock = threading.Lock()
+
+    def now(self):
+        return self._t
+
+    def advance(self, seconds):
+        with self._lock:
+            self._t += max(0.0, seconds)
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    async def asleep(self, seconds):
+        self.advance(seconds)
+        await asyncio.sleep(0)
+
+
+def resolve_clock():
+    env = os.getenv("REHAGRIP_CLOCK_SPEEDUP")
+    if env:
+        try:
+            speedup = float(env)
+        except ValueError:
+            print(f"⚠ Invalid REHAGRIP_CLOCK_SPEEDUP={env!r}, using real time")
+        else:
+            if speedup > 1:
+                return ScaledClock(speedup)
+    return MonotonicClock()
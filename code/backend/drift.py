@@ -0,0 +1,128 @@
+"""
+Automatic load cell re-zeroing during quiescent periods.
+
+The HX711 offset drifts with temperature over a session, and the only remedy
+was `HX711.tare()`, which blocks for 10 averaged reads and needs the therapist
+to stop. `DriftCompensator` runs on the sampler thread instead: it keeps an
+exponentially weighted mean and variance of the raw signal (constant work per
+sample) and, while the device is quiescent, nudges the calibration offset
+towards the observed raw mean.
+
+Quiescent means all of:
+- the server says so (torque off and the motor not moving),
+- the signal is still (standard deviation below `max_std_kg`),
+- the reading is close to zero (|kg| below `max_kg`), so a patient resting a
+  steady force on the handle is not tared away,
+- and all of this has held for `settle_s`.
+
+Each quiescent period that moved the offset is logged when it ends (or every
+`log_interval_s` while it lasts) and kept in `corrections`. Corrections are not
+written to the calibration file; they only track drift within a session. The
+sampler must therefore hold its own copy of a stored profile
+(`CalibrationProfile.copy()`), never the object kept in `CalibrationStore`.
+"""
+
+import math
+import time
+from collections import deque
+
+
+class DriftCompensator:
+    def __init__(self, sampler, quiescent, alpha=0.05, gain=0.01, max_std_kg=0.01,
+                 max_kg=0.2, settle_s=2.0, log_interval_s=30.0):
+        """
+        Args:
+            sampler (LoadCellSampler): Sampler whose `calibration.offset` is adjusted
+            quiescent: `quiescent() -> bool`; True while torque is off and nothing moves
+            alpha (float): Weight of each sample in the running mean/variance
+            gain (float): Fraction of the remaining offset error removed per quiescent sample
+            max_std_kg (float): Noise level below which the signal counts as still
+            max_kg (float): Largest reading that may be treated as zero load
+            settle_s (float): How long the conditions must hold before correcting
+            log_interval_s (float): Log an ongoing correction at least this often
+        """
+        self.sampler = sampler
+        self.quiescent = quiescent
+        self.alpha = alpha
+        self.gain = gain
+        self.max_std_kg = max_std_kg
+        self.max_kg = max_kg
+        self.settle_s = settle_s
+        self.log_interval_s = log_interval_s
+        self.enabled = True
+        self.mean = None
+        self.var = 0.0
+        self.active = False
+        self.corrections = deque(maxlen=50)
+        self.total_counts = 0.0
+        self._still_since = None
+        self._period = None         # (start, offset at start) of the unlogged correction
+
+    def attach(self):
+        self.sampler.subscribe(self.update)
+
+    def update(self, sample):
+        raw = sample.raw
+        if self.mean is None:
+            self.mean = float(raw)
+            return
+        delta = raw - self.mean
+        self.mean += self.alpha * delta
+        self.var = (1 - self.alpha) * (self.var + self.alpha * delta * delta)
+
+        calibration = self.sampler.calibration
+        scale = abs(getattr(calibration, "scale", 1.0))
+        still = (self.enabled and math.sqrt(self.var) * scale < self.max_std_kg
+                 and abs(calibration.to_kg(self.mean)) < self.max_kg and self.quiescent())
+        now = sample.timestamp
+        if not still:
+            self._still_since = None
+            self._end_period(now)
+            return
+        if self._still_since is None:
+            self._still_since = now
+        if now - self._still_since < self.settle_s:
+            return
+
+        if self._period is None:
+            self.active = True
+            self._period = (now, calibration.offset)
+        step = self.gain * (self.mean - calibration.offset)
+        calibration.offset += step
+        self.total_counts += step
+        if now - self._period[0] >= self.log_interval_s:
+            self._log(now, calibration, ongoing=True)
+            self._period = (now, calibration.offset)
+
+    def _end_period(self, now):
+        if self._period is None:
+            return
+        self.active = False
+        self._log(now, self.sampler.calibration)
+        self._period = None
+
+    def _log(self, now, calibration, ongoing=False):
+        start, offset_before = self._period
+        counts = calibration.offset - offset_before
+        if counts == 0:
+            return
+        kg = counts * getattr(calibration, "scale", 1.0)
+        entry = {
+            "time": time.time(),
+            "duration_s": round(now - start, 2),
+            "offset_change": counts,
+            "offset_change_kg": kg,
+            "offset": calibration.offset,
+        }
+        self.corrections.append(entry)
+        print(f"Load cell auto-tare{' (ongoing)' if ongoing else ''}: offset {counts:+.1f} counts "
+              f"({kg * 1000:+.1f} g) over {now - start:.1f} s, now {calibration.offset:.1f}")
+
+    def status(self):
+        return {
+            "enabled": self.enabled,
+            "active": self.active,
+            "std_kg": math.sqrt(self.var) * abs(getattr(self.sampler.calibration, "scale", 1.0)),
+            "total_offset_change": self.total_counts,
+            "corrections": list(self.corrections)[-10:],
+        }
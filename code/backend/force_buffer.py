@@ -0,0 +1,167 @@
+"""
+Array-backed ring buffer of load cell samples with windowed statistics.
+
+`LoadCellSampler` used to keep a deque of `LoadSample` tuples, and the only
+analysis available was `HX711.analyze`, which builds a nine-key dict from one
+averaged value. `ForceBuffer` stores the sample stream in preallocated NumPy
+columns (timestamp, raw, kg, N, filtered N); appending a sample writes five array slots and
+allocates nothing. `stats()` answers window queries ("the last 2 s", "the last
+400 samples") with one vectorized pass over a contiguous copy of the window:
+mean, standard deviation, min/max, percentiles, the compression/tension split
+and time spent in a force band. The GUI load bar and the safety checks read
+these instead of re-deriving them from individual samples.
+
+Sign convention matches `read_loadcell.py`: positive force is compression,
+negative is tension, and |kg| <= 0.05 counts as neutral.
+"""
+
+import threading
+
+import numpy as np
+
+NEUTRAL_KG = 0.05                        # same noise threshold as HX711.analyze
+GRAVITY = 9.81
+DEFAULT_PERCENTILES = (5, 50, 95)
+
+
+class ForceBuffer:
+    def __init__(self, capacity=4096):
+        """
+        Args:
+            capacity (int): Number of samples kept; older samples are overwritten
+        """
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.raw = np.zeros(capacity, dtype=np.int32)
+        self.kg = np.zeros(capacity, dtype=np.float64)
+        self.force_n = np.zeros(capacity, dtype=np.float64)
+        self.filtered_n = np.zeros(capacity, dtype=np.float64)
+        self._next = 0           # slot the next sample goes into
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, raw, kg, force_n, filtered_n):
+        with self._lock:
+            i = self._next
+            self.timestamps[i] = timestamp
+            self.raw[i] = raw
+            self.kg[i] = kg
+            self.force_n[i] = force_n
+            self.filtered_n[i] = filtered_n
+            self._next = (i + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+
+    def clear(self):
+        with self._lock:
+            self._next = 0
+            self._count = 0
+
+    def _order(self, n):
+        """Slot indices of the last `n` samples, oldest first."""
+        start = (self._next - n) % self.capacity
+        return (start + np.arange(n)) % self.capacity
+
+    def window(self, seconds=None, samples=None, now=None):
+        """
+        Copy of the samples in a window, oldest first.
+
+        Args:
+            seconds (float): Keep samples newer than `now - seconds`
+            samples (int): Keep at most the last `samples` samples
+            now (float): Window end for `seconds` (default: the newest sample)
+
+        Returns:
+            (timestamps, raw, kg, force_n, filtered_n) arrays
+        """
+        with self._lock:
+            n = self._count if samples is None else max(0, min(samples, self._count))
+            idx = self._order(n)
+            columns = (self.timestamps[idx], self.raw[idx], self.kg[idx],
+                       self.force_n[idx], self.filtered_n[idx])
+        if seconds is not None and n:
+            t = columns[0]
+            end = t[-1] if now is None else now
+            first = np.searchsorted(t, end - seconds, side="right")
+            columns = tuple(c[first:] for c in columns)
+        return columns
+
+    def stats(self, seconds=None, samples=None, percentiles=DEFAULT_PERCENTILES,
+              zone=None, neutral_kg=NEUTRAL_KG, filtered=False):
+        """
+        Force statistics over a window (see `window` for `seconds`/`samples`).
+
+        Args:
+            percentiles (iterable): Percentiles of force (N) to report
+            zone (tuple): (low_n, high_n) force band for `time_in_zone_s`; either end may be None
+            neutral_kg (float): |kg| at or below this is neither compression nor tension
+            filtered (bool): Use the filtered force instead of the unfiltered one
+
+        Returns:
+            dict of window statistics (forces in N), or {"samples": 0} for an empty window
+        """
+        t, raw, _, force, smoothed = self.window(seconds, samples)
+        if filtered:
+            force = smoothed
+        n = len(t)
+        if n == 0:
+            return {"samples": 0}
+
+        # Each sample holds until the next one; the newest gets the mean period
+        span = float(t[-1] - t[0])
+        period = span / (n - 1) if n > 1 else 0.0
+        dt = np.empty(n)
+        dt[:-1] = np.diff(t)
+        dt[-1] = period
+
+        compression = force > neutral_kg * GRAVITY
+        tension = force < -neutral_kg * GRAVITY
+        neutral = ~(compression | tension)
+        pcts = list(percentiles)
+        values = np.percentile(force, pcts) if pcts else []
+
+        result = {
+            "samples": n,
+            "filtered": filtered,
+            "start": float(t[0]),
+            "end": float(t[-1]),
+            "duration_s": span,
+            "rate_hz": 1.0 / period if period > 0 else None,
+            "mean_n": float(force.mean()),
+            "std_n": float(force.std()),
+            "min_n": float(force.min()),
+            "max_n": float(force.max()),
+            "raw_mean": float(raw.mean()),
+            "percentiles_n": {f"p{p:g}": float(v) for p, v in zip(pcts, values)},
+            "compression": {
+                "samples": int(compression.sum()),
+                "time_s": float(dt[compression].sum()),
+                "peak_n": float(force[compression].max()) if compression.any() else 0.0,
+                "impulse_ns": float((force * dt)[compression].sum()),
+            },
+            "tension": {
+                "samples": int(tension.sum()),
+                "time_s": float(dt[tension].sum()),
+                "peak_n": float(-force[tension].min()) if tension.any() else 0.0,
+                "impulse_ns": float((-force * dt)[tension].sum()),
+            },
+            "neutral_time_s": float(dt[neutral].sum()),
+        }
+        if zone is not None:
+            low, high = zone
+            inside = np.ones(n, dtype=bool)
+            if low is not None:
+                inside &= force >= low
+            if high is not None:
+                inside &= force <= high
+            result["zone"] = {
+                "low_n": low,
+                "high_n": high,
+                "samples": int(inside.sum()),
+                "time_in_zone_s": float(dt[inside].sum()),
+                "fraction": float(inside.mean()),
+            }
+        return result
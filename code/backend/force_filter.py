@@ -0,0 +1,274 @@
+"""
+Streaming filters for the load cell force signal.
+
+`HX711.read_average` averages N blocking reads, so one glitched 24-bit read
+(common with long load cell leads) skews the result, and nothing smooths the
+signal between calls. The backend instead runs every conversion through a
+`FilterChain` as it arrives: an outlier stage, then a smoothing stage. Each
+stage keeps a fixed amount of state and does constant work per sample, and
+reports the delay it adds (in samples, at low frequency) so the chain can tell
+safety code how stale the filtered force is. Coefficients and reported
+latencies are computed for the HX711's configured rate (`LOADCELL_SPS`, 80 or
+10), which `build_chain` is given.
+
+Stages:
+-------
+- `hampel:N` — Hampel identifier over the last N samples: a sample more than
+  3 scaled MADs from the window median is replaced by the median. Inliers pass
+  through unchanged, but a genuine force step looks like an outlier until it
+  fills half the window, so steps are held back by up to (N-1)/2 samples.
+- `median:N` — running median of the last N samples ((N-1)/2 samples delay).
+- `ema:ALPHA` — exponential moving average, y += alpha (x - y).
+- `lowpass:HZ` — 2nd-order Butterworth low-pass (bilinear transform) at the
+  sampler rate.
+- `kalman:Q/R` — 1-D random-walk Kalman filter with process variance Q and
+  measurement variance R (N^2).
+
+Chains are written as comma-separated stages, e.g. `LOADCELL_FILTER=hampel:7,ema:0.3`
+(the default); `LOADCELL_FILTER=none` disables filtering.
+"""
+
+import math
+from bisect import bisect_left, insort
+from collections import deque
+
+DEFAULT_CHAIN = "hampel:7,ema:0.3"
+DEFAULT_RATE_HZ = 80.0           # HX711 at RATE=high
+MAD_SCALE = 1.4826               # MAD -> standard deviation for Gaussian noise
+
+
+class _Window:
+    """Last `size` samples, kept both in arrival order and sorted."""
+
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError("Window size must be >= 1")
+        self.size = size
+        self.values = deque()
+        self.sorted = []
+
+    def push(self, x):
+        self.values.append(x)
+        insort(self.sorted, x)
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            del self.sorted[bisect_left(self.sorted, old)]
+
+    def median(self):
+        s = self.sorted
+        n = len(s)
+        return s[n // 2] if n % 2 else 0.5 * (s[n // 2 - 1] + s[n // 2])
+
+    def mad(self, median):
+        """
+        Median absolute deviation from `median` (the upper one for even sizes).
+
+        Deviations grow outwards from the median in the sorted window, so the
+        n/2 smallest are found by walking outwards from it, without sorting.
+        """
+        s = self.sorted
+        n = len(s)
+        hi = bisect_left(s, median)
+        lo = hi - 1
+        for _ in range(n // 2 + 1):
+            if hi < n and (lo < 0 or s[hi] - median <= median - s[lo]):
+                deviation = s[hi] - median
+                hi += 1
+            else:
+                deviation = median - s[lo]
+                lo -= 1
+        return deviation
+
+
+class HampelFilter:
+    def __init__(self, size=7, n_sigmas=3.0):
+        """
+        Args:
+            size (int): Number of recent samples the median/MAD are taken over
+            n_sigmas (float): Rejection threshold in scaled MADs
+        """
+        self.size = size
+        self.n_sigmas = n_sigmas
+        self.window = _Window(size)
+        self.rejected = 0
+        # A step is treated as an outlier until it holds the window majority
+        self.latency_samples = (size - 1) / 2
+
+    def update(self, x):
+        window = self.window
+        # Raw values stay in the window (outliers included): substituting medians
+        # would shrink the MAD until ordinary noise started getting rejected
+        window.push(x)
+        if len(window.values) < 3:
+            return x
+        median = window.median()
+        mad = MAD_SCALE * window.mad(median)
+        if abs(x - median) > self.n_sigmas * mad:
+            self.rejected += 1
+            return median
+        return x
+
+    def describe(self):
+        return {"stage": "hampel", "size": self.size, "n_sigmas": self.n_sigmas, "rejected": self.rejected}
+
+
+class MedianFilter:
+    def __init__(self, size=5):
+        self.size = size
+        self.window = _Window(size)
+        self.latency_samples = (size - 1) / 2
+
+    def update(self, x):
+        self.window.push(x)
+        return self.window.median()
+
+    def describe(self):
+        return {"stage": "median", "size": self.size}
+
+
+class EmaFilter:
+    def __init__(self, alpha=0.3):
+        if not 0 < alpha <= 1:
+            raise ValueError("EMA alpha must be in (0, 1]")
+        self.alpha = alpha
+        self.y = None
+        self.latency_samples = (1 - alpha) / alpha
+
+    def update(self, x):
+        self.y = x if self.y is None else self.y + self.alpha * (x - self.y)
+        return self.y
+
+    def describe(self):
+        return {"stage": "ema", "alpha": self.alpha}
+
+
+class LowPassFilter:
+    def __init__(self, cutoff_hz=5.0, rate_hz=DEFAULT_RATE_HZ):
+        """
+        Args:
+            cutoff_hz (float): -3 dB frequency; must be below rate_hz / 2
+            rate_hz (float): Sample rate the coefficients are designed for
+        """
+        if not 0 < cutoff_hz < rate_hz / 2:
+            raise ValueError(f"Low-pass cutoff must be between 0 and {rate_hz / 2:g} Hz")
+        self.cutoff_hz = cutoff_hz
+        self.rate_hz = rate_hz
+        k = math.tan(math.pi * cutoff_hz / rate_hz)
+        norm = 1 / (1 + math.sqrt(2) * k + k * k)
+        self.b0 = k * k * norm
+        self.b1 = 2 * self.b0
+        self.b2 = self.b0
+        self.a1 = 2 * (k * k - 1) * norm
+        self.a2 = (1 - math.sqrt(2) * k + k * k) * norm
+        self.x1 = self.x2 = self.y1 = self.y2 = None
+        # Butterworth group delay at DC: sqrt(2) / (2 pi fc) seconds
+        self.latency_samples = math.sqrt(2) / (2 * math.pi * cutoff_hz) * rate_hz
+
+    def update(self, x):
+        if self.x1 is None:
+            # Start settled at the first value instead of ringing up from zero
+            self.x1 = self.x2 = self.y1 = self.y2 = x
+        y = (self.b0 * x + self.b1 * self.x1 + self.b2 * self.x2
+             - self.a1 * self.y1 - self.a2 * self.y2)
+        self.x2, self.x1 = self.x1, x
+        self.y2, self.y1 = self.y1, y
+        return y
+
+    def describe(self):
+        return {"stage": "lowpass", "cutoff_hz": self.cutoff_hz, "rate_hz": self.rate_hz}
+
+
+class KalmanFilter:
+    def __init__(self, process_var=0.01, measurement_var=0.25):
+        """
+        Args:
+            process_var (float): How much the true force may change per sample (N^2)
+            measurement_var (float): Sensor noise variance (N^2)
+        """
+        self.q = process_var
+        self.r = measurement_var
+        self.x = None
+        self.p = measurement_var
+        # Steady-state gain of the random-walk model, for the latency estimate
+        p = (process_var + math.sqrt(process_var ** 2 + 4 * process_var * measurement_var)) / 2
+        gain = p / (p + measurement_var)
+        self.latency_samples = (1 - gain) / gain
+
+    def update(self, z):
+        if self.x is None:
+            self.x = z
+            return z
+        p = self.p + self.q
+        k = p / (p + self.r)
+        self.x += k * (z - self.x)
+        self.p = (1 - k) * p
+        return self.x
+
+    def describe(self):
+        return {"stage": "kalman", "process_var": self.q, "measurement_var": self.r}
+
+
+class FilterChain:
+    def __init__(self, stages=(), rate_hz=DEFAULT_RATE_HZ):
+        """
+        Args:
+            stages (list): Filters applied in order
+            rate_hz (float): Sample rate the stages were designed for (used for `latency_ms`)
+        """
+        self.stages = list(stages)
+        self.rate_hz = rate_hz
+
+    def update(self, x):
+        for stage in self.stages:
+            x = stage.update(x)
+        return x
+
+    @property
+    def latency_samples(self):
+        return sum(stage.latency_samples for stage in self.stages)
+
+    def latency_ms(self, rate_hz=None):
+        rate_hz = rate_hz or self.rate_hz
+        return self.latency_samples / rate_hz * 1000 if rate_hz else None
+
+    def describe(self, rate_hz=None):
+        rate_hz = rate_hz or self.rate_hz
+        return {
+            "rate_hz": rate_hz,
+            "stages": [dict(stage.describe(), latency_samples=stage.latency_samples)
+                       for stage in self.stages],
+            "latency_samples": self.latency_samples,
+            "latency_ms": self.latency_ms(rate_hz),
+        }
+
+
+def build_chain(spec=DEFAULT_CHAIN, rate_hz=DEFAULT_RATE_HZ):
+    """
+    Build a `FilterChain` from a spec like "hampel:7,ema:0.3" (see module docstring).
+
+    Args:
+        rate_hz (float): Rate the samples arrive at; sets low-pass coefficients and latency
+
+    Raises:
+        ValueError: Unknown stage or bad parameter
+    """
+    stages = []
+    for item in (spec or "").split(","):
+        item = item.strip().lower()
+        if not item or item == "none":
+            continue
+        name, _, arg = item.partition(":")
+        if name == "hampel":
+            stages.append(HampelFilter(int(arg or 7)))
+        elif name == "median":
+            stages.append(MedianFilter(int(arg or 5)))
+        elif name == "ema":
+            stages.append(EmaFilter(float(arg or 0.3)))
+        elif name == "lowpass":
+            stages.append(LowPassFilter(float(arg or 5.0), rate_hz))
+        elif name == "kalman":
+            q, _, r = arg.partition("/")
+            stages.append(KalmanFilter(float(q or 0.01), float(r or 0.25)))
+        else:
+            raise ValueError(f"Unknown force filter stage '{name}'")
+    return FilterChain(stages, rate_hz)
@@ -0,0 +1,468 @@
+"""
+Continuous HX711 load cell sampling for the RehaGrip backend.
+
+`read_loadcell.py` drives the HX711 but only as an interactive CLI, so
+`State.load` was never written and `/api/motor/status` always reported 0 N.
+`LoadCellSampler` runs the same `HX711` class on a background thread: each
+`read()` returns as soon as the chip signals a finished conversion (a DOUT
+falling-edge interrupt, or polling where edge detection is unavailable), so the
+thread samples at the chip's native data rate (10 or 80 SPS). Every sample is
+timestamped, converted with the HX711's offset/scale, filtered (outlier
+rejection and smoothing, `force_filter.py`), appended to a NumPy
+ring buffer (`force_buffer.ForceBuffer`, which also answers windowed force
+statistics) and handed to subscribers (the server writes it into `state.load`).
+Status requests read the latest value; nothing touches the sensor per request.
+
+Isolated acquisition:
+---------------------
+PD_SCK must not stay high for more than 60 us. In the server process a GC pass
+or a large JSON response can hold the GIL long enough to stretch a pulse and
+corrupt the sample (or power the chip down). `LoadCellProcess` instead runs the
+HX711 in a separate Python process (`python loadcell.py --acquire ...`),
+optionally pinned to one CPU and given SCHED_FIFO priority, with the garbage
+collector disabled. It streams fixed-size binary records over a pipe to a
+reader thread here. Each read's longest PD_SCK pulse is measured; reads over
+the limit are counted in `timing_violations` and dropped in both modes.
+
+Several load cells:
+------------------
+Fingertip, palm and inline cells can each have their own HX711 board on a
+shared PD_SCK line. `LoadCellGroup` reads them all with one `HX711Array`
+clocking pass and publishes each board (and, when alternating, each channel)
+to its own `LoadCellSampler`, so every sensor keeps its own buffer, filter
+chain and calibration profile. The first sensor is the primary one that
+drives `state.load`.
+
+Configuration:
+--------------
+- `LOADCELL=0` disables the sampler (it is also skipped when no GPIO backend works).
+- `LOADCELL_DOUT` / `LOADCELL_SCK` — BCM pins (default 5 / 6, as in `read_loadcell.py`).
+  A comma-separated `LOADCELL_DOUT` (e.g. `5,13,19`) reads several boards sharing PD_SCK.
+- `LOADCELL_CHANNELS` — `A` (default, gain 128), `A64`, `B` (gain 32), or a list such as
+  `A,B` to cycle channels on every board. The array dwells on each channel and
+  discards the conversions that are still settling after a switch, so with two
+  channels each gets about a third of the rate, in bursts (see `HX711Array`).
+- `LOADCELL_GPIO` — GPIO backend: `rpi` (default), `gpiomem`, `chardev` or `fake`
+  (simulated HX711, for running the backend without a Pi); see `gpio_drivers.py`.
+- `LOADCELL_EDGE=0` — poll DOUT instead of waiting on the falling-edge interrupt.
+- `LOADCELL_PROCESS=1` — acquire in an isolated process; `LOADCELL_CPU` pins it to a
+  CPU and `LOADCELL_RT_PRIORITY` (1-99) requests SCHED_FIFO (needs CAP_SYS_NICE).
+- `LOADCELL_SENSOR` — sensor names, one per DOUT pin (default `hx711-dout<DOUT>`); they
+  key the calibration profiles (`calibration.py`). Channel B sensors get a `-B` suffix.
+- `LOADCELL_SPS` — conversion rate the HX711 RATE pin is strapped for: `80` (default) or `10`.
+  The filter chain is designed for it (per channel when several channels are cycled).
+- `LOADCELL_FILTER` — filter chain for `filtered_n`, e.g. `hampel:7,ema:0.3` (default)
+  or `none`; see `force_filter.py`.
+"""
+
+import argparse
+import gc
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from force_buffer import ForceBuffer
+from force_filter import DEFAULT_CHAIN, FilterChain, build_chain
+
+# read_loadcell.py (HX711 driver + CLI) lives one level up, in code/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+GRAVITY = 9.81
+DEFAULT_BUFFER_SIZE = 4096       # ~50 s at 80 SPS
+DEFAULT_DOUT_PIN = 5
+DEFAULT_SCK_PIN = 6
+DEFAULT_SPS = 80.0
+
+# Acquisition process -> backend: timestamp, raw, flags, max PD_SCK high time (us)
+RECORD = struct.Struct("<diBf")
+FLAG_TIMING_VIOLATION = 0x01
+FLAG_READ_ERROR = 0x02
+
+
+class LoadSample(NamedTuple):
+    timestamp: float     # time.time() when the conversion was read
+    raw: int             # signed 24-bit HX711 value
+    kg: float
+    force_n: float
+    filtered_n: float    # force after the sampler's filter chain
+
+
+class LinearScale:
+    def __init__(self, offset=0.0, scale=1.0):
+        """Raw-to-kg conversion for samplers that do not own the HX711 object."""
+        self.offset = offset
+        self.scale = scale
+
+    def to_kg(self, raw_value):
+        return (raw_value - self.offset) * self.scale
+
+
+class LoadCellSampler:
+    mode = "thread"
+
+    def __init__(self, hx711, buffer_size=DEFAULT_BUFFER_SIZE, retry_s=0.5, filters=None,
+                 sensor="hx711"):
+        """
+        Args:
+            hx711 (HX711): Initialized driver; its `offset`/`scale` convert raw to kg
+            buffer_size (int): Number of recent samples kept
+            retry_s (float): Pause after a failed read before trying again
+            filters (FilterChain): Applied to every sample's force (default: none)
+            sensor (str): Name its calibration profile is stored under
+        """
+        self.hx711 = hx711
+        self.calibration = hx711         # anything with to_kg(raw)
+        self.sensor = sensor
+        self.retry_s = retry_s
+        self.filters = filters or FilterChain()
+        self.buffer = ForceBuffer(buffer_size)
+        self.samples = 0
+        self.errors = 0
+        self.timing_violations = 0
+        self.max_high_us = 0.0
+        self.rate_hz = 0.0
+        self._latest = None
+        self._subscribers = []
+        self._thread = None
+        self._running = False
+
+    @property
+    def latest(self):
+        """Most recent `LoadSample`, or None before the first conversion."""
+        return self._latest
+
+    def subscribe(self, callback):
+        """Call `callback(sample)` on the sampler thread after every conversion."""
+        self._subscribers.append(callback)
+
+    def recent(self, n=None):
+        """The last `n` samples (all buffered samples if None), oldest first."""
+        columns = self.buffer.window(samples=n)
+        return [LoadSample(*row) for row in zip(*(c.tolist() for c in columns))]
+
+    def stats(self, seconds=None, samples=None, **options):
+        """Windowed force statistics; see `ForceBuffer.stats`."""
+        return self.buffer.stats(seconds, samples, **options)
+
+    # ----- Lifecycle -----
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="loadcell", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        if self._thread is None:
+            return
+        self._running = False
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _loop(self):
+        while self._running:
+            violations = self.hx711.timing_violations
+            try:
+                raw = self.hx711.read()     # blocks until DOUT signals a new conversion
+            except Exception as e:
+                self._read_failed(e)
+                time.sleep(self.retry_s)
+                continue
+            self._receive(time.time(), raw, self.hx711.timing_violations > violations,
+                          self.hx711.last_max_high_s * 1e6)
+
+    def _read_failed(self, error):
+        self.errors += 1
+        if self.errors == 1 or self.errors % 100 == 0:
+            print(f"⚠ Load cell read failed ({self.errors} errors): {error}")
+
+    def _receive(self, timestamp, raw, violated, high_us):
+        self.max_high_us = max(self.max_high_us, high_us)
+        if violated:
+            # A stretched PD_SCK pulse may have corrupted the bits; drop the sample
+            self.timing_violations += 1
+            return
+        self._publish(raw, timestamp)
+
+    def _publish(self, raw, timestamp):
+        kg = self.calibration.to_kg(raw)
+        force_n = kg * GRAVITY
+        sample = LoadSample(timestamp, raw, kg, force_n, self.filters.update(force_n))
+        previous = self._latest
+        if previous is not None and timestamp > previous.timestamp:
+            # Smoothed conversion rate for the status endpoint
+            self.rate_hz += 0.05 * (1.0 / (timestamp - previous.timestamp) - self.rate_hz)
+        self.buffer.append(*sample)
+        self._latest = sample
+        self.samples += 1
+        for callback in self._subscribers:
+            try:
+                callback(sample)
+            except Exception as e:
+                print(f"Load cell subscriber error: {e}")
+
+
+class LoadCellProcess(LoadCellSampler):
+    mode = "process"
+
+    def __init__(self, dout, sck, gpio="rpi", edge=True, cpu=None, rt_priority=None,
+                 buffer_size=DEFAULT_BUFFER_SIZE, filters=None, sensor="hx711"):
+        """
+        Args:
+            dout (int), sck (int): BCM pins of the HX711
+            gpio (str): GPIO backend name for `gpio_drivers.open_gpio`
+            edge (bool): Use the DOUT falling-edge interrupt if available
+            cpu (int): CPU to pin the acquisition process to
+            rt_priority (int): SCHED_FIFO priority (1-99) for the acquisition process
+        """
+        super().__init__(None, buffer_size, filters=filters, sensor=sensor)
+        self.calibration = LinearScale()
+        self.command = [sys.executable, str(Path(__file__).resolve()), "--acquire",
+                        "--dout", str(dout), "--sck", str(sck), "--gpio", gpio]
+        if not edge:
+            self.command.append("--no-edge")
+        if cpu is not None:
+            self.command += ["--cpu", str(cpu)]
+        if rt_priority:
+            self.command += ["--rt-priority", str(rt_priority)]
+        self.process = None
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process else None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.process = subprocess.Popen(self.command, stdout=subprocess.PIPE, bufsize=0)
+        super().start()
+
+    def stop(self, timeout=2.0):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout)
+        super().stop(timeout)
+        self.process = None
+
+    def _loop(self):
+        pipe = self.process.stdout
+        while self._running:
+            record = pipe.read(RECORD.size)
+            if len(record) < RECORD.size:
+                print(f"⚠ Load cell acquisition process exited (code {self.process.poll()})")
+                break
+            timestamp, raw, flags, high_us = RECORD.unpack(record)
+            if flags & FLAG_READ_ERROR:
+                self._read_failed("timeout in acquisition process")
+                continue
+            self._receive(timestamp, raw, flags & FLAG_TIMING_VIOLATION, high_us)
+
+
+class LoadCellGroup:
+    def __init__(self, array, members, retry_s=0.5):
+        """
+        Args:
+            array (HX711Array): Boards sharing PD_SCK
+            members (dict): (board index, channel) -> LoadCellSampler receiving those samples
+            retry_s (float): Pause after a failed read before trying again
+        """
+        self.array = array
+        self.members = members
+        self.retry_s = retry_s
+        self._thread = None
+        self._running = False
+        for member in members.values():
+            member.group = self
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="loadcell-group", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        if self._thread is None:
+            return
+        self._running = False
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _loop(self):
+        array, members = self.array, self.members
+        while self._running:
+            violations = array.timing_violations
+            try:
+                (channel, _), values = array.read()
+            except Exception as e:
+                for member in members.values():
+                    member._read_failed(e)
+                time.sleep(self.retry_s)
+                continue
+            timestamp = time.time()
+            violated = array.timing_violations > violations
+            high_us = array.last_max_high_s * 1e6
+            for board, raw in enumerate(values):
+                member = members.get((board, channel))
+                if member is not None:
+                    member._receive(timestamp, raw, violated, high_us)
+
+
+class GroupMember(LoadCellSampler):
+    mode = "group"
+
+    def __init__(self, filters=None, sensor="hx711", buffer_size=DEFAULT_BUFFER_SIZE):
+        super().__init__(None, buffer_size, filters=filters, sensor=sensor)
+        self.calibration = LinearScale()
+        self.group = None
+
+    def start(self):
+        self.group.start()
+
+    def stop(self, timeout=2.0):
+        self.group.stop(timeout)
+
+
+CHANNEL_SPECS = {"A": ("A", 128), "A128": ("A", 128), "A64": ("A", 64), "B": ("B", 32), "B32": ("B", 32)}
+
+
+def _env_list(name, default):
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+def open_loadcells():
+    """
+    Create the backend's load cell samplers from the environment.
+
+    Returns:
+        dict of sensor name -> sampler (not started; the first entry is the primary
+        sensor), empty if disabled or unavailable
+    """
+    if os.getenv("LOADCELL", "1").lower() in ("0", "false", "no"):
+        print("Load cell disabled (LOADCELL=0)")
+        return {}
+    douts = [int(pin) for pin in _env_list("LOADCELL_DOUT", str(DEFAULT_DOUT_PIN))]
+    sck = int(os.getenv("LOADCELL_SCK", DEFAULT_SCK_PIN))
+    edge = os.getenv("LOADCELL_EDGE", "1").lower() not in ("0", "false", "no")
+    backend = os.getenv("LOADCELL_GPIO", "rpi").lower()
+    names = _env_list("LOADCELL_SENSOR", ",".join(f"hx711-dout{pin}" for pin in douts))
+    try:
+        channels = [CHANNEL_SPECS[c.upper()] for c in _env_list("LOADCELL_CHANNELS", "A")]
+        if len(names) != len(douts):
+            raise ValueError(f"{len(names)} LOADCELL_SENSOR names for {len(douts)} DOUT pins")
+        sps = float(os.getenv("LOADCELL_SPS", DEFAULT_SPS))
+        if sps <= 0:
+            raise ValueError("LOADCELL_SPS must be > 0")
+    except (KeyError, ValueError) as e:
+        print(f"⚠ Invalid load cell configuration ({e}); load will read 0 N")
+        return {}
+
+    def filters(rate_hz=sps):
+        # One chain per sensor: the stages keep per-signal state
+        try:
+            return build_chain(os.getenv("LOADCELL_FILTER", DEFAULT_CHAIN), rate_hz)
+        except ValueError as e:
+            print(f"⚠ Invalid LOADCELL_FILTER ({e}); force will not be filtered")
+            return FilterChain(rate_hz=rate_hz)
+
+    if len(douts) > 1 or channels != [("A", 128)]:
+        if os.getenv("LOADCELL_PROCESS", "").lower() in ("1", "true", "yes"):
+            print("⚠ LOADCELL_PROCESS supports a single channel-A board; reading in-process")
+        try:
+            from gpio_drivers import open_gpio
+            from read_loadcell import HX711Array
+            array = HX711Array(douts, sck, channels, gpio=open_gpio(backend, douts, sck), edge_triggered=edge)
+        except Exception as e:
+            print(f"⚠ Load cells unavailable ({e}); load will read 0 N")
+            return {}
+        members = {}
+        samplers = {}
+        rate_hz = sps
+        if len(channels) > 1:
+            # Each channel gets `dwell` of every `dwell + settle` conversions, in turn
+            rate_hz = sps * array.dwell / (len(channels) * (array.dwell + array.settle))
+        for board, name in enumerate(names):
+            for channel in dict.fromkeys(c for c, _ in channels):
+                sensor = name if channel == "A" else f"{name}-B"
+                samplers[sensor] = members[(board, channel)] = GroupMember(filters(rate_hz), sensor)
+        LoadCellGroup(array, members)
+        mode = "edge interrupt" if array.edge_triggered else "polling"
+        print(f"✓ {len(douts)} HX711 board(s) on DOUT={','.join(map(str, douts))}, shared SCK={sck} "
+              f"({backend} GPIO, {mode}, channels {'/'.join(f'{c}{g}' for c, g in channels)}): "
+              f"{', '.join(samplers)}")
+        return samplers
+
+    dout, sensor = douts[0], names[0]
+    if os.getenv("LOADCELL_PROCESS", "").lower() in ("1", "true", "yes"):
+        cpu = os.getenv("LOADCELL_CPU")
+        priority = os.getenv("LOADCELL_RT_PRIORITY")
+        print(f"✓ HX711 load cell on DOUT={dout}, SCK={sck} ({backend} GPIO, isolated process"
+              f"{f', CPU {cpu}' if cpu else ''}{f', SCHED_FIFO {priority}' if priority else ''})")
+        return {sensor: LoadCellProcess(dout, sck, backend, edge,
+                                        cpu=int(cpu) if cpu else None,
+                                        rt_priority=int(priority) if priority else None,
+                                        filters=filters(), sensor=sensor)}
+
+    try:
+        from gpio_drivers import open_gpio
+        from read_loadcell import HX711
+        hx711 = HX711(dout, sck, gpio=open_gpio(backend, dout, sck), edge_triggered=edge)
+    except Exception as e:
+        print(f"⚠ Load cell unavailable ({e}); load will read 0 N")
+        return {}
+    mode = "edge interrupt" if hx711.edge_triggered else "polling"
+    print(f"✓ HX711 load cell on DOUT={dout}, SCK={sck} ({backend} GPIO, {mode})")
+    return {sensor: LoadCellSampler(hx711, filters=filters(), sensor=sensor)}
+
+
+def acquire(args):
+    """Acquisition process main loop: read the HX711 and write records to stdout."""
+    if args.cpu is not None:
+        os.sched_setaffinity(0, {args.cpu})
+    if args.rt_priority:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(args.rt_priority))
+        except OSError as e:
+            print(f"⚠ SCHED_FIFO not granted ({e}); running with normal priority", file=sys.stderr)
+    # Nothing here allocates much; a collection pause mid-read is what we are avoiding
+    gc.disable()
+    # stdout carries the binary records; send the driver's prints to stderr
+    out = sys.stdout.buffer
+    sys.stdout = sys.stderr
+
+    from gpio_drivers import open_gpio
+    from read_loadcell import HX711
+    hx711 = HX711(args.dout, args.sck, gpio=open_gpio(args.gpio, args.dout, args.sck),
+                  edge_triggered=args.edge)
+    while True:
+        violations = hx711.timing_violations
+        try:
+            raw = hx711.read()
+            flags = FLAG_TIMING_VIOLATION if hx711.timing_violations > violations else 0
+        except Exception:
+            raw, flags = 0, FLAG_READ_ERROR
+        try:
+            out.write(RECORD.pack(time.time(), raw, flags, hx711.last_max_high_s * 1e6))
+            out.flush()
+        except BrokenPipeError:
+            return   # backend went away
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HX711 acquisition process for the RehaGrip backend")
+    parser.add_argument("--acquire", action="store_true", required=True)
+    parser.add_argument("--dout", type=int, default=DEFAULT_DOUT_PIN)
+    parser.add_argument("--sck", type=int, default=DEFAULT_SCK_PIN)
+    parser.add_argument("--gpio", default="rpi")
+    parser.add_argument("--no-edge", dest="edge", action="store_false")
+    parser.add_argument("--cpu", type=int)
+    parser.add_argument("--rt-priority", type=int)
+    try:
+        acquire(parser.parse_args())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,266 @@
+"""
+Motion commands for the RehaGrip motor.
+
+Profile Acceleration (108), Profile Velocity (112) and Goal Position (116) are
+contiguous 4-byte registers in the XM430 control table. Writing them as three
+separate TxRx transactions costs three round trips and leaves a window where
+the new velocity is active but the goal has not arrived yet. `send_motion`
+packs all three into one 12-byte write instead, optionally without waiting for
+the status packet (`ack=False`, for streamed setpoints).
+
+Move completion is detected from telemetry rather than fixed sleeps:
+`ArrivalWatcher` listens to every telemetry sample and resolves a future once
+Moving Status reports in-position with the profile finished at the target. A
+move that stops short of the target is reported as stalled, and one that takes
+too long as a timeout.
+
+`MoveRegistry` gives each move an ID so the move endpoint can return at once
+and clients can poll or long-poll the outcome.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import NamedTuple
+
+from bus import PRIORITY_COMMAND
+from clock import MonotonicClock
+
+# ----- Control table (XM430-W210, protocol 2.0) -----
+ADDR_PROFILE_ACCELERATION = 108
+ADDR_PROFILE_VELOCITY = 112
+ADDR_GOAL_POSITION = 116
+
+MOTION_BLOCK_ADDR = ADDR_PROFILE_ACCELERATION
+MOTION_BLOCK_LEN = 12
+
+DEFAULT_PROFILE_ACCELERATION = 50
+VELOCITY_LIMIT = 265               # factory Velocity Limit, used when Profile Velocity is 0
+
+# Moving Status (123) bits
+MOVING_STATUS_IN_POSITION = 0x01
+MOVING_STATUS_PROFILE_ONGOING = 0x02
+
+TICKS_PER_REV = 4096
+VELOCITY_UNIT_RPM = 0.229
+ACCELERATION_UNIT_RPM2 = 214.577
+
+
+def estimate_move_time(distance_ticks, velocity_raw, acceleration_raw):
+    """Duration of the firmware's trapezoidal profile for a move, in seconds."""
+    distance = abs(distance_ticks)
+    v = (velocity_raw or VELOCITY_LIMIT) * VELOCITY_UNIT_RPM * TICKS_PER_REV / 60.0
+    a = acceleration_raw * ACCELERATION_UNIT_RPM2 * TICKS_PER_REV / 3600.0
+    if a <= 0:
+        return distance / v
+    if distance < v * v / a:
+        return 2 * (distance / a) ** 0.5     # triangular: never reaches cruise velocity
+    return distance / v + v / a
+
+
+def arrival_timeout(distance_ticks, velocity_raw, acceleration_raw=DEFAULT_PROFILE_ACCELERATION):
+    """Generous timeout for a move: 1.5x the profile duration plus one second."""
+    return 1.5 * estimate_move_time(distance_ticks, velocity_raw, acceleration_raw) + 1.0
+
+
+def encode_motion_command(acceleration, velocity, goal_tick):
+    """Little-endian bytes for Profile Acceleration, Profile Velocity and Goal Position."""
+    data = []
+    for value in (acceleration, velocity, goal_tick):
+        data += list((int(value) & 0xFFFFFFFF).to_bytes(4, "little"))
+    return data
+
+
+def motion_registers(acceleration, velocity, goal_tick):
+    """Register values covered by one motion command (for the bus shadow cache)."""
+    return {
+        ADDR_PROFILE_ACCELERATION: int(acceleration),
+        ADDR_PROFILE_VELOCITY: int(velocity),
+        ADDR_GOAL_POSITION: int(goal_tick),
+    }
+
+
+async def send_motion(bus, acceleration, velocity, goal_tick, ack=True, priority=PRIORITY_COMMAND):
+    """Send acceleration, velocity and goal as one atomic 12-byte write."""
+    return await bus.write_block(
+        MOTION_BLOCK_ADDR,
+        encode_motion_command(acceleration, velocity, goal_tick),
+        ack=ack,
+        registers=motion_registers(acceleration, velocity, goal_tick),
+        priority=priority,
+    )
+
+
+def send_motion_sync(bus, acceleration, velocity, goal_tick, ack=True, priority=PRIORITY_COMMAND):
+    """Blocking variant of `send_motion` for startup code."""
+    return bus.write_block_sync(
+        MOTION_BLOCK_ADDR,
+        encode_motion_command(acceleration, velocity, goal_tick),
+        ack=ack,
+        registers=motion_registers(acceleration, velocity, goal_tick),
+        priority=priority,
+    )
+
+
+class MoveResult(NamedTuple):
+    status: str          # "arrived", "stalled", "timeout" or "superseded"
+    position_tick: int
+    target_tick: int
+    elapsed_s: float
+
+
+class _Watch:
+    def __init__(self, target_tick, deadline, started, position_tick):
+        self.target_tick = target_tick
+        self.deadline = deadline
+        self.started = started
+        self.future = Future()
+        self.skip = 1                  # the sample in flight may predate the goal write
+        self.last_tick = position_tick
+        self.last_change = started
+
+
+class ArrivalWatcher:
+    def __init__(self, telemetry, clock=None, tolerance=8, stall_s=0.5):
+        """
+        Args:
+            telemetry (TelemetryPoller): Source of Moving / Moving Status samples
+            clock: Time source for timeouts and stall detection (default: real time)
+            tolerance (int): Max |position - target| in ticks counted as arrived
+            stall_s (float): Position unchanged this long away from the target = stalled
+        """
+        self.telemetry = telemetry
+        self.clock = clock or MonotonicClock()
+        self.tolerance = tolerance
+        self.stall_s = stall_s
+        self._watches = []
+        self._lock = threading.Lock()
+        telemetry.subscribe(self._on_sample)
+
+    def watch(self, target_tick, timeout_s):
+        """
+        Start watching for arrival at `target_tick` (call right after the goal write).
+
+        Any move still being watched is resolved as "superseded".
+
+        Returns:
+            concurrent.futures.Future resolving to a `MoveResult`
+        """
+        now = self.clock.now()
+        snap = self.telemetry.snapshot
+        position = snap.position_tick if snap else target_tick
+        watch = _Watch(int(target_tick), now + timeout_s, now, position)
+        with self._lock:
+            previous, self._watches = self._watches, [watch]
+        for old in previous:
+            self._resolve(old, "superseded", position, now)
+        return watch.future
+
+    async def wait(self, target_tick, timeout_s):
+        """Await arrival at `target_tick`; returns a `MoveResult`."""
+        future = self.watch(target_tick, timeout_s)
+        try:
+            # Backstop in case telemetry stops delivering samples
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout_s + 1.0)
+        except asyncio.TimeoutError:
+            return self._expire(future)
+
+    def wait_sync(self, target_tick, timeout_s):
+        """Blocking variant of `wait` for startup code."""
+        future = self.watch(target_tick, timeout_s)
+        try:
+            return future.result(timeout_s + 1.0)
+        except Exception:
+            return self._expire(future)
+
+    def _expire(self, future):
+        with self._lock:
+            watch = next((w for w in self._watches if w.future is future), None)
+        if watch is not None:
+            snap = self.telemetry.snapshot
+            self._resolve(watch, "timeout", snap.position_tick if snap else watch.last_tick, self.clock.now())
+        return future.result()
+
+    def _resolve(self, watch, status, position_tick, now):
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+        if not watch.future.done():
+            watch.future.set_result(MoveResult(status, position_tick, watch.target_tick, now - watch.started))
+
+    def _on_sample(self, snap):
+        with self._lock:
+            watches = list(self._watches)
+        if not watches:
+            return
+        now = self.clock.now()
+        for watch in watches:
+            if watch.skip:
+                watch.skip -= 1
+                continue
+            pos = snap.position_tick
+            if abs(pos - watch.last_tick) > 1:
+                watch.last_tick = pos
+                watch.last_change = now
+
+            near = abs(pos - watch.target_tick) <= self.tolerance
+            in_position = snap.moving_status & MOVING_STATUS_IN_POSITION
+            profile_done = not snap.moving_status & MOVING_STATUS_PROFILE_ONGOING
+            if near and in_position and profile_done:
+                self._resolve(watch, "arrived", pos, now)
+            elif not near and now - watch.last_change >= self.stall_s:
+                self._resolve(watch, "stalled", pos, now)
+            elif now >= watch.deadline:
+                self._resolve(watch, "timeout", pos, now)
+
+
+class MoveRegistry:
+    def __init__(self, history=64):
+        """
+        Args:
+            history (int): Number of recent moves kept for lookup
+        """
+        self.history = history
+        self._moves = OrderedDict()
+        self._futures = {}
+        self._ids = itertools.count(1)
+
+    def add(self, target_tick, future, **info):
+        """Register a move whose `MoveResult` future is pending; returns its record."""
+        move_id = next(self._ids)
+        record = {
+            "move_id": move_id,
+            "target_tick": int(target_tick),
+            "status": "moving",
+            "started": time.time(),
+            "position_tick": None,
+            "elapsed_s": None,
+            **info,
+        }
+        self._moves[move_id] = record
+        self._futures[move_id] = future
+        while len(self._moves) > self.history:
+            old_id, _ = self._moves.popitem(last=False)
+            self._futures.pop(old_id, None)
+
+        def finish(f):
+            result = f.result()
+            record.update(status=result.status, position_tick=result.position_tick,
+                          elapsed_s=result.elapsed_s)
+        future.add_done_callback(finish)
+        return record
+
+    def get(self, move_id):
+        return self._moves.get(move_id)
+
+    async def wait(self, move_id, timeout_s):
+        """Long-poll: return the record once the move finishes or `timeout_s` passes."""
+        future = self._futures.get(move_id)
+        if future is not None and not future.done():
+            await asyncio.wait({asyncio.wrap_future(future)}, timeout=timeout_s)
+            # Let the done-callback land before reading the record
+            await asyncio.sleep(0)
+        return self._moves.get(move_id)
@@ -0,0 +1,78 @@
+"""
+Smooth point-to-point trajectories for the RehaGrip motor.
+
+A plain goal write makes the firmware run a trapezoidal profile: constant
+acceleration that switches on and off instantly, which patients feel as a jolt
+at the start and end of every move. This module precomputes jerk-limited
+setpoint sequences instead, for `TrajectoryRunner` to stream:
+
+- `min_jerk` — the minimum-jerk polynomial 10t^3 - 15t^4 + 6t^5 (zero velocity
+  and acceleration at both ends; peak velocity 1.875 x average).
+- `s_curve` — a cycloidal S-curve t - sin(2 pi t) / (2 pi) (sinusoidal
+  acceleration, bounded jerk; peak velocity 2 x average).
+
+The normalized 0..1 curve is cached by (shape, sample count), which depends
+only on duration and rate. A move starts from the live position, so caching
+whole tick arrays would rarely hit; each move instead scales and offsets the
+cached curve in one vectorized pass, and the streaming loop does no
+per-sample math.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+TICKS_PER_DEGREE = 4095 / 360
+
+SHAPES = ("min_jerk", "s_curve")
+PEAK_VELOCITY_FACTOR = {"min_jerk": 1.875, "s_curve": 2.0}
+
+
+def _normalized(shape, tau):
+    """Position fraction 0..1 for normalized time `tau` (array)."""
+    if shape == "min_jerk":
+        return tau ** 3 * (10 - 15 * tau + 6 * tau ** 2)
+    if shape == "s_curve":
+        return tau - np.sin(2 * np.pi * tau) / (2 * np.pi)
+    raise ValueError(f"Unknown profile shape '{shape}' (expected one of {', '.join(SHAPES)})")
+
+
+def duration_for(distance_deg, peak_deg_s, shape="min_jerk"):
+    """Shortest duration (s) whose peak velocity stays at or below `peak_deg_s`."""
+    if peak_deg_s <= 0:
+        raise ValueError("Peak velocity must be > 0")
+    return PEAK_VELOCITY_FACTOR[shape] * abs(distance_deg) / peak_deg_s
+
+
+def peak_velocity(distance_deg, duration_s, shape="min_jerk"):
+    """Peak velocity (deg/s) of a move of `distance_deg` over `duration_s`."""
+    return PEAK_VELOCITY_FACTOR[shape] * abs(distance_deg) / duration_s
+
+
+@lru_cache(maxsize=64)
+def _curve(shape, n):
+    """Cached position fractions for `n` evenly spaced samples (read-only)."""
+    fraction = _normalized(shape, np.linspace(0.0, 1.0, n))
+    fraction.setflags(write=False)
+    return fraction
+
+
+def smooth_ticks(start_tick, end_tick, duration_s, rate_hz, shape="min_jerk"):
+    """
+    Goal ticks for a smooth move, one per control period, both ends included.
+
+    Args:
+        start_tick (int): Position the move starts from
+        end_tick (int): Position the move ends at
+        duration_s (float): Move duration in seconds
+        rate_hz (float): Streaming rate
+
+    Returns:
+        `np.ndarray` of int32 ticks
+    """
+    if duration_s <= 0 or rate_hz <= 0:
+        raise ValueError("Duration and rate must be > 0")
+    n = int(round(duration_s * rate_hz)) + 1
+    ticks = np.rint(start_tick + (end_tick - start_tick) * _curve(shape, n)).astype(np.int32)
+    np.clip(ticks, 0, 4095, out=ticks)
+    return ticks
@@ -0,0 +1,316 @@
+"""
+Server-side rehab exercise programs for the RehaGrip motor.
+
+`motor.py` used to be the only way to cycle the hand open and closed, as a
+standalone script that fought `server.py` for the serial port. `ProgramEngine`
+runs the same kind of exercise inside the backend as an asyncio background
+task, so a session needs no HTTP round trip per rep and the GUI only observes
+`status()`.
+
+Programs are compiled before they run into a `ProgramPlan`: flat, parallel
+tuples of steps (move to a goal tick at a velocity, or hold for a time,
+optionally until a force condition) annotated with set/rep counters. The
+engine only indexes into these arrays. `plan_exercise` builds the plan for the
+classic exercise (sets of open/close repetitions between two positions with
+dwell, rest and a velocity ramp); `program_dsl.py` compiles therapist-written
+programs into the same form.
+
+The engine does not touch the bus itself. The server hands it a `move`
+coroutine (goal tick, velocity -> `MoveResult`), a `can_move` check and a
+`force` source, so emergency stop, lock and torque rules stay in one place.
+Hold and rest timing is measured from actual arrival, and time spent paused is
+not counted.
+"""
+
+import asyncio
+import itertools
+import operator
+import time
+from typing import NamedTuple
+
+from clock import MonotonicClock
+from motion import estimate_move_time, DEFAULT_PROFILE_ACCELERATION, VELOCITY_LIMIT
+
+PAUSE_POLL_S = 0.05
+MAX_PROGRAM_DEG = 60.0             # same limit as saved presets
+TICKS_PER_DEGREE = 4095 / 360
+
+OP_MOVE = 0
+OP_HOLD = 1
+
+COMPARATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+
+class ExerciseSpec(NamedTuple):
+    open_deg: float
+    close_deg: float
+    reps: int = 10
+    sets: int = 1
+    dwell_open_s: float = 1.0
+    dwell_close_s: float = 1.0
+    rest_between_reps_s: float = 0.0
+    rest_between_sets_s: float = 30.0
+    start_velocity: int = 50
+    end_velocity: int = 50      # linear ramp from start to end across all reps
+
+
+class ProgramPlan(NamedTuple):
+    name: str
+    digest: str           # content hash of the source the plan was compiled from
+    ops: tuple            # OP_MOVE / OP_HOLD
+    ticks: tuple          # goal tick (moves)
+    velocities: tuple     # Profile Velocity (moves)
+    seconds: tuple        # hold time, or timeout for a conditional hold
+    conditions: tuple     # (comparator, newtons) ending a hold early, or None
+    phases: tuple         # label shown in the status
+    sets: tuple           # set number per step (1-based)
+    reps: tuple           # rep number within the set (1-based)
+    rep_end: tuple        # True on the last step of each rep
+    reps_total: int
+    sets_total: int
+    nominal_s: float      # expected duration if every move runs its full profile
+    center_tick: int      # ticks are only valid for the center/hand they were compiled for
+    hand: str
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "digest": self.digest,
+            "steps": len(self.ops),
+            "moves": self.ops.count(OP_MOVE),
+            "sets": self.sets_total,
+            "reps_total": self.reps_total,
+            "nominal_duration_s": round(self.nominal_s, 2),
+        }
+
+
+class PlanBuilder:
+    def __init__(self, center_tick, hand="right", start_tick=None):
+        """
+        Args:
+            center_tick (int): Tick that 0 degrees maps to
+            hand (str): "left" mirrors all angles
+            start_tick (int): Expected position before the first move (for `nominal_s`)
+        """
+        self.center_tick = center_tick
+        self.hand = hand
+        self.sign = -1 if hand == "left" else 1
+        self.set_no = 1
+        self.rep_no = 1
+        self._last_tick = start_tick
+        self._nominal = 0.0
+        self._rows = []
+
+    def tick(self, degrees):
+        if abs(degrees) > MAX_PROGRAM_DEG:
+            raise ValueError(f"Position {degrees:g} deg is outside +/-{MAX_PROGRAM_DEG:g} deg")
+        return max(0, min(4095, int(self.center_tick + self.sign * degrees * TICKS_PER_DEGREE)))
+
+    def _add(self, op, tick, velocity, seconds, until, phase):
+        self._rows.append([op, tick, velocity, seconds, until, phase, self.set_no, self.rep_no, False])
+
+    def move(self, degrees, velocity, phase="move"):
+        velocity = int(round(velocity))
+        if not 1 <= velocity <= VELOCITY_LIMIT:
+            raise ValueError(f"Velocity must be between 1 and {VELOCITY_LIMIT} (got {velocity})")
+        tick = self.tick(degrees)
+        if self._last_tick is not None:
+            self._nominal += estimate_move_time(tick - self._last_tick, velocity, DEFAULT_PROFILE_ACCELERATION)
+        self._last_tick = tick
+        self._add(OP_MOVE, tick, velocity, 0.0, None, phase)
+
+    def hold(self, seconds, phase="hold", until=None):
+        if seconds < 0:
+            raise ValueError("Hold and rest times must be >= 0")
+        if until is not None and until[0] not in COMPARATORS:
+            raise ValueError(f"Unknown comparator '{until[0]}'")
+        if seconds > 0 or until is not None:
+            self._nominal += seconds
+            self._add(OP_HOLD, self._last_tick, 0, float(seconds), until, phase)
+
+    @property
+    def reps_marked(self):
+        return any(row[8] for row in self._rows)
+
+    def end_rep(self):
+        """Mark the last step as completing a repetition."""
+        if self._rows:
+            self._rows[-1][8] = True
+
+    def build(self, name=None, digest=""):
+        if not any(row[0] == OP_MOVE for row in self._rows):
+            raise ValueError("Program has no moves")
+        columns = [tuple(c) for c in zip(*self._rows)]
+        return ProgramPlan(
+            name=name, digest=digest,
+            ops=columns[0], ticks=columns[1], velocities=columns[2], seconds=columns[3],
+            conditions=columns[4], phases=columns[5], sets=columns[6], reps=columns[7],
+            rep_end=columns[8], reps_total=sum(columns[8]), sets_total=max(columns[6]),
+            nominal_s=self._nominal, center_tick=self.center_tick, hand=self.hand,
+        )
+
+
+def plan_exercise(spec, center_tick, hand="right", start_tick=None, name=None):
+    """Compile an open/close `ExerciseSpec` into a `ProgramPlan`."""
+    if spec.reps < 1 or spec.sets < 1:
+        raise ValueError("reps and sets must be >= 1")
+    builder = PlanBuilder(center_tick, hand, start_tick)
+    total = spec.reps * spec.sets
+    index = 0
+    for set_no in range(1, spec.sets + 1):
+        builder.set_no = set_no
+        for rep in range(1, spec.reps + 1):
+            builder.rep_no = rep
+            frac = index / (total - 1) if total > 1 else 0.0
+            velocity = spec.start_velocity + (spec.end_velocity - spec.start_velocity) * frac
+            builder.move(spec.open_deg, velocity, "opening")
+            builder.hold(spec.dwell_open_s, "dwell_open")
+            builder.move(spec.close_deg, velocity, "closing")
+            builder.hold(spec.dwell_close_s, "dwell_close")
+            builder.end_rep()
+            index += 1
+            if rep < spec.reps:
+                builder.hold(spec.rest_between_reps_s, "rest")
+        if set_no < spec.sets:
+            builder.hold(spec.rest_between_sets_s, "set_rest")
+    return builder.build(name)
+
+
+class ProgramAborted(Exception):
+    pass
+
+
+class ProgramEngine:
+    def __init__(self, move, can_move, force=None, clock=None):
+        """
+        Args:
+            move: `async move(goal_tick, velocity) -> MoveResult`
+            can_move: `can_move() -> bool`; checked before every step
+            force: `force() -> float` in newtons, for conditional holds
+            clock: Time source for hold/rest timing (default: real time)
+        """
+        self.move = move
+        self.can_move = can_move
+        self.force = force or (lambda: 0.0)
+        self.clock = clock or MonotonicClock()
+        self._ids = itertools.count(1)
+        self._task = None
+        self._loop = None
+        self._resume = asyncio.Event()
+        self._abort = False
+        self._status = {"state": "idle"}
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def status(self):
+        return dict(self._status)
+
+    def start(self, plan):
+        """Run `plan` as a background task on the running event loop."""
+        if self.running:
+            raise RuntimeError("A program is already running")
+        self._abort = False
+        self._resume.set()
+        self._status = {
+            "program_id": next(self._ids),
+            "name": plan.name,
+            "digest": plan.digest,
+            "state": "running",
+            "phase": "starting",
+            "step": 0,
+            "steps_total": len(plan.ops),
+            "set": 0,
+            "rep": 0,
+            "sets": plan.sets_total,
+            "reps_completed": 0,
+            "reps_total": plan.reps_total,
+            "velocity": plan.velocities[plan.ops.index(OP_MOVE)],
+            "stalls": 0,
+            "nominal_duration_s": round(plan.nominal_s, 2),
+            "started": time.time(),
+            "finished": None,
+            "error": None,
+        }
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run(plan))
+        return self.status()
+
+    def pause(self):
+        if self.running:
+            self._resume.clear()
+            self._status["state"] = "paused"
+
+    def resume(self):
+        if self.running:
+            self._status["state"] = "running"
+            self._resume.set()
+
+    def abort(self):
+        """Stop the running program; safe to call from other threads (e.g. the safety supervisor)."""
+        self._abort = True
+        try:
+            same_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            same_loop = False
+        if same_loop or self._loop is None or self._loop.is_closed():
+            self._resume.set()
+        else:
+            self._loop.call_soon_threadsafe(self._resume.set)
+
+    # ----- Execution -----
+    async def _checkpoint(self):
+        """Block while paused; raise if aborted or moving is no longer allowed."""
+        await self._resume.wait()
+        if self._abort:
+            raise ProgramAborted("aborted")
+        if not self.can_move():
+            raise ProgramAborted("motor locked, torque off or emergency stop")
+
+    async def _hold(self, seconds, until):
+        """Sleep `seconds` of running time (paused time does not count), or until the force condition holds."""
+        test = COMPARATORS[until[0]] if until else None
+        remaining = seconds
+        while remaining > 0 or (test and not seconds):
+            await self._checkpoint()
+            if test and test(self.force(), until[1]):
+                return
+            step = min(PAUSE_POLL_S, remaining) if remaining > 0 else PAUSE_POLL_S
+            t0 = self.clock.now()
+            await self.clock.asleep(step)
+            remaining -= self.clock.now() - t0
+
+    async def _go(self, tick, velocity):
+        await self._checkpoint()
+        result = await self.move(tick, velocity)
+        if result.status == "stalled":
+            self._status["stalls"] += 1
+        elif result.status != "arrived":
+            raise ProgramAborted(f"move {result.status} at tick {result.position_tick}")
+
+    async def _run(self, plan):
+        status = self._status
+        try:
+            for i in range(len(plan.ops)):
+                status.update(step=i + 1, set=plan.sets[i], rep=plan.reps[i], phase=plan.phases[i])
+                if plan.ops[i] == OP_MOVE:
+                    status["velocity"] = plan.velocities[i]
+                    await self._go(plan.ticks[i], plan.velocities[i])
+                else:
+                    await self._hold(plan.seconds[i], plan.conditions[i])
+                if plan.rep_end[i]:
+                    status["reps_completed"] += 1
+            status["state"] = "completed"
+        except ProgramAborted as e:
+            status["state"] = "aborted"
+            status["error"] = str(e)
+        except Exception as e:
+            status["state"] = "failed"
+            status["error"] = str(e)
+            print(f"Program {status['program_id']} failed: {e}")
+        finally:
+            status["phase"] = None
+            status["finished"] = time.time()
+            print(f"Program {status['program_id']} {status['state']}: "
+                  f"{status['reps_completed']}/{status['reps_total']} reps")
@@ -0,0 +1,316 @@
+"""
+Therapy-program language for RehaGrip exercise programs.
+
+Therapists write a program once, either in YAML or in a small text language,
+and it is compiled into a flat `ProgramPlan` (see `program.py`) before it runs:
+loops are unrolled, preset names resolved, angles turned into goal ticks for
+the current center/hand, and velocities and hold times fixed per step. The
+engine then only indexes into the plan's arrays at runtime.
+
+Text form (parsed with Lark):
+
+    program "Grip warm-up"
+    velocity 60
+    repeat 3 {              # sets
+        repeat 10 {         # reps
+            move "Open" at 80
+            hold 2
+            move -10
+            hold 5 until force > 15
+            rest 1
+        }
+        rest 30
+    }
+
+YAML form (same statements):
+
+    name: Grip warm-up
+    velocity: 60
+    steps:
+      - repeat: 10
+        steps:
+          - move: Open
+            velocity: 80
+          - hold: 2
+          - move: -10
+          - hold: 5
+            until: force > 15
+
+Statements: `move <preset|degrees> [at N]` (N is the velocity for this move
+only), `hold [seconds] [until force <op> N]` (seconds is a timeout for
+conditional holds; omitted = wait for the condition), `rest <seconds>`,
+`velocity N` (default for later moves in the same block) and `repeat N { ... }`.
+In YAML the per-move velocity is a `velocity:` key next to `move:`. Each pass through an innermost `repeat` counts as
+one rep; each pass through an enclosing `repeat` as one set.
+
+`PlanCache` keys compiled plans by a SHA-256 of the source and its format
+together with everything it was compiled against (presets, center tick, hand,
+default velocity), so re-sending the same program, or starting it by digest, costs a
+dictionary lookup.
+"""
+
+import hashlib
+import json
+import re
+from collections import OrderedDict
+
+import yaml
+from lark import Lark, Transformer, LarkError
+
+from program import PlanBuilder
+
+MAX_PLAN_STEPS = 100_000
+
+GRAMMAR = r"""
+    start: header? stmt*
+    header: "program" STRING
+
+    ?stmt: move | hold | rest | velocity | repeat
+    move: "move" target ["at" NUMBER]
+    ?target: STRING          -> preset
+           | SIGNED_NUMBER   -> angle
+    hold: "hold" [NUMBER] [condition]
+    condition: "until" "force" COMPARATOR SIGNED_NUMBER
+    rest: "rest" NUMBER
+    velocity: "velocity" NUMBER
+    repeat: "repeat" INT "{" stmt* "}"
+
+    COMPARATOR: ">=" | "<=" | ">" | "<"
+    COMMENT: /#[^\n]*/
+
+    %import common.ESCAPED_STRING -> STRING
+    %import common.SIGNED_NUMBER
+    %import common.NUMBER
+    %import common.INT
+    %import common.WS
+    %ignore WS
+    %ignore COMMENT
+"""
+
+_CONDITION = re.compile(r"^\s*force\s*(>=|<=|>|<)\s*(-?\d+(?:\.\d+)?)\s*N?\s*$")
+
+_parser = Lark(GRAMMAR, parser="lalr")
+
+
+class _ToNodes(Transformer):
+    """Turn the Lark parse tree into the same node dicts the YAML form uses."""
+
+    def start(self, items):
+        program = {"name": None, "steps": []}
+        for item in items:
+            if isinstance(item, tuple):
+                program["name"] = item[1]
+            else:
+                program["steps"].append(item)
+        return program
+
+    def header(self, items):
+        return ("name", json.loads(items[0]))
+
+    def preset(self, items):
+        return json.loads(items[0])
+
+    def angle(self, items):
+        return float(items[0])
+
+    def move(self, items):
+        node = {"move": items[0]}
+        if items[1] is not None:
+            node["velocity"] = float(items[1])
+        return node
+
+    def condition(self, items):
+        return f"force {items[0]} {items[1]}"
+
+    def hold(self, items):
+        node = {"hold": float(items[0]) if items[0] is not None else 0.0}
+        if items[1] is not None:
+            node["until"] = items[1]
+        return node
+
+    def rest(self, items):
+        return {"rest": float(items[0])}
+
+    def velocity(self, items):
+        return {"velocity": float(items[0])}
+
+    def repeat(self, items):
+        return {"repeat": int(items[0]), "steps": list(items[1:])}
+
+
+def parse_program(source, fmt=None):
+    """
+    Parse program text into `{"name": ..., "steps": [...]}`.
+
+    Args:
+        source (str): Program text
+        fmt (str): "yaml", "dsl" or None to detect (YAML mappings are YAML, anything else DSL)
+    """
+    if fmt not in (None, "yaml", "dsl"):
+        raise ValueError(f"Unknown program format '{fmt}'")
+    if fmt in (None, "yaml"):
+        try:
+            data = yaml.safe_load(source)
+        except yaml.YAMLError as e:
+            if fmt == "yaml":
+                raise ValueError(f"Invalid YAML: {e}")
+            data = None
+        if isinstance(data, dict):
+            steps = data.get("steps")
+            if not isinstance(steps, list):
+                raise ValueError("YAML program needs a 'steps' list")
+            if "velocity" in data:
+                steps = [{"velocity": data["velocity"]}] + steps
+            return {"name": data.get("name"), "steps": steps}
+        if fmt == "yaml":
+            raise ValueError("YAML program must be a mapping with 'steps'")
+    try:
+        return _ToNodes().transform(_parser.parse(source))
+    except LarkError as e:
+        raise ValueError(f"Invalid program: {e}")
+
+
+def _parse_condition(text):
+    match = _CONDITION.match(str(text))
+    if not match:
+        raise ValueError(f"Cannot parse condition '{text}' (expected e.g. 'force > 15')")
+    return match.group(1), float(match.group(2))
+
+
+def _number(node, field, integer=False):
+    """`node[field]` as a number; ValueError naming the field for null or non-numeric values."""
+    value = node[field]
+    kinds = (int,) if integer else (int, float)
+    if isinstance(value, bool) or not isinstance(value, kinds):
+        kind = "an integer" if integer else "a number"
+        raise ValueError(f"'{field}' must be {kind} (got {value!r})")
+    return value if integer else float(value)
+
+
+def _has_repeat(steps):
+    return any(isinstance(s, dict) and "repeat" in s for s in steps)
+
+
+class _Compiler:
+    def __init__(self, builder, presets):
+        self.builder = builder
+        self.presets = presets
+        self.steps = 0
+
+    def position(self, target):
+        if isinstance(target, str):
+            if target not in self.presets:
+                raise ValueError(f"Unknown preset '{target}'")
+            return self.presets[target]
+        return _number({"move": target}, "move")
+
+    def block(self, steps, velocity):
+        for node in steps:
+            if not isinstance(node, dict):
+                raise ValueError(f"Invalid step {node!r}")
+            self.steps += 1
+            if self.steps > MAX_PLAN_STEPS:
+                raise ValueError(f"Program expands to more than {MAX_PLAN_STEPS} steps")
+
+            if "repeat" in node:
+                self.repeat(node, velocity)
+            elif "move" in node:
+                move_velocity = _number(node, "velocity") if "velocity" in node else velocity
+                self.builder.move(self.position(node["move"]), move_velocity)
+            elif "hold" in node:
+                until = _parse_condition(node["until"]) if node.get("until") is not None else None
+                # A bare `hold:` with a condition waits for the condition alone
+                seconds = _number(node, "hold") if node["hold"] is not None or until is None else 0.0
+                self.builder.hold(seconds, "hold", until)
+            elif "rest" in node:
+                self.builder.hold(_number(node, "rest"), "rest")
+            elif "velocity" in node:
+                velocity = _number(node, "velocity")
+            else:
+                raise ValueError(f"Unknown step {node!r}")
+
+    def repeat(self, node, velocity):
+        count = _number(node, "repeat", integer=True)
+        body = node.get("steps") or []
+        if not isinstance(body, list):
+            raise ValueError("repeat 'steps' must be a list")
+        if count < 1:
+            raise ValueError("repeat count must be >= 1")
+        if not body:
+            # Nothing in the body would count against MAX_PLAN_STEPS, so the loop is unbounded
+            raise ValueError("repeat needs at least one statement")
+        if _has_repeat(body):
+            # A loop around loops counts sets
+            for i in range(count):
+                if i:
+                    self.builder.set_no += 1
+                self.block(body, velocity)
+        else:
+            for i in range(count):
+                self.builder.rep_no = i + 1
+                self.block(body, velocity)
+                self.builder.end_rep()
+
+
+def compile_program(source, presets, center_tick, hand="right", velocity=50, fmt=None, digest=""):
+    """
+    Compile program text into a `ProgramPlan`.
+
+    Args:
+        source (str): YAML or DSL text
+        presets (list): `[{"name": ..., "pos": degrees}, ...]` as stored in the preset file
+        center_tick (int): Tick that 0 degrees maps to
+        hand (str): "left" mirrors all angles
+        velocity (float): Profile Velocity for moves that do not set one
+    """
+    program = parse_program(source, fmt)
+    builder = PlanBuilder(center_tick, hand)
+    compiler = _Compiler(builder, {p["name"]: float(p["pos"]) for p in presets})
+    compiler.block(program["steps"], velocity)
+    if not builder.reps_marked:
+        builder.end_rep()      # a program without loops is one rep
+    return builder.build(program["name"], digest)
+
+
+def program_digest(source, presets, center_tick, hand, velocity, fmt=None):
+    key = json.dumps({
+        "source": source,
+        "format": fmt,
+        "presets": {p["name"]: float(p["pos"]) for p in presets},
+        "center_tick": center_tick,
+        "hand": hand,
+        "velocity": velocity,
+    }, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class PlanCache:
+    def __init__(self, size=32):
+        """
+        Args:
+            size (int): Number of compiled plans kept (least recently used are dropped)
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+
+    def compile(self, source, presets, center_tick, hand="right", velocity=50, fmt=None):
+        """Compiled plan for `source`, reusing a cached one when nothing it depends on changed."""
+        digest = program_digest(source, presets, center_tick, hand, velocity, fmt)
+        plan = self.get(digest)
+        if plan is not None:
+            self.hits += 1
+            return plan
+        self.misses += 1
+        plan = compile_program(source, presets, center_tick, hand, velocity, fmt, digest)
+        self._plans[digest] = plan
+        while len(self._plans) > self.size:
+            self._plans.popitem(last=False)
+        return plan
+
+    def get(self, digest):
+        plan = self._plans.get(digest)
+        if plan is not None:
+            self._plans.move_to_end(digest)
+        return plan
@@ -0,0 +1,251 @@
+"""
+Load- and current-triggered emergency stop for the RehaGrip motor.
+
+The only emergency stop used to be `/api/motor/emergency`: the browser has to
+notice the problem, send a request over the network, and the event loop has to
+get to it before torque is cut. `SafetySupervisor` sits next to the sampling
+loops instead. It checks every load cell sample (on the sampler thread) and
+every telemetry sample (on the telemetry thread) against the active patient's
+`SafetyLimits`, and on a violation queues Torque Enable = 0 at
+`PRIORITY_EMERGENCY` straight onto the bus worker, ahead of anything queued —
+no asyncio, HTTP or GUI in the path.
+
+Checks:
+-------
+- Force: compression / tension magnitude (unfiltered N, confirmed over
+  `confirm_samples` consecutive samples so a single glitched read cannot trip)
+  and rate of change of the filtered force, for every attached load cell with
+  the shared limits. A sensor's force checks stay disarmed until it has a
+  fitted `CalibrationProfile`: uncalibrated readings are raw counts, not
+  newtons, and would trip on the first sample.
+- Motor: |Present Current| (mA, XM430 units; see telemetry.py) and its rate of
+  change between telemetry samples.
+
+Every trip is timed from the timestamp of the sample that confirmed it to the
+acknowledged torque-off write, logged, and kept in `trips`; a trip over the
+`budget_ms` latency budget is flagged. Limits are stored per patient next to
+the presets (`$XDG_STATE_HOME/rehagrip/safety_limits.json`, or
+`SAFETY_LIMITS_FILE`); None disables a check.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import NamedTuple
+
+from bus import PRIORITY_EMERGENCY, COMM_SUCCESS
+from calibration import CalibrationProfile
+
+DEFAULT_BUDGET_MS = 20.0
+DEFAULT_PATIENT = "default"
+
+
+class SafetyLimits(NamedTuple):
+    max_compression_n: float = 100.0
+    max_tension_n: float = 100.0
+    max_force_rate_n_s: float = None
+    max_current_ma: float = 1500.0
+    max_current_rate_ma_s: float = None
+    confirm_samples: int = 2       # consecutive over-limit samples before a magnitude trip
+
+
+def resolve_safety_path() -> Path:
+    env = os.getenv("SAFETY_LIMITS_FILE")
+    if env:
+        p = Path(env).expanduser()
+        p.parent.mkdir(parents=True, exist_ok=True)
+        return p
+
+    xdg_state = os.getenv("XDG_STATE_HOME")
+    if not xdg_state:
+        xdg_state = str(Path.home() / ".local" / "state")
+    app_dir = Path(xdg_state) / "rehagrip"
+    app_dir.mkdir(parents=True, exist_ok=True)
+    return app_dir / "safety_limits.json"
+
+
+class LimitsStore:
+    def __init__(self, path=None):
+        self.path = Path(path) if path else resolve_safety_path()
+        self.patients = {DEFAULT_PATIENT: SafetyLimits()}
+        self.active = DEFAULT_PATIENT
+        try:
+            if self.path.exists():
+                with self.path.open("r") as f:
+                    data = json.load(f)
+                for name, limits in data.get("patients", {}).items():
+                    self.patients[name] = SafetyLimits(**limits)
+                self.active = data.get("active", DEFAULT_PATIENT)
+                if self.active not in self.patients:
+                    self.active = DEFAULT_PATIENT
+                print(f"✓ Loaded safety limits for {len(self.patients)} patient(s) from {self.path}")
+        except Exception as e:
+            print(f"⚠ Error loading safety limits from {self.path}: {e}; using defaults")
+
+    @property
+    def limits(self):
+        return self.patients[self.active]
+
+    def save(self):
+        data = {
+            "patients": {name: limits._asdict() for name, limits in self.patients.items()},
+            "active": self.active,
+            "last_updated": time.time(),
+            "version": "1.0",
+        }
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("w") as f:
+            json.dump(data, f, indent=2)
+        tmp.replace(self.path)
+
+
+class SafetySupervisor:
+    def __init__(self, bus, torque_addr, limits=None, on_trip=None, budget_ms=DEFAULT_BUDGET_MS):
+        """
+        Args:
+            bus (BusWorker): Worker the torque-off write is queued on
+            torque_addr (int): Torque Enable address
+            limits (SafetyLimits): Initial limits (default: `SafetyLimits()`)
+            on_trip: `on_trip(trip)` called on the detecting thread right after the
+                torque-off write is queued (abort motion, flag the emergency state)
+            budget_ms (float): Trip latency considered acceptable
+        """
+        self.bus = bus
+        self.torque_addr = torque_addr
+        self.limits = limits or SafetyLimits()
+        self.on_trip = on_trip
+        self.budget_ms = budget_ms
+        self.enabled = True
+        self.tripped = None
+        self.trips = deque(maxlen=50)
+        self.loadcells = {}
+        self._lock = threading.Lock()
+        self._force_over = {}         # sensor -> consecutive over-limit samples
+        self._current_over = 0
+        self._last_force = {}         # sensor -> (timestamp, filtered N)
+        self._last_current = None     # (timestamp, mA)
+
+    # ----- Inputs -----
+    def attach(self, loadcells=(), telemetry=None):
+        """
+        Args:
+            loadcells (iterable): Samplers to supervise, each under its `sensor` name
+            telemetry (TelemetryPoller): Source of Present Current samples
+        """
+        for loadcell in loadcells:
+            self.loadcells[loadcell.sensor] = loadcell
+            loadcell.subscribe(lambda sample, sensor=loadcell.sensor: self.check_force(sample, sensor))
+        if telemetry is not None:
+            telemetry.subscribe(self.check_current)
+
+    def force_armed(self, sensor):
+        """Force checks only run once the load cell reports calibrated newtons."""
+        loadcell = self.loadcells.get(sensor)
+        return loadcell is not None and isinstance(loadcell.calibration, CalibrationProfile)
+
+    def check_force(self, sample, sensor):
+        """Load cell subscriber: magnitude and rate-of-change limits."""
+        if not self.force_armed(sensor):
+            self._force_over[sensor] = 0
+            self._last_force[sensor] = None
+            return
+        limits = self.limits
+        force = sample.force_n
+        over = None
+        if limits.max_compression_n is not None and force > limits.max_compression_n:
+            over = ("compression", force, limits.max_compression_n)
+        elif limits.max_tension_n is not None and -force > limits.max_tension_n:
+            over = ("tension", -force, limits.max_tension_n)
+        count = self._force_over[sensor] = self._force_over.get(sensor, 0) + 1 if over else 0
+        if over and count >= limits.confirm_samples:
+            self.trip(*over, "N", sample.timestamp, sensor)
+
+        previous = self._last_force.get(sensor)
+        self._last_force[sensor] = (sample.timestamp, sample.filtered_n)
+        if limits.max_force_rate_n_s is not None and previous and sample.timestamp > previous[0]:
+            rate = abs(sample.filtered_n - previous[1]) / (sample.timestamp - previous[0])
+            if rate > limits.max_force_rate_n_s:
+                self.trip("force_rate", rate, limits.max_force_rate_n_s, "N/s", sample.timestamp, sensor)
+
+    def check_current(self, snap):
+        """Telemetry listener: Present Current magnitude and rate-of-change limits."""
+        limits = self.limits
+        current = abs(snap.current_mA)
+        over = limits.max_current_ma is not None and current > limits.max_current_ma
+        self._current_over = self._current_over + 1 if over else 0
+        if over and self._current_over >= limits.confirm_samples:
+            self.trip("current", current, limits.max_current_ma, "mA", snap.timestamp)
+
+        previous, self._last_current = self._last_current, (snap.timestamp, snap.current_mA)
+        if limits.max_current_rate_ma_s is not None and previous and snap.timestamp > previous[0]:
+            rate = abs(snap.current_mA - previous[1]) / (snap.timestamp - previous[0])
+            if rate > limits.max_current_rate_ma_s:
+                self.trip("current_rate", rate, limits.max_current_rate_ma_s, "mA/s", snap.timestamp)
+
+    # ----- Trip -----
+    def trip(self, reason, value, limit, unit, sample_time, sensor=None):
+        """Cut torque now; later violations are ignored until `reset()`."""
+        with self._lock:
+            if not self.enabled or self.tripped is not None:
+                return
+            detected = time.time()
+            future = self.bus.submit_write1(self.torque_addr, 0, PRIORITY_EMERGENCY)
+            trip = {
+                "reason": reason,
+                "sensor": sensor,
+                "value": round(value, 2),
+                "limit": limit,
+                "unit": unit,
+                "time": detected,
+                "detect_ms": (detected - sample_time) * 1000,
+                "latency_ms": None,
+                "within_budget": None,
+                "torque_off": None,
+            }
+            self.tripped = trip
+            self.trips.append(trip)
+        future.add_done_callback(lambda f: self._confirmed(trip, f, sample_time))
+        if self.on_trip is not None:
+            try:
+                self.on_trip(trip)
+            except Exception as e:
+                print(f"Safety trip handler failed: {e}")
+
+    def _confirmed(self, trip, future, sample_time):
+        """Runs on the bus thread once the torque-off write has been acknowledged."""
+        done = time.time()
+        try:
+            result, error = future.result()
+            trip["torque_off"] = result == COMM_SUCCESS and not error
+        except Exception as e:
+            trip["torque_off"] = False
+            print(f"⚠ SAFETY: torque-off write failed: {e}")
+        trip["latency_ms"] = (done - sample_time) * 1000
+        trip["within_budget"] = trip["latency_ms"] <= self.budget_ms
+        mark = "✓" if trip["within_budget"] and trip["torque_off"] else "⚠"
+        source = f"{trip['reason']}, {trip['sensor']}" if trip["sensor"] else trip["reason"]
+        print(f"{mark} SAFETY TRIP ({source}): {trip['value']:g} {trip['unit']} > "
+              f"{trip['limit']:g} {trip['unit']} — torque off {trip['latency_ms']:.1f} ms after the sample "
+              f"(detect {trip['detect_ms']:.1f} ms, budget {self.budget_ms:g} ms)")
+
+    def reset(self):
+        with self._lock:
+            self.tripped = None
+            self._force_over.clear()
+            self._current_over = 0
+
+    def status(self):
+        latencies = [t["latency_ms"] for t in self.trips if t["latency_ms"] is not None]
+        return {
+            "enabled": self.enabled,
+            "force_checks": {sensor: "armed" if self.force_armed(sensor) else "disarmed"
+                             for sensor in self.loadcells},
+            "tripped": self.tripped,
+            "limits": self.limits._asdict(),
+            "budget_ms": self.budget_ms,
+            "trips": list(self.trips)[-10:],
+            "max_latency_ms": max(latencies) if latencies else None,
+        }
@@ -27,10 +27,22 @@ Key Features:
 
 - **Emergency Handling:**
   - Emergency stop to instantly disable torque and halt motion.
+  - A safety supervisor (`safety.py`) cuts torque on its own when force or motor current
+    exceed the active patient's limits or change too fast, and logs each trip's latency.
   - Resume normal operation by clearing the emergency state.
 
 - **API Endpoints:**
-  - `/api/motor/move` — Move to a specific position with optional velocity override.
+  - `/api/motor/move` — Start a move (optional velocity override); returns a move ID at once.
+  - `/api/motor/move/{move_id}` — Move outcome; `?wait=<s>` long-polls until it finishes.
+  - `/api/motor/trajectory` — Upload waypoints/velocity profile, streamed server-side at a fixed rate.
+  - `/api/motor/trajectory/smooth` — Minimum-jerk / S-curve move to an angle or preset,
+    precomputed with NumPy (`motion_profiles.py`) and streamed like an uploaded trajectory.
+  - `/api/motor/trajectory/{run_id}` — Run progress, loop jitter and tracking error.
+  - `/api/motor/program` — Start a rep/set exercise between two presets, or a YAML/DSL
+    program (`program_dsl.py`), run server-side from a precompiled plan.
+  - `/api/motor/program/compile` — Compile and cache a program; start it later by digest.
+  - `/api/motor/program/status` — Program phase, set/rep counters and velocity.
+  - `/api/motor/program/{pause,resume,abort}` — Control the running program.
   - `/api/motor/status` — Get live motor state data.
   - `/api/motor/center` — Set the current position as the center.
   - `/api/motor/presets` — Get or save position presets.
@@ -38,14 +50,37 @@ Key Features:
   - `/api/motor/hand` — Switch motor orientation for left or right hand.
   - `/api/motor/lock` — Lock or unlock motor control.
   - `/api/motor/torque` — Enable or disable torque.
-  - `/api/motor/emergency` — Engage or disengage emergency stop.
+  - `/api/motor/emergency` — Engage or disengage emergency stop (disengaging also clears
+    a safety trip).
+  - `/api/safety` — Safety supervisor status and trip log; `/api/safety/limits` and
+    `/api/safety/patient/{name}` set and select per-patient limits.
 
 Hardware & Protocols:
 ---------------------
 - Motor: Dynamixel servo motor connected via USB serial interface.
 - Communication: Dynamixel SDK with current-based position control mode.
-- Preset Storage: JSON file stored in `$XDG_STATE_HOME/rehagrip/` or `~/.local/state/rehagrip/`.
+- Bus Access: a single worker thread (`bus.py`) owns the serial port; endpoints await
+  queued commands so the event loop is never blocked by serial I/O.
+- Telemetry: a fixed-rate background poller (`telemetry.py`, `TELEMETRY_HZ`) keeps a
+  snapshot of position/current/moving/load that `/api/motor/status` returns directly.
+- Load Cell: an HX711 sampler thread (`loadcell.py`) reads every conversion into a ring
+  buffer and keeps `state.load` (N, after outlier rejection and smoothing) current;
+  `/api/loadcell` reports its status and the filter chain's latency.
+  With `LOADCELL_PROCESS=1` the HX711 is read in an isolated, CPU-pinned process.
+  Several boards sharing PD_SCK (fingertip/palm/inline cells) are read in one clocking
+  pass; every load cell endpoint takes `?sensor=<name>` (default: the primary sensor).
+  `/api/loadcell/stats` returns windowed force statistics (mean/std/percentiles,
+  compression/tension split, time in a force band) for the GUI load bar.
+  `/api/loadcell/calibration` captures known-load points and fits a least-squares
+  calibration profile (`calibration.py`), stored per sensor and applied at startup.
+  While torque is off and the motor is still, `drift.py` re-zeroes slow offset drift
+  (`LOADCELL_AUTOTARE=0` disables it).
+- Preset Storage: JSON file stored in `$XDG_STATE_HOME/rehagrip/` or `~/.local/state/rehagrip/`
+  (load cell calibration profiles are stored next to it).
 - ROS not required — this module runs standalone with FastAPI.
+- Simulation: set `REHAGRIP_SIM=1` to run against the in-memory motor model in `sim.py`
+  (no U2D2 needed), e.g. for `MotorApiTest.m` or benchmarks. `REHAGRIP_CLOCK_SPEEDUP`
+  (e.g. 100) runs all waits and the motion model faster than real time (`clock.py`).
 
 Authors:
 --------
@@ -60,13 +95,38 @@ import time
 import uvicorn
 import json
 import os
-from typing import List, Dict
-from dynamixel_sdk import *
+from typing import List, Dict, Optional
 from pathlib import Path
+from bus import BusWorker, RegisterCache, PRIORITY_EMERGENCY
+from clock import resolve_clock
+from loadcell import open_loadcells
+from calibration import CalibrationStore, fit_calibration
+from drift import DriftCompensator
+from safety import SafetySupervisor, SafetyLimits, LimitsStore
+from motion_profiles import smooth_ticks, duration_for, peak_velocity, SHAPES
+from motion import (send_motion, send_motion_sync, arrival_timeout, ArrivalWatcher,
+                    MoveRegistry, DEFAULT_PROFILE_ACCELERATION)
+from program import ProgramEngine, ExerciseSpec, plan_exercise
+from program_dsl import PlanCache
+from telemetry import TelemetryPoller
+from trajectory import (TrajectoryRunner, Waypoint, VelocitySegment, interpolate_waypoints,
+                        integrate_velocity_profile, check_speed, check_duration, degrees_to_ticks,
+                        DEFAULT_RATE_HZ, MAX_RATE_HZ, MAX_TRAJECTORY_DEG_S)
 
 app = FastAPI()
 PORT = 3001
 
+# ----- Motor backend -----
+# REHAGRIP_SIM=1 swaps the U2D2 for an in-memory XM430 model (see sim.py)
+SIMULATE = os.getenv("REHAGRIP_SIM", "").lower() in ("1", "true", "yes")
+if SIMULATE:
+    from sim import SimPortHandler as PortHandler, SimPacketHandler as PacketHandler
+else:
+    from dynamixel_sdk import PortHandler, PacketHandler
+
+# Real monotonic time in production; REHAGRIP_CLOCK_SPEEDUP runs simulations faster
+clock = resolve_clock()
+
 # ----- Hardware constants -----
 PORT_NAME = '/dev/ttyUSB0'
 BAUDRATE = 57600
@@ -168,7 +228,11 @@ current_presets = load_presets_from_file()
 
 # ----- Connect to hardware -----
 portHandler = PortHandler(PORT_NAME)
-packetHandler = PacketHandler(PROTOCOL_VERSION)
+if SIMULATE:
+    packetHandler = PacketHandler(PROTOCOL_VERSION, clock=clock)
+    print(" Using simulated motor (REHAGRIP_SIM=1)")
+else:
+    packetHandler = PacketHandler(PROTOCOL_VERSION)
 
 if not portHandler.openPort():
     print(" Failed to open port")
@@ -178,29 +242,82 @@ if not portHandler.setBaudRate(BAUDRATE):
     print(" Failed to set baudrate")
     exit()
 
+# All bus traffic goes through the worker thread from here on; the shadow
+# cache drops writes that would not change the register (e.g. same velocity)
+register_cache = RegisterCache(
+    (ADDR_TORQUE_ENABLE, ADDR_OPERATING_MODE, ADDR_PROFILE_ACCELERATION,
+     ADDR_PROFILE_VELOCITY, ADDR_GOAL_POSITION),
+    torque_addr=ADDR_TORQUE_ENABLE,
+)
+bus = BusWorker(portHandler, packetHandler, DXL_ID, cache=register_cache)
+bus.start()
+
 def move_to_tick_if_needed(target_tick, velocity=50, threshold=10):
-    """Move the motor to target_tick if not already close, and wait for it."""
-    current_tick, _, _ = packetHandler.read4ByteTxRx(portHandler, DXL_ID, ADDR_PRESENT_POSITION)
+    """Move the motor to target_tick if not already close, and wait for it (startup only)."""
+    current_tick = bus.read4_sync(ADDR_PRESENT_POSITION)
     if abs(current_tick - target_tick) > threshold:
         print(f"Moving to default tick: {target_tick} (from {current_tick})")
-        packetHandler.write4ByteTxRx(portHandler, DXL_ID, ADDR_PROFILE_VELOCITY, velocity)
-        packetHandler.write4ByteTxRx(portHandler, DXL_ID, ADDR_GOAL_POSITION, target_tick)
-        time.sleep(2)
-        new_tick, _, _ = packetHandler.read4ByteTxRx(portHandler, DXL_ID, ADDR_PRESENT_POSITION)
-        print(f"Moved. Actual tick now {new_tick}")
-        return new_tick
+        send_motion_sync(bus, DEFAULT_PROFILE_ACCELERATION, velocity, target_tick)
+        state.velocity = velocity
+        result = arrival.wait_sync(target_tick, arrival_timeout(target_tick - current_tick, velocity))
+        print(f"Moved ({result.status} after {result.elapsed_s:.2f}s). Actual tick now {result.position_tick}")
+        return result.position_tick
     else:
         print(f"Already at default tick: {current_tick}")
         return current_tick
 
+# ----- Load cell -----
+# Every sensor keeps its own samples and calibration; the first one drives state.load
+loadcells = open_loadcells()
+loadcell = next(iter(loadcells.values()), None)
+calibrations = CalibrationStore()
+for sensor in loadcells.values():
+    profile = calibrations.get(sensor.sensor)
+    if profile is not None:
+        # A copy: auto-tare moves the sampler's offset, which must not reach the file
+        sensor.calibration = profile.copy()
+        print(f"✓ Load cell '{sensor.sensor}' calibrated: offset={profile.offset:.0f}, "
+              f"scale={profile.scale:.3e} kg/count ({len(profile.points)} points)")
+    else:
+        print(f"⚠ No calibration profile for load cell '{sensor.sensor}'; reporting uncalibrated values")
+if loadcell is not None:
+    loadcell.subscribe(lambda sample: setattr(state, "load", sample.filtered_n))
+for sensor in loadcells.values():
+    sensor.start()
+
 # ----- Motor startup and center setup -----
-packetHandler.write1ByteTxRx(portHandler, DXL_ID, ADDR_TORQUE_ENABLE, 0)
-packetHandler.write1ByteTxRx(portHandler, DXL_ID, ADDR_OPERATING_MODE, 5)
-packetHandler.write4ByteTxRx(portHandler, DXL_ID, ADDR_PROFILE_ACCELERATION, 50)
-packetHandler.write4ByteTxRx(portHandler, DXL_ID, ADDR_PROFILE_VELOCITY, 100)
-packetHandler.write1ByteTxRx(portHandler, DXL_ID, ADDR_TORQUE_ENABLE, 1)
+bus.write1_sync(ADDR_TORQUE_ENABLE, 0)
+telemetry = TelemetryPoller(bus, load_source=lambda: state.load, clock=clock)
+if not telemetry.provision_indirect():
+    print("⚠ Falling back to direct status block reads (no health fields)")
+bus.write1_sync(ADDR_OPERATING_MODE, 5)
+bus.write4_sync(ADDR_PROFILE_ACCELERATION, DEFAULT_PROFILE_ACCELERATION)
+bus.write4_sync(ADDR_PROFILE_VELOCITY, 100)
+state.velocity = 100
+bus.write1_sync(ADDR_TORQUE_ENABLE, 1)
 print(" Torque Enabled in Current-based Position Control Mode")
 
+# ----- Background telemetry -----
+# Started before homing: move completion is detected from Moving Status samples
+telemetry.sample()
+telemetry.start()
+arrival = ArrivalWatcher(telemetry, clock=clock)
+
+# Re-zero the load cells while torque is off and the motor is still
+drifts = {}
+if os.getenv("LOADCELL_AUTOTARE", "1").lower() not in ("0", "false", "no"):
+    def load_quiescent():
+        snap = telemetry.snapshot
+        return not state.torque and snap is not None and not snap.moving
+    for name, sensor in loadcells.items():
+        drifts[name] = DriftCompensator(sensor, quiescent=load_quiescent)
+        drifts[name].attach()
+moves = MoveRegistry()
+trajectories = TrajectoryRunner(bus, telemetry, arrival, clock=clock,
+                                velocity=lambda: state.velocity)
+telemetry.subscribe(lambda snap: setattr(state, "moving", snap.moving))
+print(f"Telemetry sampling at {telemetry.rate_hz:.0f} Hz")
+
 RIGHT_CENTER_TICK = 3046
 LEFT_CENTER_TICK  = 1000
 
@@ -224,6 +341,7 @@ class MoveRequest(BaseModel):
     position: float
     velocity: float = None
     hand: str = None
+    wait: bool = False
 
 class LockRequest(BaseModel):
     locked: bool
@@ -233,6 +351,16 @@ class TorqueRequest(BaseModel):
     torque: bool
     hand: str = None
 
+class SafetyLimitsRequest(BaseModel):
+    patient: str = None             # default: the active patient
+    max_compression_n: Optional[float] = None
+    max_tension_n: Optional[float] = None
+    max_force_rate_n_s: Optional[float] = None
+    max_current_ma: Optional[float] = None
+    max_current_rate_ma_s: Optional[float] = None
+    confirm_samples: Optional[int] = None
+    activate: bool = True
+
 class EmergencyRequest(BaseModel):
     stop: bool
     hand: str = None
@@ -240,6 +368,58 @@ class EmergencyRequest(BaseModel):
 class HandRequest(BaseModel):
     hand: str
 
+class TrajectoryPoint(BaseModel):
+    t: float
+    position: float
+
+class TrajectorySegment(BaseModel):
+    duration: float
+    velocity: float
+
+class TrajectoryRequest(BaseModel):
+    waypoints: List[TrajectoryPoint] = None
+    velocity_profile: List[TrajectorySegment] = None
+    rate_hz: float = DEFAULT_RATE_HZ
+
+class ProgramSource(BaseModel):
+    source: str
+    format: str = None
+
+class ProgramRequest(BaseModel):
+    name: str = None
+    digest: str = None
+    source: str = None
+    format: str = None
+    open_preset: str = None
+    close_preset: str = None
+    open_position: float = None
+    close_position: float = None
+    reps: int = 10
+    sets: int = 1
+    dwell_open: float = 1.0
+    dwell_close: float = 1.0
+    rest_between_reps: float = 0.0
+    rest_between_sets: float = 30.0
+    velocity: float = 50
+    end_velocity: float = None
+
+class SmoothMoveRequest(BaseModel):
+    position: float = None
+    preset: str = None
+    duration: float = None          # seconds; default from peak_velocity
+    peak_velocity: float = 60.0     # deg/s
+    shape: str = "min_jerk"
+    rate_hz: float = DEFAULT_RATE_HZ
+
+class CalibrationPointRequest(BaseModel):
+    kg: float                       # known load: > 0 compression, < 0 tension, 0 unloaded
+    samples: int = 40
+
+class CalibrationFitRequest(BaseModel):
+    points: List[List[float]] = None    # [raw, kg] pairs; default: the captured points
+    split: bool = False
+    save: bool = True
+
 class PresetData(BaseModel):
     name: str
     pos: float
@@ -248,34 +428,244 @@ class PresetsRequest(BaseModel):
     presets: List[PresetData]
 
 # ----- Helper functions -----
-def get_current_tick():
-    tick, _, _ = packetHandler.read4ByteTxRx(portHandler, DXL_ID, ADDR_PRESENT_POSITION)
-    return tick
+async def get_current_tick():
+    return await bus.read4(ADDR_PRESENT_POSITION)
+
+async def start_move(target_tick):
+    """Send a goal with the current profile; returns a future for the `MoveResult`."""
+    start_tick = telemetry.snapshot.position_tick
+    await send_motion(bus, DEFAULT_PROFILE_ACCELERATION, state.velocity, target_tick)
+    return arrival.watch(target_tick, arrival_timeout(target_tick - start_tick, state.velocity))
+
+async def move_and_wait(target_tick):
+    """Send a goal with the current profile and await actual arrival (or stall/timeout)."""
+    start_tick = telemetry.snapshot.position_tick
+    await send_motion(bus, DEFAULT_PROFILE_ACCELERATION, state.velocity, target_tick)
+    result = await arrival.wait(target_tick, arrival_timeout(target_tick - start_tick, state.velocity))
+    if result.status != "arrived":
+        print(f"Move to {target_tick} {result.status} at tick {result.position_tick}")
+    return result
+
+def preset_position(name):
+    for preset in current_presets:
+        if preset.get("name") == name:
+            return float(preset["pos"])
+    raise ValueError(f"Unknown preset '{name}'")
+
+def require_not_stopped():
+    """409 while an emergency stop or safety trip is latched (cleared via /api/motor/emergency)."""
+    if safety.tripped is not None:
+        raise HTTPException(status_code=409, detail=f"Safety trip ({safety.tripped['reason']}) active; "
+                                                    "clear the emergency stop first")
+    if state.emergency:
+        raise HTTPException(status_code=409, detail="Emergency stop active; clear it first")
+
+def motor_busy():
+    """Reason a manual move would conflict with server-side motion, or None."""
+    if trajectories.running:
+        return "trajectory running"
+    if programs.running:
+        return "program running"
+    return None
+
+async def program_move(target_tick, velocity):
+    state.velocity = int(velocity)
+    return await move_and_wait(target_tick)
+
+programs = ProgramEngine(
+    move=program_move,
+    can_move=lambda: state.torque and not state.locked and not state.emergency,
+    force=lambda: state.load,
+    clock=clock,
+)
+plan_cache = PlanCache()
+
+# ----- Safety supervisor -----
+# Checks every load cell and telemetry sample on the sampling threads and cuts torque
+# through the bus worker directly; the event loop is not in the trip path.
+def safety_tripped(trip):
+    state.emergency = True
+    state.torque = False
+    trajectories.abort()
+    programs.abort()
+
+safety_limits = LimitsStore()
+safety = SafetySupervisor(bus, ADDR_TORQUE_ENABLE, safety_limits.limits, on_trip=safety_tripped,
+                          budget_ms=float(os.getenv("SAFETY_BUDGET_MS", 20)))
+if os.getenv("SAFETY", "1").lower() in ("0", "false", "no"):
+    safety.enabled = False
+    print("⚠ Safety supervisor disabled (SAFETY=0)")
+safety.attach(loadcells.values(), telemetry)
+print(f"✓ Safety supervisor: patient '{safety_limits.active}', {safety.limits._asdict()}")
+for name in loadcells:
+    if not safety.force_armed(name):
+        print(f"⚠ Safety force checks for load cell '{name}' disarmed until it is calibrated")
 
 # ----- API Endpoints -----
 @app.post("/api/motor/center")
 async def set_center():
     global center_tick
-    center_tick = get_current_tick()
+    busy = motor_busy()
+    if busy:
+        # A running plan's goal ticks were computed for the old center
+        raise HTTPException(status_code=409, detail=f"Cannot change center: {busy}")
+    center_tick = await get_current_tick()
     print(f"Center reset to current position: {center_tick}")
     return {"ok": True, "center_tick": center_tick}
 
 @app.post("/api/motor/status")
 async def motor_status():
-    current_tick = get_current_tick()
-    current_degrees = ((current_tick - center_tick) / 4095) * 360
+    # Served from the latest telemetry sample — no bus I/O per request
+    snap = telemetry.snapshot
+    current_degrees = ((snap.position_tick - center_tick) / 4095) * 360
     state.position = current_degrees
+    state.moving = snap.moving
     return {
         "position": state.position,
-        "position_tick": current_tick,
+        "position_tick": snap.position_tick,
         "center_tick": center_tick,
-        "load": state.load,
+        "load": snap.load,
+        "current_mA": snap.current_mA,
+        "velocity_rpm": snap.velocity_rpm,
+        "temperature_c": snap.temperature_c,
+        "input_voltage": snap.input_voltage,
+        "hardware_error": snap.hardware_error,
         "moving": state.moving,
+        "timestamp": snap.timestamp,
+        "sample_age_ms": (time.time() - snap.timestamp) * 1000,
         "locked": state.locked,
         "torque": state.torque,
-        "emergency": state.emergency
+        "emergency": state.emergency,
+        "safety_tripped": safety.tripped is not None,
+    }
+
+def select_loadcell(sensor=None):
+    """Sampler for `sensor` (default: the primary one); None if there are no load cells."""
+    if sensor is None:
+        return loadcell
+    if sensor not in loadcells:
+        raise HTTPException(404, f"Unknown load cell '{sensor}' (have: {', '.join(loadcells) or 'none'})")
+    return loadcells[sensor]
+
+@app.get("/api/loadcell")
+async def loadcell_status(samples: int = 0, sensor: str = None):
+    """Latest load cell sample, sampling rate and error count; `samples` returns recent raw samples too."""
+    loadcell = select_loadcell(sensor)
+    if loadcell is None:
+        return {"ok": True, "available": False}
+    latest = loadcell.latest
+    result = {
+        "ok": True,
+        "available": True,
+        "sensor": loadcell.sensor,
+        "sensors": list(loadcells),
+        "latest": latest._asdict() if latest else None,
+        "sample_age_ms": (time.time() - latest.timestamp) * 1000 if latest else None,
+        "rate_hz": loadcell.rate_hz,
+        "samples": loadcell.samples,
+        "errors": loadcell.errors,
+        "timing_violations": loadcell.timing_violations,
+        "max_sck_high_us": loadcell.max_high_us,
+        "mode": loadcell.mode,
+        "pid": getattr(loadcell, "pid", os.getpid()),
+        "filter": loadcell.filters.describe(),
+        "auto_tare": drifts[loadcell.sensor].status() if loadcell.sensor in drifts else None,
+    }
+    if samples > 0:
+        result["recent"] = [s._asdict() for s in loadcell.recent(min(samples, 1000))]
+    return result
+
+@app.get("/api/loadcell/stats")
+async def loadcell_stats(window_s: float = 1.0, samples: Optional[int] = None,
+                         percentiles: str = "5,50,95",
+                         zone_min: Optional[float] = None, zone_max: Optional[float] = None,
+                         filtered: bool = True, sensor: str = None):
+    """Force statistics over the last `window_s` seconds (and/or `samples` samples) of the ring buffer."""
+    loadcell = select_loadcell(sensor)
+    if loadcell is None:
+        return {"ok": True, "available": False}
+    try:
+        pcts = [float(p) for p in percentiles.split(",") if p.strip()]
+    except ValueError:
+        raise HTTPException(400, "percentiles must be a comma-separated list of numbers")
+    if any(not 0 <= p <= 100 for p in pcts):
+        raise HTTPException(400, "percentiles must be between 0 and 100")
+    if window_s <= 0:
+        raise HTTPException(400, "window_s must be > 0")
+    zone = (zone_min, zone_max) if zone_min is not None or zone_max is not None else None
+    stats = loadcell.stats(window_s, samples, percentiles=pcts, zone=zone, filtered=filtered)
+    return {"ok": True, "available": True, "sensor": loadcell.sensor, "window_s": window_s, **stats}
+
+calibration_points = {}     # sensor -> captured [raw, kg] points
+
+def calibration_status(loadcell):
+    profile = loadcell.calibration
+    return {
+        "ok": True,
+        "available": True,
+        "sensor": loadcell.sensor,
+        "calibrated": hasattr(profile, "points"),
+        "profile": profile.to_dict() if hasattr(profile, "to_dict") else
+                   {"offset": profile.offset, "scale": profile.scale},
+        "pending_points": calibration_points.get(loadcell.sensor, []),
+        "file": str(calibrations.path),
     }
 
+@app.get("/api/loadcell/calibration")
+async def get_calibration(sensor: str = None):
+    """Active calibration profile and the points captured for the next fit."""
+    loadcell = select_loadcell(sensor)
+    if loadcell is None:
+        return {"ok": True, "available": False}
+    return calibration_status(loadcell)
+
+@app.post("/api/loadcell/calibration/point")
+async def capture_calibration_point(req: CalibrationPointRequest, sensor: str = None):
+    """Average the latest `samples` raw conversions as a calibration point for a known load."""
+    loadcell = select_loadcell(sensor)
+    if loadcell is None:
+        raise HTTPException(503, "Load cell not available")
+    if not 1 <= req.samples <= 1000:
+        raise HTTPException(400, "samples must be between 1 and 1000")
+    raw = loadcell.buffer.window(samples=req.samples)[1]
+    if len(raw) < req.samples:
+        raise HTTPException(409, f"Only {len(raw)} samples buffered so far")
+    point = [float(raw.mean()), req.kg]
+    points = calibration_points.setdefault(loadcell.sensor, [])
+    points.append(point)
+    return {"ok": True, "sensor": loadcell.sensor, "point": point, "raw_std": float(raw.std()),
+            "points": len(points)}
+
+@app.delete("/api/loadcell/calibration/points")
+async def clear_calibration_points(sensor: str = None):
+    loadcell = select_loadcell(sensor)
+    if loadcell is not None:
+        calibration_points.pop(loadcell.sensor, None)
+    return {"ok": True}
+
+@app.post("/api/loadcell/calibration/fit")
+async def fit_loadcell_calibration(req: CalibrationFitRequest, sensor: str = None):
+    """Fit a least-squares profile, apply it to the sampler and (by default) persist it."""
+    loadcell = select_loadcell(sensor)
+    if loadcell is None:
+        raise HTTPException(503, "Load cell not available")
+    points = req.points if req.points is not None else calibration_points.get(loadcell.sensor, [])
+    if any(len(p) != 2 for p in points):
+        raise HTTPException(422, "Each point must be [raw, kg]")
+    try:
+        profile = fit_calibration(loadcell.sensor, points, split=req.split)
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    loadcell.calibration = profile.copy()
+    if req.save:
+        try:
+            calibrations.save(profile)
+        except OSError as e:
+            raise HTTPException(500, f"Calibration applied but not saved: {e}")
+    if req.points is None:
+        calibration_points.pop(loadcell.sensor, None)
+    return calibration_status(loadcell)
+
 @app.get("/api/motor/presets")
 async def get_presets():
     """Get current presets from memory."""
@@ -342,10 +732,14 @@ async def reload_presets():
 @app.post("/api/motor/move")
 async def motor_move(req: MoveRequest):
     global center_tick, center_offset
+    require_not_stopped()
     if state.emergency or state.locked or not state.torque:
         raise HTTPException(status_code=400, detail="Cannot move: locked/torque/emergency")
+    busy = motor_busy()
+    if busy:
+        raise HTTPException(status_code=409, detail=f"Cannot move: {busy}")
     if center_tick is None:
-        center_tick = get_current_tick()
+        center_tick = await get_current_tick()
 
     degrees = float(req.position)
     if state.hand == "left":
@@ -361,18 +755,25 @@ async def motor_move(req: MoveRequest):
         desired_tick = 4095
 
     if req.velocity is not None:
-        packetHandler.write4ByteTxRx(portHandler, DXL_ID, ADDR_PROFILE_VELOCITY, int(req.velocity))
-
-    packetHandler.write4ByteTxRx(portHandler, DXL_ID, ADDR_GOAL_POSITION, desired_tick)
-    time.sleep(0.2)
-
-    pos, _, _ = packetHandler.read4ByteTxRx(portHandler, DXL_ID, ADDR_PRESENT_POSITION)
+        state.velocity = int(req.velocity)
+
+    # Acceleration, velocity and goal in one packet; completion is tracked by move ID
+    future = await start_move(desired_tick)
+    move = moves.add(desired_tick, future, requested_degrees=degrees)
+
+    if req.wait:
+        move = await moves.wait(move["move_id"], timeout_s=30.0) or move
+    pos = move["position_tick"]
+    if pos is None:
+        # Not waited for, or still "moving" when the wait timed out: report where it is now
+        pos = telemetry.snapshot.position_tick
     actual_position_degrees = ((pos - center_tick) / 4095) * 360
     state.position = actual_position_degrees
-    state.moving = False
 
     return {
         "ok": True,
+        "move_id": move["move_id"],
+        "status": move["status"],
         "position": actual_position_degrees,
         "position_tick": pos,
         "target_tick": desired_tick,
@@ -380,6 +781,178 @@ async def motor_move(req: MoveRequest):
     }
 
 
+@app.get("/api/motor/move/{move_id}")
+async def motor_move_status(move_id: int, wait: float = 0.0):
+    """Move outcome by ID; `wait` (s, max 30) long-polls until the move finishes."""
+    if wait > 0:
+        move = await moves.wait(move_id, timeout_s=min(wait, 30.0))
+    else:
+        move = moves.get(move_id)
+    if move is None:
+        raise HTTPException(status_code=404, detail=f"Unknown move id {move_id}")
+    return {"ok": True, **move}
+
+
+@app.post("/api/motor/trajectory")
+async def start_trajectory(req: TrajectoryRequest):
+    """Upload a trajectory (waypoints or velocity profile) and stream it server-side."""
+    require_not_stopped()
+    if state.emergency or state.locked or not state.torque:
+        raise HTTPException(status_code=400, detail="Cannot move: locked/torque/emergency")
+    busy = motor_busy()
+    if busy:
+        raise HTTPException(status_code=409, detail=f"Cannot start trajectory: {busy}")
+    if not 1 <= req.rate_hz <= MAX_RATE_HZ:
+        raise HTTPException(status_code=422, detail=f"rate_hz must be between 1 and {MAX_RATE_HZ:.0f}")
+
+    try:
+        if req.waypoints:
+            setpoints = interpolate_waypoints(
+                [Waypoint(p.t, p.position) for p in req.waypoints], req.rate_hz)
+        elif req.velocity_profile:
+            # Velocity profiles start from wherever the motor is now
+            start_deg = (telemetry.snapshot.position_tick - center_tick) / (4095 / 360)
+            if state.hand == "left":
+                start_deg = -start_deg
+            setpoints = integrate_velocity_profile(
+                [VelocitySegment(s.duration, s.velocity) for s in req.velocity_profile],
+                req.rate_hz, start_deg)
+        else:
+            raise ValueError("Provide waypoints or velocity_profile")
+        check_speed(setpoints, req.rate_hz)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    ticks = degrees_to_ticks(setpoints, center_tick, state.hand)
+    run = trajectories.start(ticks, req.rate_hz)
+    return {"ok": True, **run.report()}
+
+@app.post("/api/motor/trajectory/smooth")
+async def start_smooth_move(req: SmoothMoveRequest):
+    """Stream a precomputed minimum-jerk or S-curve move from the current position."""
+    require_not_stopped()
+    if state.emergency or state.locked or not state.torque:
+        raise HTTPException(status_code=400, detail="Cannot move: locked/torque/emergency")
+    busy = motor_busy()
+    if busy:
+        raise HTTPException(status_code=409, detail=f"Cannot start trajectory: {busy}")
+    if not 1 <= req.rate_hz <= MAX_RATE_HZ:
+        raise HTTPException(status_code=422, detail=f"rate_hz must be between 1 and {MAX_RATE_HZ:.0f}")
+    if req.shape not in SHAPES:
+        raise HTTPException(status_code=422, detail=f"shape must be one of {', '.join(SHAPES)}")
+
+    try:
+        degrees = preset_position(req.preset) if req.preset else req.position
+        if degrees is None:
+            raise ValueError("Provide position or preset")
+        start_tick = telemetry.snapshot.position_tick
+        end_tick = degrees_to_ticks([degrees], center_tick, state.hand)[0]
+        distance_deg = (end_tick - start_tick) / (4095 / 360)
+        duration = req.duration or duration_for(distance_deg, req.peak_velocity, req.shape)
+        # Round so moves of similar duration share a cached profile curve
+        duration = max(round(duration, 2), 1.0 / req.rate_hz)
+        check_duration(duration)
+        if peak_velocity(distance_deg, duration, req.shape) > MAX_TRAJECTORY_DEG_S:
+            raise ValueError(f"Move exceeds {MAX_TRAJECTORY_DEG_S:.0f} deg/s; increase duration")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    ticks = smooth_ticks(start_tick, end_tick, duration, float(req.rate_hz), req.shape)
+    run = trajectories.start(ticks, req.rate_hz)
+    return {"ok": True, **run.report(), "shape": req.shape, "target_tick": end_tick}
+
+@app.get("/api/motor/trajectory/{run_id}")
+async def trajectory_status(run_id: int):
+    """Progress and timing report (jitter, achieved-vs-planned error) for a run."""
+    run = trajectories.runs.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Unknown trajectory run {run_id}")
+    return {"ok": True, **run.report()}
+
+@app.post("/api/motor/trajectory/abort")
+async def abort_trajectory():
+    trajectories.abort()
+    return {"ok": True}
+
+@app.post("/api/motor/program")
+async def start_program(req: ProgramRequest):
+    """
+    Run a program server-side: a compiled plan by `digest`, YAML/DSL `source`, or sets of
+    open/close repetitions between two presets (or positions).
+    """
+    require_not_stopped()
+    if state.emergency or state.locked or not state.torque:
+        raise HTTPException(status_code=400, detail="Cannot move: locked/torque/emergency")
+    busy = motor_busy()
+    if busy:
+        raise HTTPException(status_code=409, detail=f"Cannot start program: {busy}")
+
+    try:
+        if req.digest:
+            plan = plan_cache.get(req.digest)
+            if plan is None:
+                raise HTTPException(status_code=404, detail=f"No compiled program {req.digest}")
+        elif req.source:
+            plan = plan_cache.compile(req.source, current_presets, center_tick, state.hand,
+                                      state.velocity, req.format)
+        else:
+            open_deg = preset_position(req.open_preset) if req.open_preset else req.open_position
+            close_deg = preset_position(req.close_preset) if req.close_preset else req.close_position
+            if open_deg is None or close_deg is None:
+                raise ValueError("Provide a digest, a program source or open/close presets")
+            spec = ExerciseSpec(
+                open_deg=open_deg,
+                close_deg=close_deg,
+                reps=req.reps,
+                sets=req.sets,
+                dwell_open_s=max(0.0, req.dwell_open),
+                dwell_close_s=max(0.0, req.dwell_close),
+                rest_between_reps_s=max(0.0, req.rest_between_reps),
+                rest_between_sets_s=max(0.0, req.rest_between_sets),
+                start_velocity=int(req.velocity),
+                end_velocity=int(req.velocity if req.end_velocity is None else req.end_velocity),
+            )
+            plan = plan_exercise(spec, center_tick, state.hand,
+                                 start_tick=telemetry.snapshot.position_tick, name=req.name)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if (plan.center_tick, plan.hand) != (center_tick, state.hand):
+        raise HTTPException(status_code=409, detail="Center or hand changed since compiling; resend the source")
+    status = programs.start(plan)
+    print(f"Program {status['program_id']} started: {plan.reps_total} reps, "
+          f"{len(plan.ops)} steps, ~{plan.nominal_s:.0f} s")
+    return {"ok": True, **status}
+
+@app.post("/api/motor/program/compile")
+async def compile_program(req: ProgramSource):
+    """Compile a YAML/DSL program for the current center and hand; start it later by digest."""
+    try:
+        plan = plan_cache.compile(req.source, current_presets, center_tick, state.hand,
+                                  state.velocity, req.format)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"ok": True, **plan.summary(), "cache": {"hits": plan_cache.hits, "misses": plan_cache.misses}}
+
+@app.get("/api/motor/program/status")
+async def program_status():
+    return {"ok": True, **programs.status()}
+
+@app.post("/api/motor/program/pause")
+async def pause_program():
+    programs.pause()
+    return {"ok": True, **programs.status()}
+
+@app.post("/api/motor/program/resume")
+async def resume_program():
+    programs.resume()
+    return {"ok": True, **programs.status()}
+
+@app.post("/api/motor/program/abort")
+async def abort_program():
+    programs.abort()
+    return {"ok": True, **programs.status()}
+
 @app.post("/api/motor/get_range")
 async def get_movement_range():
     if center_tick is None:
@@ -396,12 +969,14 @@ async def get_movement_range():
 @app.post("/api/motor/recenter")
 async def recenter_motor():
     global center_tick
+    require_not_stopped()
+    busy = motor_busy()
+    if busy:
+        raise HTTPException(status_code=409, detail=f"Cannot change center: {busy}")
     print("Moving to middle of range and setting as new center...")
     middle_tick = 2048
-    packetHandler.write4ByteTxRx(portHandler, DXL_ID, ADDR_GOAL_POSITION, middle_tick)
-    time.sleep(2)
-    actual_pos, _, _ = packetHandler.read4ByteTxRx(portHandler, DXL_ID, ADDR_PRESENT_POSITION)
-    center_tick = actual_pos
+    result = await move_and_wait(middle_tick)
+    center_tick = result.position_tick
     print(f"Recentered at tick: {center_tick}")
     return {
         "ok": True,
@@ -409,28 +984,16 @@ async def recenter_motor():
         "available_range_degrees": 360 
     }
 
-def wait_until_arrived(target_tick, pos_threshold=8, stable_ms=120, timeout_s=3.0):
-    start = time.time()
-    stable_start = None
-    while time.time() - start < timeout_s:
-        pos, _, _ = packetHandler.read4ByteTxRx(portHandler, DXL_ID, ADDR_PRESENT_POSITION)
-        if abs(pos - target_tick) <= pos_threshold:
-            if stable_start is None:
-                stable_start = time.time()
-            elif (time.time() - stable_start) * 1000 >= stable_ms:
-                return pos
-        else:
-            stable_start = None
-        time.sleep(0.01)
-    return pos
-
-
 @app.post("/api/motor/hand")
 async def set_hand(req: HandRequest):
     global center_tick
     new_hand = req.hand
     if new_hand not in ("left", "right"):
         raise HTTPException(status_code=400, detail="hand must be 'left' or 'right'")
+    require_not_stopped()
+    busy = motor_busy()
+    if busy:
+        raise HTTPException(status_code=409, detail=f"Cannot switch hand: {busy}")
 
     print(f"Switching hand to {new_hand}")
 
@@ -439,8 +1002,7 @@ async def set_hand(req: HandRequest):
     else:
         center_tick = LEFT_CENTER_TICK
 
-    packetHandler.write4ByteTxRx(portHandler, DXL_ID, ADDR_GOAL_POSITION, center_tick)
-    wait_until_arrived(center_tick)  
+    await move_and_wait(center_tick)
 
     state.hand = new_hand
     return {"ok": True, "hand": new_hand, "center_tick": center_tick}
@@ -457,16 +1019,18 @@ async def set_torque(req: TorqueRequest):
     print(f"Setting torque: {req.torque}")
 
     if req.torque:
-        # Torque ON — just enable, keep center_offset from torque-off
-        packetHandler.write1ByteTxRx(portHandler, DXL_ID, ADDR_TORQUE_ENABLE, 1)
+        # Torque ON — just enable, keep center_offset from torque-off.
+        # Not while a trip is latched: the supervisor ignores violations until it is cleared
+        require_not_stopped()
+        await bus.write1(ADDR_TORQUE_ENABLE, 1)
         state.torque = True
     else:
         # Torque OFF — snapshot offset from fixed center immediately
-        current_tick = get_current_tick()
+        current_tick = await get_current_tick()
         center_offset = current_tick - center_tick
         print(f"Torque disabled — current position is {current_tick}, "
               f"offset from center = {center_offset} ticks")
-        packetHandler.write1ByteTxRx(portHandler, DXL_ID, ADDR_TORQUE_ENABLE, 0)
+        await bus.write1(ADDR_TORQUE_ENABLE, 0)
         state.torque = False
 
     return {"ok": True, "torque": state.torque}
@@ -478,13 +1042,60 @@ async def emergency_stop(req: EmergencyRequest):
     state.emergency = req.stop
     print(f"Emergency STOP set to {state.emergency}")
     if state.emergency:
-        packetHandler.write1ByteTxRx(portHandler, DXL_ID, ADDR_TORQUE_ENABLE, 0)
+        trajectories.abort()
+        programs.abort()
+        # Jumps ahead of any queued motion/telemetry traffic
+        await bus.write1(ADDR_TORQUE_ENABLE, 0, priority=PRIORITY_EMERGENCY)
         state.torque = False
     else:
-        packetHandler.write1ByteTxRx(portHandler, DXL_ID, ADDR_TORQUE_ENABLE, 1)
+        safety.reset()
+        await bus.write1(ADDR_TORQUE_ENABLE, 1)
         state.torque = True
     return {"ok": True, "emergency": state.emergency}
 
+@app.get("/api/safety")
+async def safety_status():
+    """Active patient, limits, current trip and recent trips with their latencies."""
+    return {"ok": True, "patient": safety_limits.active, "patients": list(safety_limits.patients),
+            **safety.status()}
+
+@app.post("/api/safety/limits")
+async def set_safety_limits(req: SafetyLimitsRequest):
+    """Create or update a patient's limits (unset fields keep their value); optionally make them active."""
+    patient = (req.patient or safety_limits.active).strip()
+    if not patient:
+        raise HTTPException(422, "Patient name must not be empty")
+    base = safety_limits.patients.get(patient, SafetyLimits())
+    changes = {k: v for k, v in req.model_dump(exclude_unset=True).items() if k in SafetyLimits._fields}
+    for name, value in changes.items():
+        if value is not None and value <= 0:
+            raise HTTPException(422, f"{name} must be > 0 (or null to disable the check)")
+    if changes.get("confirm_samples", 1) is None:
+        raise HTTPException(422, "confirm_samples must be >= 1")
+    limits = base._replace(**changes)
+    safety_limits.patients[patient] = limits
+    if req.activate:
+        safety_limits.active = patient
+        safety.limits = limits
+    elif patient == safety_limits.active:
+        safety.limits = limits
+    try:
+        safety_limits.save()
+    except OSError as e:
+        raise HTTPException(500, f"Limits applied but not saved: {e}")
+    print(f"Safety limits for '{patient}' set: {limits._asdict()}")
+    return await safety_status()
+
+@app.post("/api/safety/patient/{patient}")
+async def select_safety_patient(patient: str):
+    """Switch the supervisor to a stored patient's limits."""
+    if patient not in safety_limits.patients:
+        raise HTTPException(404, f"No safety limits stored for '{patient}'")
+    safety_limits.active = patient
+    safety.limits = safety_limits.limits
+    safety_limits.save()
+    return await safety_status()
+
 if __name__ == "__main__":
     print(f"Starting server on port {PORT}")
     print(f"Motor center position: {center_tick}")
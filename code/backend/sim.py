@@ -0,0 +1,295 @@
+"""
+Simulated Dynamixel XM430-W210 for hardware-free runs and benchmarks.
+
+`SimPortHandler` and `SimPacketHandler` are drop-in replacements for the SDK's
+`PortHandler`/`PacketHandler` (the subset of methods this backend uses). They
+model one motor's control table in memory:
+
+- EEPROM/RAM registers, including the Indirect Address/Data mapping.
+- Torque Enable: no motion while off, EEPROM writes rejected while on.
+- A trapezoidal profile driven by Profile Acceleration/Velocity towards Goal
+  Position, reflected in Present Position/Velocity, Moving and Moving Status.
+  With Profile Acceleration 0 (streamed goals) the motor instead follows the
+  goal as a critically damped position loop, like the firmware's PID.
+- Present Current proportional to acceleration, saturating at Current Limit
+  (the acceleration the motor can produce is capped to match). Both use the
+  XM430's 2.69 mA unit, matching `telemetry.CURRENT_CONVERSION`.
+- A configurable per-transaction serial latency.
+
+Select it by starting the server with `REHAGRIP_SIM=1`. `SIM_LATENCY_MS` sets
+the per-transaction latency (default 0) and `SIM_START_TICK` the initial
+position (default 2048). Time comes from an injectable clock (`clock.py`), so
+with a `ScaledClock` or `ManualClock` the model runs faster than real time.
+"""
+
+import os
+
+from clock import MonotonicClock
+
+# ----- SDK result / error codes -----
+COMM_SUCCESS = 0
+COMM_RX_TIMEOUT = -3001
+ERRNUM_ACCESS = 7
+
+# ----- Control table -----
+TABLE_SIZE = 700
+EEPROM_END = 64
+
+ADDR_OPERATING_MODE = 11
+ADDR_CURRENT_LIMIT = 38
+ADDR_VELOCITY_LIMIT = 44
+ADDR_TORQUE_ENABLE = 64
+ADDR_HARDWARE_ERROR_STATUS = 70
+ADDR_PROFILE_ACCELERATION = 108
+ADDR_PROFILE_VELOCITY = 112
+ADDR_GOAL_POSITION = 116
+ADDR_MOVING = 122
+ADDR_MOVING_STATUS = 123
+ADDR_PRESENT_CURRENT = 126
+ADDR_PRESENT_VELOCITY = 128
+ADDR_PRESENT_POSITION = 132
+ADDR_PRESENT_INPUT_VOLTAGE = 144
+ADDR_PRESENT_TEMPERATURE = 146
+ADDR_INDIRECT_ADDRESS_1 = 168
+ADDR_INDIRECT_DATA_1 = 224
+INDIRECT_SLOTS = 20
+
+# ----- Unit conversions -----
+TICKS_PER_REV = 4096
+VELOCITY_UNIT_RPM = 0.229        # Profile/Present Velocity
+ACCELERATION_UNIT_RPM2 = 214.577  # Profile Acceleration (rev/min^2)
+CURRENT_PER_ACCEL = 0.002        # raw current units per tick/s^2 (rough model)
+DEFAULT_CURRENT_LIMIT = 1193     # raw (x 2.69 mA), XM430-W210 factory default
+SERVO_BANDWIDTH = 50.0           # rad/s, position loop without a profile
+
+MOVING_THRESHOLD_TICKS = 1
+STEP_S = 0.001                   # integration step for the profile model
+
+
+def velocity_to_ticks(raw):
+    return raw * VELOCITY_UNIT_RPM * TICKS_PER_REV / 60.0
+
+
+def acceleration_to_ticks(raw):
+    return raw * ACCELERATION_UNIT_RPM2 * TICKS_PER_REV / 3600.0
+
+
+class SimPortHandler:
+    def __init__(self, port_name):
+        self.port_name = port_name
+        self.baudrate = None
+        self.is_open = False
+
+    def openPort(self):
+        self.is_open = True
+        return True
+
+    def closePort(self):
+        self.is_open = False
+
+    def setBaudRate(self, baudrate):
+        self.baudrate = baudrate
+        return True
+
+    def getBaudRate(self):
+        return self.baudrate
+
+    def getPortName(self):
+        return self.port_name
+
+
+class SimPacketHandler:
+    def __init__(self, protocol_version=2.0, dxl_id=1, latency_s=None, start_tick=None, clock=None):
+        """
+        Args:
+            protocol_version (float): Accepted for SDK compatibility (only 2.0 is modelled)
+            dxl_id (int): ID the simulated motor answers to
+            latency_s (float): Delay per transaction; defaults to `SIM_LATENCY_MS`
+            start_tick (int): Initial position; defaults to `SIM_START_TICK` or 2048
+            clock: Time source for the motion model and latency (default: real time)
+        """
+        self.protocol_version = protocol_version
+        self.clock = clock or MonotonicClock()
+        self.dxl_id = dxl_id
+        if latency_s is None:
+            latency_s = float(os.getenv("SIM_LATENCY_MS", "0")) / 1000.0
+        self.latency_s = latency_s
+        if start_tick is None:
+            start_tick = int(os.getenv("SIM_START_TICK", "2048"))
+
+        self.table = bytearray(TABLE_SIZE)
+        self._set(ADDR_OPERATING_MODE, 1, 3)
+        self._set(ADDR_CURRENT_LIMIT, 2, DEFAULT_CURRENT_LIMIT)
+        self._set(ADDR_VELOCITY_LIMIT, 4, 265)
+        self._set(ADDR_PRESENT_INPUT_VOLTAGE, 2, 120)
+        self._set(ADDR_PRESENT_TEMPERATURE, 1, 30)
+        for i in range(INDIRECT_SLOTS):
+            self._set(ADDR_INDIRECT_ADDRESS_1 + 2 * i, 2, ADDR_INDIRECT_DATA_1 + i)
+
+        self.position = float(start_tick)
+        self.velocity = 0.0              # ticks/s
+        self.acceleration = 0.0          # ticks/s^2
+        self.goal = float(start_tick)
+        self._last_t = self.clock.now()
+        self.transactions = 0
+
+    # ----- Raw table access -----
+    def _get(self, addr, size, signed=False):
+        return int.from_bytes(self.table[addr:addr + size], "little", signed=signed)
+
+    def _set(self, addr, size, value):
+        self.table[addr:addr + size] = (int(value) & ((1 << (8 * size)) - 1)).to_bytes(size, "little")
+
+    def _resolve(self, addr):
+        """Map an Indirect Data address to the register it points at."""
+        if ADDR_INDIRECT_DATA_1 <= addr < ADDR_INDIRECT_DATA_1 + INDIRECT_SLOTS:
+            return self._get(ADDR_INDIRECT_ADDRESS_1 + 2 * (addr - ADDR_INDIRECT_DATA_1), 2)
+        return addr
+
+    # ----- Motion model -----
+    def _advance(self):
+        now = self.clock.now()
+        elapsed = now - self._last_t
+        self._last_t = now
+        if not self._get(ADDR_TORQUE_ENABLE, 1):
+            self.velocity = 0.0
+            self.acceleration = 0.0
+            return
+
+        vmax = velocity_to_ticks(self._get(ADDR_PROFILE_VELOCITY, 4) or self._get(ADDR_VELOCITY_LIMIT, 4))
+        # The motor cannot accelerate harder than its current limit allows
+        amotor = self._get(ADDR_CURRENT_LIMIT, 2) / CURRENT_PER_ACCEL
+        profile = acceleration_to_ticks(self._get(ADDR_PROFILE_ACCELERATION, 4))
+        amax = min(profile, amotor) if profile else amotor
+
+        while elapsed > 0:
+            dt = min(STEP_S, elapsed)
+            elapsed -= dt
+            err = self.goal - self.position
+            if abs(err) < 0.5 and abs(self.velocity) < amax * dt:
+                self.position = self.goal
+                self.velocity = 0.0
+                self.acceleration = 0.0
+                break
+            if profile:
+                # Fastest velocity that can still stop at the goal
+                v_des = min(vmax, (2 * amax * abs(err)) ** 0.5) * (1 if err > 0 else -1)
+                dv = max(-amax * dt, min(amax * dt, v_des - self.velocity))
+            else:
+                accel = SERVO_BANDWIDTH ** 2 * err - 2 * SERVO_BANDWIDTH * self.velocity
+                dv = max(-amax, min(amax, accel)) * dt
+                dv = max(-vmax, min(vmax, self.velocity + dv)) - self.velocity
+            self.acceleration = dv / dt
+            self.velocity += dv
+            self.position += self.velocity * dt
+
+    def _sync_present(self):
+        self._advance()
+        err = self.goal - self.position
+        moving = abs(self.velocity) > 0 or abs(err) > MOVING_THRESHOLD_TICKS
+        in_position = abs(err) <= MOVING_THRESHOLD_TICKS
+        self._set(ADDR_MOVING, 1, moving)
+        self._set(ADDR_MOVING_STATUS, 1, (0x01 if in_position else 0) | (0x02 if moving else 0))
+        self._set(ADDR_PRESENT_POSITION, 4, round(self.position))
+        self._set(ADDR_PRESENT_VELOCITY, 4, round(self.velocity * 60.0 / TICKS_PER_REV / VELOCITY_UNIT_RPM))
+        limit = self._get(ADDR_CURRENT_LIMIT, 2)
+        current = max(-limit, min(limit, round(self.acceleration * CURRENT_PER_ACCEL)))
+        self._set(ADDR_PRESENT_CURRENT, 2, current)
+
+    def _on_write(self, addr):
+        if addr == ADDR_TORQUE_ENABLE:
+            if self._get(ADDR_TORQUE_ENABLE, 1):
+                # Enabling torque holds the present position
+                self.goal = round(self.position)
+                self._set(ADDR_GOAL_POSITION, 4, self.goal)
+        elif addr == ADDR_GOAL_POSITION:
+            self.goal = float(self._get(ADDR_GOAL_POSITION, 4, signed=True))
+
+    # ----- Transactions -----
+    def _transact(self, dxl_id):
+        self.transactions += 1
+        if self.latency_s:
+            self.clock.sleep(self.latency_s)
+        return dxl_id == self.dxl_id
+
+    def _read(self, addr, length):
+        self._sync_present()
+        return [self.table[self._resolve(a)] for a in range(addr, addr + length)]
+
+    def _write(self, addr, length, data):
+        torque_on = self._get(ADDR_TORQUE_ENABLE, 1)
+        targets = [self._resolve(a) for a in range(addr, addr + length)]
+        if torque_on and any(t < EEPROM_END for t in targets):
+            return ERRNUM_ACCESS
+        self._advance()   # settle the model up to now under the old registers
+        touched = set()
+        for target, byte in zip(targets, data):
+            self.table[target] = byte & 0xFF
+            touched.add(target)
+        if ADDR_TORQUE_ENABLE in touched:
+            self._on_write(ADDR_TORQUE_ENABLE)
+        if touched & set(range(ADDR_GOAL_POSITION, ADDR_GOAL_POSITION + 4)):
+            self._on_write(ADDR_GOAL_POSITION)
+        return 0
+
+    def readTxRx(self, port, dxl_id, address, length):
+        if not self._transact(dxl_id):
+            return [], COMM_RX_TIMEOUT, 0
+        return self._read(address, length), COMM_SUCCESS, 0
+
+    def writeTxRx(self, port, dxl_id, address, length, data):
+        if not self._transact(dxl_id):
+            return COMM_RX_TIMEOUT, 0
+        return COMM_SUCCESS, self._write(address, length, data)
+
+    def writeTxOnly(self, port, dxl_id, address, length, data):
+        if self._transact(dxl_id):
+            self._write(address, length, data)
+        return COMM_SUCCESS
+
+    def _read_value(self, port, dxl_id, address, size):
+        data, result, error = self.readTxRx(port, dxl_id, address, size)
+        if result != COMM_SUCCESS:
+            return 0, result, error
+        return int.from_bytes(bytes(data), "little"), result, error
+
+    def _write_value(self, port, dxl_id, address, size, value):
+        data = list((int(value) & ((1 << (8 * size)) - 1)).to_bytes(size, "little"))
+        return self.writeTxRx(port, dxl_id, address, size, data)
+
+    def read1ByteTxRx(self, port, dxl_id, address):
+        return self._read_value(port, dxl_id, address, 1)
+
+    def read2ByteTxRx(self, port, dxl_id, address):
+        return self._read_value(port, dxl_id, address, 2)
+
+    def read4ByteTxRx(self, port, dxl_id, address):
+        return self._read_value(port, dxl_id, address, 4)
+
+    def write1ByteTxRx(self, port, dxl_id, address, value):
+        return self._write_value(port, dxl_id, address, 1, value)
+
+    def write2ByteTxRx(self, port, dxl_id, address, value):
+        return self._write_value(port, dxl_id, address, 2, value)
+
+    def write4ByteTxRx(self, port, dxl_id, address, value):
+        return self._write_value(port, dxl_id, address, 4, value)
+
+    def ping(self, port, dxl_id):
+        if not self._transact(dxl_id):
+            return 0, COMM_RX_TIMEOUT, 0
+        return 1030, COMM_SUCCESS, 0    # XM430-W210 model number
+
+    def reboot(self, port, dxl_id):
+        if not self._transact(dxl_id):
+            return COMM_RX_TIMEOUT, 0
+        self._set(ADDR_TORQUE_ENABLE, 1, 0)
+        self._set(ADDR_HARDWARE_ERROR_STATUS, 1, 0)
+        self.velocity = 0.0
+        return COMM_SUCCESS, 0
+
+    def getTxRxResult(self, result):
+        return "[TxRxResult] Communication success!" if result == COMM_SUCCESS else f"[TxRxResult] Error {result}"
+
+    def getRxPacketError(self, error):
+        return "" if not error else f"[RxPacketError] Error {error}"
@@ -0,0 +1,333 @@
+"""
+Background telemetry sampling for the RehaGrip motor.
+
+`/api/motor/status` used to hit the bus on every request, so status traffic grew
+with the number of GUIs polling and crowded out motion commands. The
+`TelemetryPoller` samples the motor at a fixed rate on its own thread, queues
+its reads on the bus worker at telemetry priority (commands always go first),
+and publishes each sample as an immutable `TelemetrySnapshot`. Readers just
+grab the latest snapshot — no bus I/O, constant cost per request.
+
+Each sample is a single contiguous read of the status block at 122–135
+(Moving, Moving Status, Present PWM/Current/Velocity/Position), decoded into a
+`StatusBlock`. One round trip per sample instead of one per register.
+
+When the Indirect Address table has been provisioned at startup
+(`provision_indirect_block`), the poller reads the Indirect Data block instead.
+It maps the same motion registers plus Present Input Voltage, Present
+Temperature and Hardware Error Status into one 16-byte window, so health fields
+come along in the same short read.
+
+The sample rate comes from the `TELEMETRY_HZ` environment variable (default 50 Hz).
+
+Register map and units are those of the XM430-W210 that `motor.py` is written
+for: Present Current (126) in 2.69 mA units, which the current-based position
+mode (Operating Mode 5) set at startup also requires. An XL430 has neither; its
+register 126 is Present Load in 0.1 % units, so `current_mA` would be wrong there.
+"""
+
+import os
+import threading
+import time
+from typing import NamedTuple
+
+from bus import PRIORITY_TELEMETRY
+from clock import MonotonicClock
+
+# ----- Control table (XM430-W210, protocol 2.0) -----
+ADDR_HARDWARE_ERROR_STATUS = 70
+ADDR_MOVING = 122
+ADDR_MOVING_STATUS = 123
+ADDR_PRESENT_PWM = 124
+ADDR_PRESENT_CURRENT = 126
+ADDR_PRESENT_VELOCITY = 128
+ADDR_PRESENT_POSITION = 132
+ADDR_PRESENT_INPUT_VOLTAGE = 144
+ADDR_PRESENT_TEMPERATURE = 146
+ADDR_INDIRECT_ADDRESS_1 = 168   # Indirect Address 1..20, 2 bytes each
+ADDR_INDIRECT_DATA_1 = 224      # Indirect Data 1..20, 1 byte each
+INDIRECT_SLOTS = 20
+
+# Contiguous status block: Moving .. Present Position (inclusive)
+STATUS_BLOCK_ADDR = ADDR_MOVING
+STATUS_BLOCK_LEN = ADDR_PRESENT_POSITION + 4 - ADDR_MOVING   # 14 bytes
+
+CURRENT_CONVERSION = 2.69   # 1 raw unit = 2.69 mA
+VELOCITY_UNIT_RPM = 0.229   # 1 raw unit = 0.229 rev/min
+VOLTAGE_UNIT = 0.1          # 1 raw unit = 0.1 V
+
+# Indirect Data layout: (field, source address, size, signed)
+INDIRECT_FIELDS = (
+    ("moving", ADDR_MOVING, 1, False),
+    ("moving_status", ADDR_MOVING_STATUS, 1, False),
+    ("current_raw", ADDR_PRESENT_CURRENT, 2, True),
+    ("velocity_raw", ADDR_PRESENT_VELOCITY, 4, True),
+    ("position_tick", ADDR_PRESENT_POSITION, 4, True),
+    ("voltage_raw", ADDR_PRESENT_INPUT_VOLTAGE, 2, False),
+    ("temperature_c", ADDR_PRESENT_TEMPERATURE, 1, False),
+    ("hardware_error", ADDR_HARDWARE_ERROR_STATUS, 1, False),
+)
+INDIRECT_BLOCK_LEN = sum(size for _, _, size, _ in INDIRECT_FIELDS)   # 16 bytes
+
+COMM_SUCCESS = 0
+
+DEFAULT_TELEMETRY_HZ = 50.0
+
+
+def resolve_telemetry_hz() -> float:
+    env = os.getenv("TELEMETRY_HZ")
+    if env:
+        try:
+            return max(1.0, min(500.0, float(env)))
+        except ValueError:
+            print(f"⚠ Invalid TELEMETRY_HZ={env!r}, using {DEFAULT_TELEMETRY_HZ} Hz")
+    return DEFAULT_TELEMETRY_HZ
+
+
+def le_field(data, offset, size, signed=True):
+    """Decode a little-endian register field out of a block read."""
+    return int.from_bytes(bytes(data[offset:offset + size]), "little", signed=signed)
+
+
+class StatusBlock(NamedTuple):
+    moving: bool
+    moving_status: int
+    pwm_raw: int
+    current_raw: int
+    velocity_raw: int
+    position_tick: int
+
+
+def decode_status_block(data) -> StatusBlock:
+    """Decode the 14-byte block read starting at `STATUS_BLOCK_ADDR`."""
+    if len(data) < STATUS_BLOCK_LEN:
+        raise ValueError(f"Status block too short: {len(data)} < {STATUS_BLOCK_LEN} bytes")
+
+    def field(addr, size, signed=True):
+        return le_field(data, addr - STATUS_BLOCK_ADDR, size, signed)
+
+    return StatusBlock(
+        moving=bool(field(ADDR_MOVING, 1, signed=False)),
+        moving_status=field(ADDR_MOVING_STATUS, 1, signed=False),
+        pwm_raw=field(ADDR_PRESENT_PWM, 2),
+        current_raw=field(ADDR_PRESENT_CURRENT, 2),
+        velocity_raw=field(ADDR_PRESENT_VELOCITY, 4),
+        position_tick=field(ADDR_PRESENT_POSITION, 4),
+    )
+
+
+def read_status_block(port, packet, dxl_id) -> StatusBlock:
+    """Read the whole status block in one transaction (runs on the bus thread)."""
+    data, result, error = packet.readTxRx(port, dxl_id, STATUS_BLOCK_ADDR, STATUS_BLOCK_LEN)
+    if result != COMM_SUCCESS:
+        raise IOError(f"Status block read failed: {packet.getTxRxResult(result)}")
+    return decode_status_block(data)
+
+
+class IndirectBlock(NamedTuple):
+    moving: bool
+    moving_status: int
+    current_raw: int
+    velocity_raw: int
+    position_tick: int
+    voltage_raw: int
+    temperature_c: int
+    hardware_error: int
+
+
+def indirect_address_table():
+    """Bytes to write at `ADDR_INDIRECT_ADDRESS_1`: one 2-byte source address per data byte."""
+    table = []
+    for _, addr, size, _ in INDIRECT_FIELDS:
+        for i in range(size):
+            table += [(addr + i) & 0xFF, (addr + i) >> 8]
+    return table
+
+
+def decode_indirect_block(data) -> IndirectBlock:
+    """Decode the Indirect Data block laid out by `INDIRECT_FIELDS`."""
+    if len(data) < INDIRECT_BLOCK_LEN:
+        raise ValueError(f"Indirect block too short: {len(data)} < {INDIRECT_BLOCK_LEN} bytes")
+    values = {}
+    offset = 0
+    for name, _, size, signed in INDIRECT_FIELDS:
+        values[name] = le_field(data, offset, size, signed)
+        offset += size
+    values["moving"] = bool(values["moving"])
+    return IndirectBlock(**values)
+
+
+def read_indirect_block(port, packet, dxl_id) -> IndirectBlock:
+    """Read the provisioned Indirect Data block in one transaction (runs on the bus thread)."""
+    data, result, error = packet.readTxRx(port, dxl_id, ADDR_INDIRECT_DATA_1, INDIRECT_BLOCK_LEN)
+    if result != COMM_SUCCESS:
+        raise IOError(f"Indirect block read failed: {packet.getTxRxResult(result)}")
+    return decode_indirect_block(data)
+
+
+def provision_indirect_block(port, packet, dxl_id, tolerance=2):
+    """
+    Program the Indirect Address table for the telemetry block (runs on the bus thread).
+
+    Idempotent: the table is read first and only rewritten if it differs. After
+    writing, the table is read back and the mapped position is cross-checked
+    against a direct status block read.
+
+    Returns:
+        bool: True if the indirect block is mapped and verified
+    """
+    expected = indirect_address_table()
+    if len(expected) > INDIRECT_SLOTS * 2:
+        raise ValueError("Indirect layout exceeds the available Indirect Address slots")
+
+    current, result, _ = packet.readTxRx(port, dxl_id, ADDR_INDIRECT_ADDRESS_1, len(expected))
+    if result != COMM_SUCCESS:
+        print(f"⚠ Indirect table read failed: {packet.getTxRxResult(result)}")
+        return False
+
+    if list(current) == expected:
+        print("✓ Indirect telemetry block already provisioned")
+    else:
+        result, _ = packet.writeTxRx(port, dxl_id, ADDR_INDIRECT_ADDRESS_1, len(expected), expected)
+        if result != COMM_SUCCESS:
+            print(f"⚠ Indirect table write failed: {packet.getTxRxResult(result)}")
+            return False
+        readback, result, _ = packet.readTxRx(port, dxl_id, ADDR_INDIRECT_ADDRESS_1, len(expected))
+        if result != COMM_SUCCESS or list(readback) != expected:
+            print("⚠ Indirect table readback does not match the requested layout")
+            return False
+        print(f"✓ Indirect telemetry block provisioned ({INDIRECT_BLOCK_LEN} bytes)")
+
+    try:
+        mapped = read_indirect_block(port, packet, dxl_id)
+        direct = read_status_block(port, packet, dxl_id)
+    except (IOError, ValueError) as e:
+        print(f"⚠ Indirect block verification read failed: {e}")
+        return False
+    if abs(mapped.position_tick - direct.position_tick) > tolerance:
+        print(f"⚠ Indirect position {mapped.position_tick} != direct {direct.position_tick}")
+        return False
+    return True
+
+
+class TelemetrySnapshot(NamedTuple):
+    timestamp: float        # time.time() when the sample was taken
+    position_tick: int
+    current_raw: int
+    current_mA: float
+    velocity_raw: int
+    velocity_rpm: float
+    moving: bool
+    moving_status: int
+    load: float
+    input_voltage: float = None   # health fields: only when the indirect block is in use
+    temperature_c: int = None
+    hardware_error: int = None
+
+
+class TelemetryPoller:
+    def __init__(self, bus, rate_hz=None, load_source=None, clock=None):
+        """
+        Args:
+            bus (BusWorker): Worker that owns the serial port
+            rate_hz (float): Sample rate; defaults to `TELEMETRY_HZ` or 50 Hz
+            load_source (callable): Returns the latest load value (N) to attach to each sample
+            clock: Time source for the sampling schedule (default: real time)
+        """
+        self.bus = bus
+        self.rate_hz = rate_hz or resolve_telemetry_hz()
+        self.load_source = load_source or (lambda: 0.0)
+        self.clock = clock or MonotonicClock()
+
+        self.use_indirect = False
+        self._snapshot = None
+        self._listeners = []
+        self._thread = None
+        self._running = False
+        self.samples = 0
+        self.errors = 0
+
+    @property
+    def snapshot(self):
+        """Latest `TelemetrySnapshot`, or None before the first sample."""
+        return self._snapshot
+
+    def subscribe(self, callback):
+        """Call `callback(snapshot)` on the poller thread after every sample."""
+        self._listeners.append(callback)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="telemetry", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def provision_indirect(self, timeout=2.0):
+        """Map the telemetry block into Indirect Data; call with torque disabled at startup."""
+        dxl_id = self.bus.dxl_id
+        self.use_indirect = self.bus.submit(
+            lambda port, packet: provision_indirect_block(port, packet, dxl_id)
+        ).result(timeout)
+        return self.use_indirect
+
+    def _read(self, port, packet):
+        if self.use_indirect:
+            return read_indirect_block(port, packet, self.bus.dxl_id)
+        return read_status_block(port, packet, self.bus.dxl_id)
+
+    def sample(self, timeout=1.0):
+        """Take one sample now (blocking) and publish it."""
+        block = self.bus.submit(self._read, PRIORITY_TELEMETRY).result(timeout)
+        health = {}
+        if isinstance(block, IndirectBlock):
+            health = dict(
+                input_voltage=block.voltage_raw * VOLTAGE_UNIT,
+                temperature_c=block.temperature_c,
+                hardware_error=block.hardware_error,
+            )
+        snap = TelemetrySnapshot(
+            timestamp=time.time(),
+            position_tick=block.position_tick,
+            current_raw=block.current_raw,
+            current_mA=block.current_raw * CURRENT_CONVERSION,
+            velocity_raw=block.velocity_raw,
+            velocity_rpm=block.velocity_raw * VELOCITY_UNIT_RPM,
+            moving=block.moving,
+            moving_status=block.moving_status,
+            load=self.load_source(),
+            **health,
+        )
+        self._snapshot = snap
+        self.samples += 1
+        for callback in self._listeners:
+            try:
+                callback(snap)
+            except Exception as e:
+                print(f"Telemetry listener failed: {e}")
+        return snap
+
+    def _loop(self):
+        period = 1.0 / self.rate_hz
+        next_t = self.clock.now()
+        while self._running:
+            try:
+                self.sample()
+            except Exception as e:
+                self.errors += 1
+                if self.errors % 100 == 1:
+                    print(f"Telemetry read failed ({self.errors} total): {e}")
+
+            # Deadline scheduling: a slow sample eats into the sleep, not the rate
+            next_t += period
+            delay = next_t - self.clock.now()
+            if delay > 0:
+                self.clock.sleep(delay)
+            else:
+                next_t = self.clock.now()
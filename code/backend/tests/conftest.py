@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# Backend modules import each other as top-level modules (as when run from code/backend);
+# the HX711 driver and GPIO backends live one level up, in code/
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND.parent))
+sys.path.insert(0, str(BACKEND))
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from calibration import CalibrationProfile, CalibrationStore, fit_calibration
+
+
+def test_fit_recovers_an_exact_line():
+    offset, scale = 8000.0, 0.0005
+    points = [(offset + kg / scale, kg) for kg in (-2.0, 0.0, 1.0, 5.0, 10.0)]
+    profile = fit_calibration("grip", points)
+    assert profile.offset == pytest.approx(offset)
+    assert profile.scale == pytest.approx(scale)
+    assert profile.tension_scale is None
+    assert profile.rms_error_kg == pytest.approx(0.0, abs=1e-9)
+    assert profile.to_kg(offset + 4000) == pytest.approx(2.0)
+
+
+def test_least_squares_reports_residuals():
+    profile = fit_calibration("grip", [(0, 0.0), (1000, 1.1), (2000, 1.9), (3000, 3.0)])
+    assert profile.scale == pytest.approx(0.00098)
+    assert 0 < profile.rms_error_kg <= profile.max_error_kg
+
+
+def test_split_fit_uses_separate_scales_through_the_zero_point():
+    points = [(1000, 0.0), (3000, 2.0), (5000, 4.0), (0, -0.5), (-1000, -1.0)]
+    profile = fit_calibration("grip", points, split=True)
+    assert profile.offset == 1000
+    assert profile.scale == pytest.approx(0.001)
+    assert profile.tension_scale == pytest.approx(0.0005)
+    assert profile.to_kg(-1000) == pytest.approx(-1.0)
+    assert profile.max_error_kg == pytest.approx(0.0, abs=1e-9)
+
+
+@pytest.mark.parametrize("points, split, message", [
+    ([(100, 1.0)], False, "at least two points"),
+    ([(100, 1.0), (100, 2.0)], False, "at least two points"),
+    ([(0, 0.0), (1000, 1.0), (2000, 2.0)], True, "tension point"),
+    ([(0, 0.0), (-1000, -1.0)], True, "compression point"),
+])
+def test_fit_rejects_unusable_points(points, split, message):
+    with pytest.raises(ValueError, match=message):
+        fit_calibration("grip", points, split=split)
+
+
+def test_store_saves_atomically_and_reloads(tmp_path):
+    path = tmp_path / "loadcell_calibration.json"
+    store = CalibrationStore(path)
+    assert store.get("grip") is None
+    profile = fit_calibration("grip", [(0, -1.0), (1000, 0.0), (3000, 2.0)], split=True)
+    store.save(profile)
+    store.save(CalibrationProfile("spare", 10.0, 0.002))
+
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+    assert json.loads(path.read_text())["version"] == "1.0"
+    reloaded = CalibrationStore(path)
+    assert set(reloaded.profiles) == {"grip", "spare"}
+    assert reloaded.get("grip").to_dict() == profile.to_dict()
+
+
+def test_store_ignores_a_corrupt_file(tmp_path):
+    path = tmp_path / "loadcell_calibration.json"
+    path.write_text("{not json")
+    assert CalibrationStore(path).profiles == {}
@@ -0,0 +1,50 @@
+import pytest
+
+from calibration import CalibrationStore, fit_calibration
+from drift import DriftCompensator
+from loadcell import LoadSample
+
+
+class Sampler:
+    def __init__(self, sensor, calibration):
+        self.sensor = sensor
+        self.calibration = calibration
+        self.listeners = []
+
+    def subscribe(self, callback):
+        self.listeners.append(callback)
+
+    def feed(self, raw, seconds, rate_hz=80):
+        for k in range(int(seconds * rate_hz)):
+            sample = LoadSample(k / rate_hz, raw, 0.0, 0.0, 0.0)
+            for callback in self.listeners:
+                callback(sample)
+
+
+def test_drift_moves_the_sampler_offset_towards_the_unloaded_reading():
+    sampler = Sampler("a", fit_calibration("a", [(1000, 0), (11000, 1)]))
+    drift = DriftCompensator(sampler, quiescent=lambda: True, settle_s=0.5, gain=0.05)
+    drift.attach()
+    sampler.feed(1500, seconds=5)
+    assert abs(sampler.calibration.offset - 1500) < 5
+    assert drift.status()["total_offset_change"] > 490
+
+
+def test_drift_is_not_persisted_by_a_later_save(tmp_path):
+    store = CalibrationStore(tmp_path / "calibration.json")
+    store.save(fit_calibration("a", [(1000, 0), (11000, 1)]))
+    sampler = Sampler("a", store.get("a").copy())
+    DriftCompensator(sampler, quiescent=lambda: True, settle_s=0.5, gain=0.05).attach()
+    sampler.feed(1500, seconds=5)
+    assert sampler.calibration.offset > 1400
+
+    # Saving another sensor rewrites the whole file
+    store.save(fit_calibration("b", [(0, 0), (5000, 1)]))
+    assert CalibrationStore(store.path).get("a").offset == pytest.approx(1000)
+
+
+def test_no_correction_while_not_quiescent():
+    sampler = Sampler("a", fit_calibration("a", [(1000, 0), (11000, 1)]))
+    DriftCompensator(sampler, quiescent=lambda: False, settle_s=0.5).attach()
+    sampler.feed(1500, seconds=5)
+    assert sampler.calibration.offset == pytest.approx(1000)
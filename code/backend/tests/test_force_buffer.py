@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from force_buffer import GRAVITY, ForceBuffer
+
+
+def fill(buffer, forces, rate_hz=10.0):
+    for i, force in enumerate(forces):
+        buffer.append(i / rate_hz, i, force / GRAVITY, force, force)
+
+
+def test_wraparound_keeps_the_newest_samples_in_order():
+    buffer = ForceBuffer(capacity=5)
+    fill(buffer, range(12))
+    assert len(buffer) == 5
+    t, raw, kg, force, filtered = buffer.window()
+    assert raw.tolist() == [7, 8, 9, 10, 11]
+    assert force.tolist() == [7.0, 8.0, 9.0, 10.0, 11.0]
+    assert np.all(np.diff(t) > 0)
+    buffer.clear()
+    assert len(buffer) == 0 and len(buffer.window()[0]) == 0
+
+
+def test_window_by_samples_and_seconds():
+    buffer = ForceBuffer(capacity=8)
+    fill(buffer, range(20))                       # t = 0.0 .. 1.9 s
+    assert buffer.window(samples=3)[1].tolist() == [17, 18, 19]
+    assert buffer.window(samples=100)[1].tolist() == list(range(12, 20))
+    assert buffer.window(seconds=0.35)[1].tolist() == [16, 17, 18, 19]
+    assert buffer.window(seconds=0.35, now=1.7)[1].tolist() == [14, 15, 16, 17, 18, 19]
+    assert buffer.window(seconds=0.35, samples=2)[1].tolist() == [18, 19]
+
+
+def test_stats_split_compression_tension_and_neutral():
+    buffer = ForceBuffer()
+    fill(buffer, [10.0, 10.0, -5.0, -5.0, -5.0, 0.1, 0.1, 10.0])
+    stats = buffer.stats(zone=(5.0, None))
+    assert stats["samples"] == 8
+    assert stats["rate_hz"] == pytest.approx(10.0)
+    assert stats["compression"]["samples"] == 3
+    assert stats["compression"]["peak_n"] == 10.0
+    assert stats["compression"]["time_s"] == pytest.approx(0.3)
+    assert stats["compression"]["impulse_ns"] == pytest.approx(3.0)
+    assert stats["tension"]["samples"] == 3
+    assert stats["tension"]["peak_n"] == 5.0
+    assert stats["tension"]["impulse_ns"] == pytest.approx(1.5)
+    assert stats["neutral_time_s"] == pytest.approx(0.2)
+    assert stats["zone"]["samples"] == 3
+    assert stats["zone"]["fraction"] == pytest.approx(3 / 8)
+    assert stats["percentiles_n"]["p50"] == pytest.approx(0.1)
+
+
+def test_stats_of_an_empty_window():
+    assert ForceBuffer().stats() == {"samples": 0}
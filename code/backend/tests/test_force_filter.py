@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from force_filter import HampelFilter, LowPassFilter, _Window, build_chain
+from loadcell import open_loadcells
+
+
+def test_window_mad_matches_a_full_sort():
+    rng = random.Random(1)
+    for size in range(1, 12):
+        window = _Window(size)
+        for _ in range(size + 20):
+            window.push(rng.choice([rng.gauss(0, 1), rng.randint(-3, 3)]))
+            median = window.median()
+            expected = sorted(abs(v - median) for v in window.values)[len(window.values) // 2]
+            assert window.mad(median) == pytest.approx(expected)
+
+
+def test_hampel_replaces_a_spike_with_the_median():
+    hampel = HampelFilter(7)
+    rng = random.Random(2)
+    out = [hampel.update(10 + rng.gauss(0, 0.1)) for _ in range(20)]
+    assert abs(hampel.update(500.0) - 10) < 0.5
+    assert hampel.rejected >= 1
+    assert all(abs(v - 10) < 1 for v in out)
+
+
+@pytest.mark.parametrize("size", [5, 7, 9])
+def test_hampel_reports_how_long_it_holds_back_a_step(size):
+    hampel = HampelFilter(size)
+    for _ in range(size):
+        hampel.update(0.0)
+    held = 0
+    while hampel.update(50.0) != 50.0:
+        held += 1
+    assert held == hampel.latency_samples == (size - 1) / 2
+
+
+def test_chain_is_designed_for_the_given_rate():
+    chain = build_chain("lowpass:2,ema:0.5", rate_hz=10)
+    lowpass = chain.stages[0]
+    assert lowpass.rate_hz == 10
+    assert lowpass.b0 == pytest.approx(LowPassFilter(2.0, 10).b0)
+    assert chain.describe()["rate_hz"] == 10
+    assert chain.latency_ms() == pytest.approx(chain.latency_samples / 10 * 1000)
+    with pytest.raises(ValueError):
+        build_chain("lowpass:8", rate_hz=10)     # above Nyquist at RATE=low
+
+
+def test_open_loadcells_passes_the_configured_rate(monkeypatch):
+    monkeypatch.setenv("LOADCELL_GPIO", "fake")
+    monkeypatch.setenv("LOADCELL_SPS", "10")
+    monkeypatch.setenv("LOADCELL_FILTER", "hampel:5,lowpass:2")
+    sampler, = open_loadcells().values()
+    try:
+        assert sampler.filters.rate_hz == 10
+        assert sampler.filters.stages[1].rate_hz == 10
+    finally:
+        sampler.hx711.cleanup()
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from gpio_drivers import FakeGPIO, FakeHX711Chip, benchmark
+from read_loadcell import HX711
+
+SPS = 400.0        # faster than the real chip so the tests stay short
+
+
+def make_hx711(value=8000, edge_detect=True):
+    chip = FakeHX711Chip(5, 6, sps=SPS, value=value)
+    gpio = FakeGPIO([chip], edge_detect=edge_detect)
+    return HX711(5, 6, gpio=gpio), gpio, chip
+
+
+def test_edge_triggered_read():
+    hx, gpio, chip = make_hx711()
+    try:
+        assert hx.edge_triggered
+        assert 5 in gpio._callbacks
+        assert hx.read_samples(20) == [8000] * 20
+    finally:
+        hx.cleanup()
+    assert 5 not in gpio._callbacks
+
+
+def test_polling_fallback_without_edge_detection():
+    hx, gpio, chip = make_hx711(edge_detect=False)
+    try:
+        assert not hx.edge_triggered
+        assert hx.read_samples(20) == [8000] * 20
+    finally:
+        hx.cleanup()
+
+
+@pytest.mark.parametrize("edge_detect", [True, False])
+def test_read_times_out_when_no_conversion_finishes(edge_detect):
+    hx, gpio, chip = make_hx711(edge_detect=edge_detect)
+    gpio._running = False        # stop the conversion clock; DOUT stays high after this read
+    time.sleep(2 / SPS)
+    hx.read()
+    t0 = time.monotonic()
+    with pytest.raises(Exception, match="HX711 timeout"):
+        hx.read()
+    assert time.monotonic() - t0 >= 0.9
+    hx.cleanup()
+
+
+@pytest.mark.parametrize("value", [0, 1, -1, -1234, 0x7FFFFF, -0x800000])
+def test_24_bit_twos_complement(value):
+    hx, gpio, chip = make_hx711(value=value)
+    try:
+        assert hx.read() == value
+    finally:
+        hx.cleanup()
+
+
+def test_benchmark_pulses_never_clock_out_a_conversion(monkeypatch):
+    chip = FakeHX711Chip(5, 6, sps=SPS, value=lambda t, channel: 8000)
+    reads = []
+    original = HX711.read
+
+    def read(self):
+        reads.append(original(self))
+        return reads[-1]
+
+    monkeypatch.setattr(HX711, "read", read)
+    result = benchmark(FakeGPIO([chip]), samples=20, pulses=500, sps=SPS)
+    assert result["edge_triggered"]
+    assert reads and set(reads) == {8000}
+    assert (chip.channel, chip.gain) == ("A", 128)
@@ -0,0 +1,47 @@
+import pytest
+
+from gpio_drivers import FakeGPIO, FakeHX711Chip
+from read_loadcell import HX711Array
+
+SPS = 400.0        # faster than the real chip so the tests stay short
+
+
+def channel_value(t, channel):
+    return 1000 if channel == "A" else -5000
+
+
+def make_array(settle=4, dwell=3, boards=2):
+    chips = [FakeHX711Chip(dout, 6, sps=SPS, value=channel_value) for dout in range(10, 10 + boards)]
+    array = HX711Array([c.dout for c in chips], 6, channels=(("A", 128), ("B", 32)),
+                       gpio=FakeGPIO(chips), dwell=dwell, settle=settle)
+    return array, chips
+
+
+def test_array_only_returns_settled_conversions():
+    array, chips = make_array()
+    try:
+        seen = []
+        for _ in range(24):
+            (channel, _), values = array.read()
+            assert values == [channel_value(0, channel)] * len(chips)
+            seen.append(channel)
+    finally:
+        array.cleanup()
+    # Dwells on each channel, then switches (the first A read went to the constructor)
+    assert seen[:8] == ["A"] * 2 + ["B"] * 3 + ["A"] * 3
+    assert array.discarded >= 4 * 7
+
+
+def test_fake_chip_models_settling_after_a_switch():
+    array, chips = make_array(settle=0, dwell=1)
+    try:
+        reads = [array.read() for _ in range(10)]
+    finally:
+        array.cleanup()
+    # Without discarding, a read right after a switch still carries the previous channel's value
+    assert any(values[0] != channel_value(0, channel) for (channel, _), values in reads)
+
+
+def test_dwell_and_settle_are_validated():
+    with pytest.raises(ValueError):
+        HX711Array([10], 6, gpio=FakeGPIO([FakeHX711Chip(10, 6)]), dwell=0)
@@ -0,0 +1,50 @@
+import io
+import time
+
+from loadcell import (FLAG_READ_ERROR, FLAG_TIMING_VIOLATION, RECORD, LinearScale,
+                      LoadCellProcess)
+
+
+class FakeProcess:
+    def __init__(self, records):
+        self.stdout = io.BytesIO(b"".join(RECORD.pack(*r) for r in records))
+        self.pid = 4242
+
+    def poll(self):
+        return 0
+
+
+def test_records_are_decoded_and_flags_honoured():
+    cell = LoadCellProcess(5, 6, gpio="fake")
+    cell.calibration = LinearScale(offset=1000, scale=0.001)
+    cell.process = FakeProcess([
+        (100.0, 3000, 0, 12.5),
+        (100.1, 0, FLAG_READ_ERROR, 0.0),
+        (100.2, 999999, FLAG_TIMING_VIOLATION, 75.0),
+        (100.3, -1000, 0, 14.0),
+    ])
+    cell._running = True
+    cell._loop()                     # returns at end of the pipe
+
+    assert [s.raw for s in cell.recent()] == [3000, -1000]
+    assert cell.recent()[0].kg == 2.0
+    assert cell.latest.kg == -2.0
+    assert cell.errors == 1
+    assert cell.timing_violations == 1
+    assert cell.max_high_us == 75.0
+
+
+def test_acquisition_process_streams_samples():
+    cell = LoadCellProcess(5, 6, gpio="fake", edge=False)
+    assert "--no-edge" in cell.command
+    cell.start()
+    try:
+        deadline = time.monotonic() + 10
+        while cell.samples < 5 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert cell.samples >= 5
+        assert cell.pid is not None
+        assert cell.latest.raw == 0 and cell.errors == 0
+    finally:
+        cell.stop()
+    assert cell.process is None
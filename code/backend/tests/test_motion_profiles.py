@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+import motion_profiles
+from motion_profiles import SHAPES, smooth_ticks
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_moves_hit_both_ends_monotonically(shape):
+    ticks = smooth_ticks(1000, 3000, 2.0, 100.0, shape)
+    assert len(ticks) == 201 and ticks.dtype == np.int32
+    assert ticks[0] == 1000 and ticks[-1] == 3000
+    assert np.all(np.diff(ticks) >= 0)
+    down = smooth_ticks(3000, 1000, 2.0, 100.0, shape)
+    assert down[0] == 3000 and down[-1] == 1000
+
+
+def test_curve_cache_is_shared_across_start_positions():
+    motion_profiles._curve.cache_clear()
+    for start in range(1000, 1100, 7):
+        smooth_ticks(start, 2500, 1.5, 100.0)
+    info = motion_profiles._curve.cache_info()
+    assert info.misses == 1 and info.hits > 10
+
+
+def test_ticks_are_clipped_and_bad_input_rejected():
+    assert smooth_ticks(4000, 5000, 1.0, 50.0)[-1] == 4095
+    with pytest.raises(ValueError):
+        smooth_ticks(0, 100, 0.0, 50.0)
+    with pytest.raises(ValueError, match="Unknown profile shape"):
+        smooth_ticks(0, 100, 1.0, 50.0, "linear")
@@ -0,0 +1,149 @@
+import pytest
+
+from motion import VELOCITY_LIMIT
+from program import OP_HOLD, OP_MOVE, TICKS_PER_DEGREE
+from program_dsl import MAX_PLAN_STEPS, PlanCache, compile_program, parse_program, program_digest
+
+PRESETS = [{"name": "Open", "pos": 30}, {"name": "Close", "pos": -20}]
+CENTER = 2048
+
+DSL = """
+program "Grip warm-up"
+velocity 60
+repeat 2 {
+    repeat 3 {
+        move "Open" at 80
+        hold 2
+        move -10
+        hold 5 until force > 15
+        rest 1
+    }
+    rest 30
+}
+"""
+
+YAML = """
+name: Grip warm-up
+velocity: 60
+steps:
+  - repeat: 2
+    steps:
+      - repeat: 3
+        steps:
+          - move: Open
+            velocity: 80
+          - hold: 2
+          - move: -10
+          - hold: 5
+            until: force > 15
+          - rest: 1
+      - rest: 30
+"""
+
+
+def tick(degrees):
+    return int(CENTER + degrees * TICKS_PER_DEGREE)
+
+
+def test_move_at_sets_velocity_for_that_move_only():
+    program = parse_program('move "Open" at 80\nmove 10')
+    assert program["steps"] == [{"move": "Open", "velocity": 80.0}, {"move": 10.0}]
+
+
+def test_velocity_line_after_move_is_a_default_not_a_move_velocity():
+    program = parse_program("move 10\nvelocity 80\nmove 20")
+    assert program["steps"] == [{"move": 10.0}, {"velocity": 80.0}, {"move": 20.0}]
+
+
+def test_yaml_and_dsl_parse_to_the_same_steps():
+    dsl = parse_program('program "P"\nmove "Open" at 80\nvelocity 40\nmove -10', "dsl")
+    yml = parse_program("name: P\nsteps:\n  - move: Open\n    velocity: 80\n"
+                        "  - velocity: 40\n  - move: -10\n", "yaml")
+    assert dsl == yml
+
+
+def test_empty_repeat_is_rejected_without_looping():
+    with pytest.raises(ValueError, match="at least one statement"):
+        compile_program("move 0\nrepeat 20000000 { }", [], 2048)
+
+
+@pytest.mark.parametrize("source, field", [
+    ("steps:\n  - move: 0\n  - rest:\n", "rest"),
+    ("steps:\n  - repeat:\n    steps:\n      - move: 0\n", "repeat"),
+    ("steps:\n  - move: 0\n  - hold:\n", "hold"),
+    ("steps:\n  - move: 0\n    velocity:\n", "velocity"),
+    ("steps:\n  - move:\n", "move"),
+    ("steps:\n  - repeat: 2.5\n    steps:\n      - move: 0\n", "repeat"),
+])
+def test_null_or_mistyped_values_name_the_field(source, field):
+    with pytest.raises(ValueError, match=f"'{field}' must be"):
+        compile_program(source, [], 2048, fmt="yaml")
+
+
+def test_cache_keys_include_the_format():
+    cache = PlanCache()
+    # Valid YAML (a plain string) and valid DSL: the format decides how it compiles
+    source = "move 10"
+    with pytest.raises(ValueError):
+        cache.compile(source, [], 2048, fmt="yaml")
+    dsl = cache.compile(source, [], 2048, fmt="dsl")
+    assert dsl.digest != program_digest(source, [], 2048, "right", 50, "yaml")
+    assert cache.compile(source, [], 2048, fmt="dsl") is dsl
+    assert cache.hits == 1
+
+
+def test_dsl_and_yaml_compile_to_the_same_plan():
+    dsl = compile_program(DSL, PRESETS, CENTER, fmt="dsl")
+    yml = compile_program(YAML, PRESETS, CENTER, fmt="yaml")
+    assert dsl == yml
+    assert compile_program(DSL, PRESETS, CENTER) == dsl      # detected as DSL
+    assert compile_program(YAML, PRESETS, CENTER) == yml     # detected as YAML
+
+
+def test_plan_unrolls_loops_and_counts_sets_and_reps():
+    plan = compile_program(DSL, PRESETS, CENTER)
+    assert plan.name == "Grip warm-up"
+    assert plan.sets_total == 2 and plan.reps_total == 6
+    assert plan.ops.count(OP_MOVE) == 12
+    assert plan.ticks[:3] == (tick(30), tick(30), tick(-10))
+    assert plan.velocities[0] == 80 and plan.velocities[2] == 60
+    assert plan.ops[3] == OP_HOLD and plan.conditions[3] == (">", 15.0)
+    assert plan.sets[-1] == 2 and plan.reps[-2] == 3
+
+
+def test_left_hand_mirrors_angles():
+    plan = compile_program("move 10", [], CENTER, hand="left")
+    assert plan.ticks == (tick(-10),)
+
+
+@pytest.mark.parametrize("source", ["move 61", "move -60.5"])
+def test_angles_beyond_60_degrees_are_rejected(source):
+    with pytest.raises(ValueError, match="outside"):
+        compile_program(source, [], CENTER)
+
+
+@pytest.mark.parametrize("source", ["move 10 at 0", f"move 10 at {VELOCITY_LIMIT + 1}",
+                                    "velocity 0\nmove 10"])
+def test_velocity_outside_the_motor_range_is_rejected(source):
+    with pytest.raises(ValueError, match="Velocity"):
+        compile_program(source, [], CENTER)
+
+
+def test_programs_expanding_past_the_step_limit_are_rejected():
+    with pytest.raises(ValueError, match=str(MAX_PLAN_STEPS)):
+        compile_program(f"repeat {MAX_PLAN_STEPS} {{ move 0\nmove 5 }}", [], CENTER)
+
+
+@pytest.mark.parametrize("source, fmt, message", [
+    ('move "Missing"', None, "Unknown preset"),
+    ("hold 2", None, "no moves"),
+    ("move 0\nrepeat 0 { move 5 }", None, ">= 1"),
+    ("move 0\nhold 2 until grip > 5", None, "Invalid program"),
+    ("steps:\n  - move: 0\n  - hold: 1\n    until: torque > 5\n", "yaml", "Cannot parse condition"),
+    ("steps:\n  - jump: 3\n", "yaml", "Unknown step"),
+    ("name: no steps\n", "yaml", "'steps' list"),
+    ("move 0", "json", "Unknown program format"),
+])
+def test_error_paths_raise_value_error(source, fmt, message):
+    with pytest.raises(ValueError, match=message):
+        compile_program(source, PRESETS, CENTER, fmt=fmt)
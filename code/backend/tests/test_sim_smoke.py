@@ -0,0 +1,120 @@
+"""Start the backend against the simulated motor (REHAGRIP_SIM=1) and drive it over HTTP."""
+
+import importlib
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    state_dir = tmp_path_factory.mktemp("state")
+    # The server reads its configuration at import and startup; keep the
+    # environment patched for the whole module and restore it afterwards
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("REHAGRIP_SIM", "1")
+        mp.setenv("LOADCELL", "0")
+        mp.setenv("XDG_STATE_HOME", str(state_dir))
+        mp.setenv("PRESET_FILE", str(state_dir / "presets.json"))
+        server = importlib.import_module("server")
+        with TestClient(server.app) as c:
+            c.server = server
+            yield c
+
+
+def wait_for_run(client, run_id, timeout_s=10.0):
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        run = client.get(f"/api/motor/trajectory/{run_id}").json()
+        if run["finished"] is not None:
+            return run
+        time.sleep(0.05)
+    raise AssertionError(f"Trajectory {run_id} did not finish: {run}")
+
+
+def test_status(client):
+    status = client.post("/api/motor/status").json()
+    assert status["torque"] and not status["emergency"]
+    assert not status["safety_tripped"]
+
+
+def test_move_and_wait(client):
+    move = client.post("/api/motor/move", json={"position": 20, "wait": True}).json()
+    assert move["status"] == "arrived"
+    assert move["position"] == pytest.approx(20, abs=0.5)
+    assert client.get(f"/api/motor/move/{move['move_id']}").json()["status"] == "arrived"
+
+
+def test_streamed_trajectories_do_not_trip_safety(client):
+    run = client.post("/api/motor/trajectory/smooth", json={"position": -30, "peak_velocity": 90}).json()
+    assert wait_for_run(client, run["run_id"])["status"] == "completed"
+    run = client.post("/api/motor/trajectory", json={"waypoints": [
+        {"t": 0, "position": -30}, {"t": 0.5, "position": 0}, {"t": 1.0, "position": 10}]}).json()
+    assert wait_for_run(client, run["run_id"])["status"] == "completed"
+
+    safety = client.get("/api/safety").json()
+    assert safety["tripped"] is None, safety["tripped"]
+    # Manual moves afterwards run with the normal profile again
+    move = client.post("/api/motor/move", json={"position": 0, "wait": True}).json()
+    assert move["status"] == "arrived"
+
+
+def test_hand_and_center_are_locked_while_a_program_runs(client):
+    started = client.post("/api/motor/program", json={"source": "move 10\nhold 5"}).json()
+    assert started["ok"]
+    try:
+        assert client.post("/api/motor/hand", json={"hand": "left"}).status_code == 409
+        assert client.post("/api/motor/recenter").status_code == 409
+        assert client.post("/api/motor/center").status_code == 409
+        assert client.server.state.hand == "right"
+    finally:
+        client.post("/api/motor/program/abort")
+    deadline = time.time() + 5
+    while client.server.programs.running and time.time() < deadline:
+        time.sleep(0.05)
+
+
+def test_hand_switch_is_refused_during_a_trajectory(client):
+    run = client.post("/api/motor/trajectory", json={"waypoints": [
+        {"t": 0, "position": 0}, {"t": 1.5, "position": 10}]}).json()
+    assert client.post("/api/motor/hand", json={"hand": "left"}).status_code == 409
+    assert client.post("/api/motor/recenter").status_code == 409
+    finished = wait_for_run(client, run["run_id"])
+    assert finished["status"] == "completed"
+    # One error sample per fresh telemetry sample, not one per 100 Hz setpoint
+    assert 0 < finished["error_samples"] < finished["samples_sent"]
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/motor/trajectory", {"waypoints": [{"t": 0, "position": 0}, {"t": 3600, "position": 10}]}),
+    ("/api/motor/trajectory", {"velocity_profile": [{"duration": 3600, "velocity": 0}]}),
+    ("/api/motor/trajectory/smooth", {"position": 5, "duration": 3600}),
+])
+def test_overlong_trajectories_are_rejected(client, path, body):
+    response = client.post(path, json=body)
+    assert response.status_code == 422
+    assert "maximum" in response.json()["detail"]
+
+
+def test_trip_blocks_torque_on_and_motion_until_cleared(client):
+    server = client.server
+    server.safety.trip("current", 2000.0, 1500.0, "mA", time.time())
+    time.sleep(0.1)
+    start = server.telemetry.snapshot.position_tick
+
+    assert client.post("/api/motor/torque", json={"torque": True}).status_code == 409
+    assert client.post("/api/motor/hand", json={"hand": "left"}).status_code == 409
+    assert client.post("/api/motor/recenter").status_code == 409
+    assert client.post("/api/motor/move", json={"position": 10}).status_code == 409
+    assert client.post("/api/motor/trajectory/smooth", json={"position": 10}).status_code == 409
+    time.sleep(0.2)
+    status = client.post("/api/motor/status").json()
+    assert not status["torque"] and status["safety_tripped"]
+    assert abs(server.telemetry.snapshot.position_tick - start) <= 2
+
+    # Clearing the emergency stop re-arms the supervisor and allows motion again
+    assert client.post("/api/motor/emergency", json={"stop": False}).status_code == 200
+    assert client.get("/api/safety").json()["tripped"] is None
+    move = client.post("/api/motor/move", json={"position": 0, "wait": True}).json()
+    assert move["status"] == "arrived"
@@ -0,0 +1,282 @@
+"""
+Server-side timed trajectory execution for the RehaGrip motor.
+
+Moving through a sequence used to take one HTTP request per waypoint, so the
+timing depended on network jitter. Here a trajectory is uploaded once and
+streamed from the server:
+
+- `interpolate_waypoints` / `integrate_velocity_profile` turn waypoints
+  (degrees at timestamps) or velocity segments into one setpoint per control
+  period.
+- `TrajectoryRunner` runs a deadline-scheduled loop on its own thread (e.g.
+  100 Hz). It writes each Goal Position without waiting for a status packet
+  and records the achieved-vs-planned error and the loop jitter for the run.
+
+If the motor is not already at the first setpoint, the runner first moves
+there with a gentle firmware profile and waits for arrival. While the run is
+active the firmware profile is disabled (Profile Acceleration and Velocity = 0)
+so the motor follows the dense setpoints instead of re-planning a trapezoid for
+each one; the profile is restored when the run ends, however it ends.
+Trajectories faster than `MAX_TRAJECTORY_DEG_S` or longer than
+`MAX_TRAJECTORY_S` are rejected, so one request cannot hold the bus
+indefinitely. Tracking error is only measured on telemetry samples that are
+newer than the last one used, so a stale snapshot is never counted twice.
+"""
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from bus import PRIORITY_COMMAND
+from clock import MonotonicClock
+from motion import (send_motion_sync, arrival_timeout, encode_motion_command, ADDR_GOAL_POSITION,
+                    ADDR_PROFILE_ACCELERATION, ADDR_PROFILE_VELOCITY, DEFAULT_PROFILE_ACCELERATION)
+
+DEFAULT_RATE_HZ = 100.0
+MAX_RATE_HZ = 200.0
+MAX_TRAJECTORY_DEG_S = 180.0
+MAX_TRAJECTORY_S = 120.0
+TICKS_PER_DEGREE = 4095 / 360
+LEAD_IN_VELOCITY = 50            # Profile Velocity for the move to the first setpoint
+LEAD_IN_TOLERANCE_TICKS = 8
+
+
+class Waypoint(NamedTuple):
+    t: float        # seconds from trajectory start
+    deg: float      # degrees relative to center (before hand mirroring)
+
+
+class VelocitySegment(NamedTuple):
+    duration: float     # seconds
+    velocity: float     # degrees per second
+
+
+def interpolate_waypoints(waypoints, rate_hz):
+    """Linearly interpolate waypoints into one setpoint (degrees) per control period."""
+    points = sorted(waypoints, key=lambda w: w.t)
+    if len(points) < 2:
+        raise ValueError("A trajectory needs at least two waypoints")
+    if points[0].t < 0:
+        raise ValueError("Waypoint times must be >= 0")
+    check_duration(points[-1].t - points[0].t)
+
+    period = 1.0 / rate_hz
+    n = int(round((points[-1].t - points[0].t) * rate_hz)) + 1
+    setpoints = []
+    seg = 0
+    for k in range(n):
+        t = points[0].t + k * period
+        while seg < len(points) - 2 and t > points[seg + 1].t:
+            seg += 1
+        a, b = points[seg], points[seg + 1]
+        span = b.t - a.t
+        frac = 0.0 if span <= 0 else min(1.0, max(0.0, (t - a.t) / span))
+        setpoints.append(a.deg + (b.deg - a.deg) * frac)
+    return setpoints
+
+
+def integrate_velocity_profile(segments, rate_hz, start_deg):
+    """Integrate velocity segments from `start_deg` into per-period setpoints (degrees)."""
+    if any(seg.duration < 0 for seg in segments):
+        raise ValueError("Segment durations must be >= 0")
+    check_duration(sum(seg.duration for seg in segments))
+    period = 1.0 / rate_hz
+    setpoints = [start_deg]
+    deg = start_deg
+    for seg in segments:
+        for _ in range(int(round(seg.duration * rate_hz))):
+            deg += seg.velocity * period
+            setpoints.append(deg)
+    return setpoints
+
+
+def check_duration(duration_s, max_s=MAX_TRAJECTORY_S):
+    """Raise ValueError if a trajectory would run longer than `max_s`."""
+    if duration_s > max_s:
+        raise ValueError(f"Trajectory lasts {duration_s:g} s; the maximum is {max_s:g} s")
+
+
+def check_speed(setpoints, rate_hz, max_deg_s=MAX_TRAJECTORY_DEG_S):
+    """Raise ValueError if any step between setpoints exceeds `max_deg_s`."""
+    limit = max_deg_s / rate_hz
+    for k in range(1, len(setpoints)):
+        if abs(setpoints[k] - setpoints[k - 1]) > limit + 1e-9:
+            raise ValueError(f"Trajectory exceeds {max_deg_s:.0f} deg/s at sample {k}")
+
+
+def degrees_to_ticks(setpoints, center_tick, hand="right"):
+    """Map degrees relative to center to clamped goal ticks, mirroring for the left hand."""
+    sign = -1 if hand == "left" else 1
+    return [max(0, min(4095, int(center_tick + sign * deg * TICKS_PER_DEGREE))) for deg in setpoints]
+
+
+class TrajectoryRun:
+    def __init__(self, run_id, ticks, rate_hz):
+        self.run_id = run_id
+        self.ticks = ticks
+        self.rate_hz = rate_hz
+        self.status = "pending"
+        self.started = None
+        self.finished = None
+        self.samples_sent = 0
+        self.overruns = 0
+        self._jitter = []      # seconds late vs. the scheduled send time
+        self._errors = []      # achieved - planned, ticks (one per fresh telemetry sample)
+
+    def report(self):
+        jitter_ms = sorted(j * 1000 for j in self._jitter)
+        errors_deg = [abs(e) / TICKS_PER_DEGREE for e in self._errors]
+
+        def pct(values, p):
+            return values[min(len(values) - 1, int(p * len(values)))] if values else None
+
+        return {
+            "run_id": self.run_id,
+            "status": self.status,
+            "rate_hz": self.rate_hz,
+            "planned_samples": len(self.ticks),
+            "samples_sent": self.samples_sent,
+            "duration_s": (len(self.ticks) - 1) / self.rate_hz,
+            "started": self.started,
+            "finished": self.finished,
+            "overruns": self.overruns,
+            "jitter_ms": {
+                "mean": sum(jitter_ms) / len(jitter_ms) if jitter_ms else None,
+                "p95": pct(jitter_ms, 0.95),
+                "max": jitter_ms[-1] if jitter_ms else None,
+            },
+            "error_samples": len(errors_deg),
+            "error_deg": {
+                "mean": sum(errors_deg) / len(errors_deg) if errors_deg else None,
+                "rms": (sum(e * e for e in errors_deg) / len(errors_deg)) ** 0.5 if errors_deg else None,
+                "max": max(errors_deg) if errors_deg else None,
+            },
+        }
+
+
+class TrajectoryRunner:
+    def __init__(self, bus, telemetry, arrival, clock=None, history=16, velocity=None):
+        """
+        Args:
+            bus (BusWorker): Worker that owns the serial port
+            telemetry (TelemetryPoller): Source of achieved positions for error reporting
+            arrival (ArrivalWatcher): Used to wait for the lead-in move to the first setpoint
+            clock: Time source for the deadline schedule (default: real time)
+            history (int): Number of finished run reports kept for lookup
+            velocity: `velocity() -> int`, the Profile Velocity restored after a run
+                (default: `LEAD_IN_VELOCITY`)
+        """
+        self.bus = bus
+        self.velocity = velocity or (lambda: LEAD_IN_VELOCITY)
+        self.telemetry = telemetry
+        self.arrival = arrival
+        self.clock = clock or MonotonicClock()
+        self.history = history
+        self.runs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._current = None
+        self._abort = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._current is not None
+
+    def start(self, ticks, rate_hz):
+        """Start streaming `ticks` at `rate_hz`; returns the `TrajectoryRun`."""
+        with self._lock:
+            if self._current is not None:
+                raise RuntimeError("A trajectory is already running")
+            run = TrajectoryRun(next(self._ids), [int(t) for t in ticks], rate_hz)
+            self._current = run
+            self.runs[run.run_id] = run
+            while len(self.runs) > self.history:
+                self.runs.popitem(last=False)
+        self._abort.clear()
+        threading.Thread(target=self._execute, args=(run,), name="trajectory", daemon=True).start()
+        return run
+
+    def abort(self):
+        self._abort.set()
+
+    def _lead_in(self, run):
+        """Move to the first setpoint with a normal profile; False if it did not arrive."""
+        snap = self.telemetry.snapshot
+        start = run.ticks[0]
+        if snap is None or abs(snap.position_tick - start) <= LEAD_IN_TOLERANCE_TICKS:
+            return True
+        run.status = "lead_in"
+        send_motion_sync(self.bus, DEFAULT_PROFILE_ACCELERATION, LEAD_IN_VELOCITY, start)
+        result = self.arrival.wait_sync(start, arrival_timeout(start - snap.position_tick, LEAD_IN_VELOCITY))
+        if self._abort.is_set():
+            run.status = "aborted"
+            return False
+        if result.status != "arrived":
+            run.status = "failed"
+            print(f"Trajectory {run.run_id}: lead-in to tick {start} {result.status}")
+            return False
+        return True
+
+    def _restore_profile(self):
+        """Write back the firmware profile that manual moves expect."""
+        acceleration, velocity = DEFAULT_PROFILE_ACCELERATION, int(self.velocity())
+        self.bus.write_block_sync(
+            ADDR_PROFILE_ACCELERATION, encode_motion_command(acceleration, velocity, 0)[:8],
+            registers={ADDR_PROFILE_ACCELERATION: acceleration, ADDR_PROFILE_VELOCITY: velocity},
+            priority=PRIORITY_COMMAND,
+        )
+
+    def _execute(self, run):
+        period = 1.0 / run.rate_hz
+        try:
+            if not self._lead_in(run):
+                return
+            # Disable the firmware profile so the motor tracks the dense setpoints
+            send_motion_sync(self.bus, 0, 0, run.ticks[0])
+            # Encode every goal up front so the loop only sends
+            frames = [list((tick & 0xFFFFFFFF).to_bytes(4, "little")) for tick in run.ticks]
+            run.status = "running"
+            run.started = time.time()
+            t0 = self.clock.now()
+            last_sample = None
+            for k, tick in enumerate(run.ticks):
+                if self._abort.is_set():
+                    run.status = "aborted"
+                    break
+                deadline = t0 + k * period
+                delay = deadline - self.clock.now()
+                if delay > 0:
+                    self.clock.sleep(delay)
+                late = self.clock.now() - deadline
+                if late > period:
+                    run.overruns += 1
+                run._jitter.append(max(0.0, late))
+
+                self.bus.write_block_sync(
+                    ADDR_GOAL_POSITION, frames[k],
+                    ack=False, registers={ADDR_GOAL_POSITION: tick}, priority=PRIORITY_COMMAND,
+                )
+                run.samples_sent += 1
+
+                # Achieved vs. planned: a new telemetry sample against the setpoint sent one
+                # period earlier. Telemetry runs slower than the loop, so skip repeated snapshots
+                snap = self.telemetry.snapshot
+                if snap is not None and k > 0 and (last_sample is None or snap.timestamp > last_sample):
+                    last_sample = snap.timestamp
+                    run._errors.append(snap.position_tick - run.ticks[k - 1])
+            else:
+                run.status = "completed"
+        except Exception as e:
+            run.status = "failed"
+            print(f"Trajectory {run.run_id} failed: {e}")
+        finally:
+            try:
+                self._restore_profile()
+            except Exception as e:
+                print(f"⚠ Trajectory {run.run_id}: could not restore the motion profile: {e}")
+            run.finished = time.time()
+            with self._lock:
+                self._current = None
+            print(f"Trajectory {run.run_id} {run.status}: {run.samples_sent}/{len(run.ticks)} samples")
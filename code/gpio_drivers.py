@@ -0,0 +1,502 @@
+"""
+GPIO backends for the HX711 driver in read_loadcell.py.
+
+`HX711` talks to its pins through an object with the RPi.GPIO module API
+(`setup`, `output`, `input`, `add_event_detect`, ...). Bit-banging one sample
+costs 50+ `output`/`input` calls, and PD_SCK must not stay high for more than
+60 us, so the per-call overhead of the backend matters. `open_gpio(name)`
+selects one of:
+
+- `rpi`     — RPi.GPIO itself (edge interrupts supported).
+- `gpiomem` — `GpioMemDriver`: writes the BCM283x/BCM2711 GPSET/GPCLR/GPLEV
+  registers directly through an mmap of /dev/gpiomem. Lowest per-call cost;
+  no interrupts, so `HX711` polls DOUT.
+- `chardev` — `CharDevDriver`: the kernel GPIO character device via libgpiod
+  v2 bindings (`pip install gpiod`), with falling-edge events on a thread.
+- `fake`    — `FakeGPIO` below, for machines without a Pi.
+
+`python3 gpio_drivers.py [backend ...]` runs `benchmark` for each backend and
+prints per-pulse high time and per-sample clock-out time statistics, so the
+lowest-jitter backend can be picked for a given Pi.
+
+FakeGPIO
+--------
+An in-memory GPIO with simulated HX711 chips attached, so the driver, the
+backend sampler and the edge-triggered ready detection can be exercised on a
+plain Linux machine:
+
+    gpio = FakeGPIO([FakeHX711Chip(dout=5, sck=6, sps=80, value=lambda t, ch: 8000)])
+    hx = HX711(5, 6, gpio=gpio)
+
+Each chip finishes a conversion every 1/sps seconds and pulls DOUT low
+(firing falling-edge callbacks), shifts its 24-bit value out MSB first on
+PD_SCK rising edges, and reads the extra pulses after bit 24 as the channel/gain
+for the next conversion. Like the real chip, the first `settle` conversions
+after a channel or gain change are not valid yet: they repeat the last value
+of the previous selection. A PD_SCK high time over 60 us is counted in
+`timing_violations` (the real chip would power down). `edge_detect=False`
+makes `add_event_detect` fail like it does on kernels without edge support.
+"""
+
+import argparse
+import mmap
+import os
+import statistics
+import sys
+import threading
+import time
+
+# RPi.GPIO-compatible constants
+BCM = 11
+BOARD = 10
+OUT = 0
+IN = 1
+LOW = 0
+HIGH = 1
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+RISING = 31
+FALLING = 32
+BOTH = 33
+
+MAX_SCK_HIGH_S = 60e-6
+
+# Pulses after the 24 data bits -> (channel, gain) of the next conversion
+GAIN_BY_PULSES = {1: ("A", 128), 2: ("B", 32), 3: ("A", 64)}
+SETTLE_CONVERSIONS = 4   # conversions after a channel/gain change before the output is valid
+
+
+class FakeHX711Chip:
+    def __init__(self, dout, sck, sps=80.0, value=None, settle=SETTLE_CONVERSIONS):
+        """
+        Args:
+            dout (int): BCM pin of this chip's DOUT
+            sck (int): BCM pin of PD_SCK (may be shared with other chips)
+            sps (float): Conversion rate (the real chip runs at 10 or 80)
+            value: Raw value per conversion, either a constant or `value(t, channel)`
+            settle (int): Invalid conversions after a channel/gain change
+        """
+        self.dout = dout
+        self.sck = sck
+        self.period = 1.0 / sps
+        self.value = value if callable(value) else (lambda t, channel, v=value or 0: v)
+        self.channel = "A"
+        self.gain = 128
+        self.settle = settle
+        self.conversions = 0
+        self.unsettled = 0           # conversions still settling after the last switch
+        self.timing_violations = 0
+        self.level = HIGH            # DOUT
+        self._data = 0
+        self._pulses = None          # PD_SCK pulses since the last conversion (None = idle)
+        self._high_at = None
+
+    def convert(self, now):
+        """Latch a new conversion; True if DOUT went from high to low."""
+        if self._pulses is not None and 0 < self._pulses <= 24:
+            return False             # mid read-out: the chip waits for the host
+        if self._pulses is not None and self._pulses > 24:
+            # Pulses 25..27 after the last read-out selected this conversion's channel and gain
+            selected = GAIN_BY_PULSES.get(self._pulses - 24, ("A", 128))
+            if selected != (self.channel, self.gain):
+                self.unsettled = self.settle
+            self.channel, self.gain = selected
+        if self.unsettled:
+            self.unsettled -= 1      # keep outputting the previous selection's value
+        else:
+            self._data = int(self.value(now, self.channel)) & 0xFFFFFF
+        self._pulses = 0
+        self.conversions += 1
+        fell = self.level == HIGH
+        self.level = LOW
+        return fell
+
+    def clock(self, level, now):
+        """PD_SCK edge; returns the new DOUT level."""
+        if level == HIGH:
+            self._high_at = now
+            if self._pulses is None:
+                return self.level
+            if self._pulses < 24:
+                self.level = (self._data >> (23 - self._pulses)) & 1
+            else:
+                self.level = HIGH
+            self._pulses += 1
+        else:
+            if self._high_at is not None and now - self._high_at > MAX_SCK_HIGH_S:
+                self.timing_violations += 1
+            self._high_at = None
+        return self.level
+
+
+class FakeGPIO:
+    BCM = BCM
+    BOARD = BOARD
+    OUT = OUT
+    IN = IN
+    LOW = LOW
+    HIGH = HIGH
+    PUD_OFF = PUD_OFF
+    PUD_DOWN = PUD_DOWN
+    PUD_UP = PUD_UP
+    RISING = RISING
+    FALLING = FALLING
+    BOTH = BOTH
+
+    def __init__(self, chips=(), edge_detect=True):
+        """
+        Args:
+            chips: `FakeHX711Chip`s wired to this GPIO
+            edge_detect (bool): False makes `add_event_detect` raise RuntimeError
+        """
+        self.chips = list(chips)
+        self.edge_detect = edge_detect
+        self._mode = None
+        self._levels = {}
+        self._callbacks = {}
+        self._lock = threading.RLock()
+        self._timer = None
+        self._running = False
+
+    # ----- RPi.GPIO API -----
+    def setmode(self, mode):
+        self._mode = mode
+
+    def getmode(self):
+        return self._mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, initial=None, pull_up_down=None):
+        with self._lock:
+            if direction == OUT:
+                self._levels[pin] = initial or LOW
+            for chip in self.chips:
+                if chip.dout == pin:
+                    self._levels[pin] = chip.level
+        self._start_timer()
+
+    def output(self, pin, value):
+        now = time.perf_counter()
+        value = HIGH if value else LOW
+        with self._lock:
+            self._levels[pin] = value
+            for chip in self.chips:
+                if chip.sck == pin:
+                    self._set_input(chip.dout, chip.clock(value, now))
+
+    def input(self, pin):
+        return self._levels.get(pin, LOW)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        if not self.edge_detect:
+            raise RuntimeError("Failed to add edge detection")
+        with self._lock:
+            self._callbacks[pin] = (edge, [callback] if callback else [])
+
+    def add_event_callback(self, pin, callback):
+        self._callbacks[pin][1].append(callback)
+
+    def remove_event_detect(self, pin):
+        self._callbacks.pop(pin, None)
+
+    def cleanup(self, *pins):
+        self._running = False
+        self._callbacks.clear()
+
+    # ----- Simulation -----
+    def _set_input(self, pin, level):
+        previous = self._levels.get(pin)
+        self._levels[pin] = level
+        edge, callbacks = self._callbacks.get(pin, (None, ()))
+        fell = previous == HIGH and level == LOW
+        rose = previous == LOW and level == HIGH
+        if (fell and edge in (FALLING, BOTH)) or (rose and edge in (RISING, BOTH)):
+            for callback in callbacks:
+                callback(pin)
+
+    def _start_timer(self):
+        if self._timer is not None or not self.chips:
+            return
+        self._running = True
+        self._timer = threading.Thread(target=self._convert_loop, name="fake-hx711", daemon=True)
+        self._timer.start()
+
+    def _convert_loop(self):
+        period = min(chip.period for chip in self.chips)
+        next_t = time.perf_counter()
+        while self._running:
+            next_t += period
+            time.sleep(max(0.0, next_t - time.perf_counter()))
+            now = time.perf_counter()
+            with self._lock:
+                for chip in self.chips:
+                    if chip.convert(now):
+                        self._set_input(chip.dout, LOW)
+                    else:
+                        self._levels[chip.dout] = chip.level
+
+
+class GpioMemDriver:
+    """RPi.GPIO-compatible access to the GPIO registers through /dev/gpiomem."""
+    BCM = BCM
+    OUT = OUT
+    IN = IN
+    LOW = LOW
+    HIGH = HIGH
+    PUD_OFF = PUD_OFF
+    PUD_DOWN = PUD_DOWN
+    PUD_UP = PUD_UP
+    RISING = RISING
+    FALLING = FALLING
+    BOTH = BOTH
+
+    # Register word offsets (BCM2835/2711 peripheral datasheets)
+    GPFSEL0 = 0x00 // 4
+    GPSET0 = 0x1C // 4
+    GPCLR0 = 0x28 // 4
+    GPLEV0 = 0x34 // 4
+
+    def __init__(self, path="/dev/gpiomem"):
+        fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        try:
+            self._mem = mmap.mmap(fd, 4096, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        self._regs = memoryview(self._mem).cast("I")
+        self._mode = None
+
+    def setmode(self, mode):
+        if mode != BCM:
+            raise ValueError("GpioMemDriver only supports BCM numbering")
+        self._mode = mode
+
+    def getmode(self):
+        return self._mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, initial=None, pull_up_down=None):
+        # Pulls are left as they are (the HX711 DOUT is push-pull, set up with PUD_OFF)
+        reg = self.GPFSEL0 + pin // 10
+        shift = (pin % 10) * 3
+        if direction == OUT and initial is not None:
+            self.output(pin, initial)
+        self._regs[reg] = (self._regs[reg] & ~(0b111 << shift)) | ((1 if direction == OUT else 0) << shift)
+
+    def output(self, pin, value):
+        self._regs[(self.GPSET0 if value else self.GPCLR0) + (pin >> 5)] = 1 << (pin & 31)
+
+    def input(self, pin):
+        return (self._regs[self.GPLEV0 + (pin >> 5)] >> (pin & 31)) & 1
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        raise RuntimeError("/dev/gpiomem has no edge interrupts")
+
+    def remove_event_detect(self, pin):
+        pass
+
+    def cleanup(self, *pins):
+        self._regs.release()
+        self._mem.close()
+
+
+class CharDevDriver:
+    """RPi.GPIO-compatible access through the GPIO character device (libgpiod v2)."""
+    BCM = BCM
+    OUT = OUT
+    IN = IN
+    LOW = LOW
+    HIGH = HIGH
+    PUD_OFF = PUD_OFF
+    PUD_DOWN = PUD_DOWN
+    PUD_UP = PUD_UP
+    RISING = RISING
+    FALLING = FALLING
+    BOTH = BOTH
+
+    def __init__(self, chip="/dev/gpiochip0", consumer="rehagrip-hx711"):
+        try:
+            import gpiod
+            from gpiod.line import Direction, Edge, Value
+        except ImportError as e:
+            raise RuntimeError(f"libgpiod v2 Python bindings not available ({e})")
+        self._gpiod = gpiod
+        self._Direction, self._Edge, self._Value = Direction, Edge, Value
+        self.chip = chip
+        self.consumer = consumer
+        self._requests = {}
+        self._watchers = {}
+        self._mode = None
+
+    def setmode(self, mode):
+        if mode != BCM:
+            raise ValueError("CharDevDriver only supports BCM (line offset) numbering")
+        self._mode = mode
+
+    def getmode(self):
+        return self._mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def _request(self, pin, **settings):
+        if pin in self._requests:
+            self._requests[pin].release()
+        self._requests[pin] = self._gpiod.request_lines(
+            self.chip, consumer=self.consumer,
+            config={pin: self._gpiod.LineSettings(**settings)},
+        )
+
+    def setup(self, pin, direction, initial=None, pull_up_down=None):
+        if direction == OUT:
+            self._request(pin, direction=self._Direction.OUTPUT,
+                          output_value=self._Value.ACTIVE if initial else self._Value.INACTIVE)
+        else:
+            self._request(pin, direction=self._Direction.INPUT)
+
+    def output(self, pin, value):
+        self._requests[pin].set_value(pin, self._Value.ACTIVE if value else self._Value.INACTIVE)
+
+    def input(self, pin):
+        return 1 if self._requests[pin].get_value(pin) == self._Value.ACTIVE else 0
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        edges = {RISING: self._Edge.RISING, FALLING: self._Edge.FALLING, BOTH: self._Edge.BOTH}
+        self._request(pin, direction=self._Direction.INPUT, edge_detection=edges[edge])
+        request = self._requests[pin]
+        running = threading.Event()
+        running.set()
+
+        def watch():
+            while running.is_set():
+                if request.wait_edge_events(0.5):
+                    request.read_edge_events()
+                    if callback:
+                        callback(pin)
+        self._watchers[pin] = running
+        threading.Thread(target=watch, name=f"gpio-edge-{pin}", daemon=True).start()
+
+    def remove_event_detect(self, pin):
+        running = self._watchers.pop(pin, None)
+        if running:
+            running.clear()
+
+    def cleanup(self, *pins):
+        for pin in list(self._watchers):
+            self.remove_event_detect(pin)
+        for request in self._requests.values():
+            request.release()
+        self._requests.clear()
+
+
+def open_gpio(name, dout=None, sck=None):
+    """
+    GPIO backend by name ("rpi", "gpiomem", "chardev" or "fake").
+
+    Args:
+        dout (int or list), sck (int): Pins of the simulated chip(s) (only used by "fake";
+            a list of DOUT pins simulates several boards sharing PD_SCK)
+    """
+    if name == "rpi":
+        try:
+            import RPi.GPIO as GPIO
+        except ImportError as e:
+            raise RuntimeError(f"RPi.GPIO is not available on this machine ({e})")
+        return GPIO
+    if name == "gpiomem":
+        return GpioMemDriver()
+    if name == "chardev":
+        return CharDevDriver()
+    if name == "fake":
+        douts = dout if isinstance(dout, (list, tuple)) else [dout]
+        return FakeGPIO([FakeHX711Chip(pin, sck) for pin in douts])
+    raise ValueError(f"Unknown GPIO backend '{name}' (rpi, gpiomem, chardev, fake)")
+
+
+def _stats_us(values):
+    ordered = sorted(values)
+    return {
+        "mean": statistics.fmean(ordered) * 1e6,
+        "stdev": statistics.pstdev(ordered) * 1e6,
+        "p99": ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1e6,
+        "max": ordered[-1] * 1e6,
+    }
+
+
+def benchmark(gpio, dout=5, sck=6, samples=200, pulses=2000, sps=80.0):
+    """
+    Time PD_SCK pulses and full HX711 clock-outs on one backend.
+
+    Args:
+        sps (float): HX711 conversion rate; bare pulses are only sent in the first
+            half of a conversion period, right after a read-out
+
+    Returns:
+        dict with "pulse_high_us" and "clockout_us" stats (mean, stdev, p99, max),
+        the number of pulses over the 60 us limit, and whether edge interrupts work
+    """
+    from read_loadcell import HX711
+
+    hx711 = HX711(dout, sck, gpio=gpio)
+    perf = time.perf_counter
+
+    # Upper bound on PD_SCK high time: one HIGH+LOW pair, timed from outside.
+    # A pulse while DOUT is low would clock out a data bit, so each burst starts
+    # right after a read-out, stays well inside the conversion period and every
+    # pulse is gated on DOUT still being high.
+    highs = []
+    window = 0.5 / sps
+    while len(highs) < pulses:
+        if not hx711.wait_ready(1.0):
+            raise RuntimeError("HX711 timeout - check connections")
+        hx711.read()
+        deadline = perf() + window
+        while len(highs) < pulses and perf() < deadline and not hx711.is_ready():
+            t0 = perf()
+            gpio.output(sck, HIGH)
+            gpio.output(sck, LOW)
+            highs.append(perf() - t0)
+
+    clockouts = []
+    for _ in range(samples):
+        hx711.wait_ready(1.0)
+        t0 = perf()
+        hx711.read()
+        clockouts.append(perf() - t0)
+
+    result = {
+        "pulse_high_us": _stats_us(highs),
+        "clockout_us": _stats_us(clockouts),
+        "pulses_over_60us": sum(h > MAX_SCK_HIGH_S for h in highs),
+        "edge_triggered": hx711.edge_triggered,
+    }
+    hx711.cleanup()
+    return result
+
+
+if __name__ == "__main__":
+    # Make read_loadcell importable when run from elsewhere
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Benchmark GPIO backends for HX711 bit-banging")
+    parser.add_argument("backends", nargs="*", default=["rpi", "gpiomem", "chardev"])
+    parser.add_argument("--dout", type=int, default=5)
+    parser.add_argument("--sck", type=int, default=6)
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'Backend':<9} | {'Pulse high us (mean/p99/max)':<30} | {'Clock-out us (mean/stdev/max)':<30} | {'>60us':<6} | Edge")
+    print("-" * 92)
+    for name in args.backends:
+        try:
+            r = benchmark(open_gpio(name, args.dout, args.sck), args.dout, args.sck, args.samples)
+        except Exception as e:
+            print(f"{name:<9} | unavailable: {e}")
+            continue
+        p, c = r["pulse_high_us"], r["clockout_us"]
+        print(f"{name:<9} | {p['mean']:8.2f} / {p['p99']:8.2f} / {p['max']:8.2f} | "
+              f"{c['mean']:8.1f} / {c['stdev']:7.1f} / {c['max']:8.1f} | "
+              f"{r['pulses_over_60us']:<6} | {'yes' if r['edge_triggered'] else 'no'}")
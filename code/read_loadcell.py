@@ -5,14 +5,22 @@ Optimized for Raspberry Pi 4 Model B
 Reads force measurements from a 20kg load cell
 """
 
-import RPi.GPIO as GPIO
+try:
+    import RPi.GPIO as GPIO
+except ImportError:  # not on a Raspberry Pi; HX711() will refuse to start
+    GPIO = None
+import os
+import threading
 import time
 import statistics
 import sys
 import signal
 
+MAX_SCK_HIGH_S = 60e-6  # PD_SCK high longer than this powers the HX711 down
+SETTLE_CONVERSIONS = 4  # conversions after a channel/gain change before the output is valid
+
 class HX711:
-    def __init__(self, dout_pin, pd_sck_pin, gain=128):
+    def __init__(self, dout_pin, pd_sck_pin, gain=128, gpio=None, edge_triggered=True):
         """
         Initialize HX711 load cell amplifier for Raspberry Pi 4
         
@@ -20,20 +28,30 @@ class HX711:
             dout_pin (int): GPIO pin connected to HX711 DOUT (BCM numbering)
             pd_sck_pin (int): GPIO pin connected to HX711 PD_SCK (BCM numbering)
             gain (int): Amplification gain (128, 64, or 32)
+            gpio: Object with the RPi.GPIO API (default: RPi.GPIO; see gpio_drivers.py)
+            edge_triggered (bool): Wait for DOUT-ready on a falling-edge interrupt
+                instead of polling (falls back to polling if edge detection fails)
         """
+        self.gpio = gpio or GPIO
+        if self.gpio is None:
+            raise RuntimeError("RPi.GPIO is not available on this machine")
         self.PD_SCK = pd_sck_pin
         self.DOUT = dout_pin
         self.gain = gain
+        self._ready = threading.Event()
+        self.timing_violations = 0   # reads with a PD_SCK pulse over MAX_SCK_HIGH_S
+        self.last_max_high_s = 0.0
         
         # Setup GPIO with Pi 4 optimizations
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)  # Suppress warnings for Pi 4
-        GPIO.setup(self.PD_SCK, GPIO.OUT, initial=GPIO.LOW)
-        GPIO.setup(self.DOUT, GPIO.IN, pull_up_down=GPIO.PUD_OFF)
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setwarnings(False)  # Suppress warnings for Pi 4
+        self.gpio.setup(self.PD_SCK, self.gpio.OUT, initial=self.gpio.LOW)
+        self.gpio.setup(self.DOUT, self.gpio.IN, pull_up_down=self.gpio.PUD_OFF)
+        self.edge_triggered = edge_triggered and self._enable_edge_detect()
         
         # Power up and stabilize
         time.sleep(0.1)
-        GPIO.output(self.PD_SCK, False)
+        self.gpio.output(self.PD_SCK, False)
         
         # Initial read to set gain and stabilize
         for _ in range(3):
@@ -48,32 +66,74 @@ class HX711:
         self.scale = 1 
         
         
+    def _enable_edge_detect(self):
+        """Register a DOUT falling-edge callback; False if the platform can't do it"""
+        try:
+            self.gpio.add_event_detect(self.DOUT, self.gpio.FALLING, callback=self._on_dout_falling)
+            return True
+        except (RuntimeError, AttributeError, ValueError) as e:
+            print(f"Edge detection unavailable on GPIO {self.DOUT} ({e}); polling DOUT instead")
+            return False
+
+    def _on_dout_falling(self, channel):
+        self._ready.set()
+
     def is_ready(self):
         """Check if HX711 is ready for reading (optimized for Pi 4)"""
-        return GPIO.input(self.DOUT) == GPIO.LOW
+        return self.gpio.input(self.DOUT) == self.gpio.LOW
+
+    def wait_ready(self, timeout=1.0):
+        """Block until DOUT signals a finished conversion; False on timeout"""
+        if self.is_ready():
+            return True
+        if self.edge_triggered:
+            # Data bits clocked out during the last read also produce falling edges,
+            # so forget those and re-check before sleeping on the interrupt
+            self._ready.clear()
+            if self.is_ready():
+                return True
+            return self._ready.wait(timeout) or self.is_ready()
+
+        deadline = time.time() + timeout
+        while not self.is_ready():
+            if time.time() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
     
     def read(self):
         """Read raw value from HX711 (optimized timing for Pi 4)"""
 
-        timeout = time.time() + 1.0
-        while not self.is_ready():
-            if time.time() > timeout:
-                raise Exception("HX711 timeout - check connections")
-            time.sleep(0.001)
-        
+        if not self.wait_ready(1.0):
+            raise Exception("HX711 timeout - check connections")
 
+        # Bind everything locally: attribute lookups inside the loop stretch PD_SCK high time
+        output, read_pin = self.gpio.output, self.gpio.input
+        sck, dout = self.PD_SCK, self.DOUT
+        high, low = self.gpio.HIGH, self.gpio.LOW
+        perf = time.perf_counter
+        max_high = 0.0
         count = 0
         for i in range(24):
-            GPIO.output(self.PD_SCK, GPIO.HIGH)
+            t0 = perf()
+            output(sck, high)
             count = count << 1
-            GPIO.output(self.PD_SCK, GPIO.LOW)
-            if GPIO.input(self.DOUT) == GPIO.HIGH:
+            output(sck, low)
+            # Upper bound on the high time (both output calls included)
+            max_high = max(max_high, perf() - t0)
+            if read_pin(dout) == high:
                 count += 1
         
         # Set gain for next reading
         for i in range(self.gain_pulses()):
-            GPIO.output(self.PD_SCK, GPIO.HIGH)
-            GPIO.output(self.PD_SCK, GPIO.LOW)
+            t0 = perf()
+            output(sck, high)
+            output(sck, low)
+            max_high = max(max_high, perf() - t0)
+
+        self.last_max_high_s = max_high
+        if max_high > MAX_SCK_HIGH_S:
+            self.timing_violations += 1
         
         # Convert to signed 24-bit value
         if count & 0x800000:
@@ -92,13 +152,22 @@ class HX711:
         else:
             return 1
     
+    def stream(self):
+        """Yield raw values as conversions complete; each conversion is used exactly once"""
+        while True:
+            yield self.read()
+
+    def read_samples(self, times=10):
+        """Read the next `times` consecutive conversions (no delay between them)"""
+        return [self.read() for _ in range(times)]
+
     def read_average(self, times=10):
         """Read average of multiple readings"""
-        values = []
-        for _ in range(times):
-            values.append(self.read())
-            time.sleep(0.01)
-        return sum(values) / len(values)
+        return statistics.fmean(self.read_samples(times))
+
+    def to_kg(self, raw_value):
+        """Convert a raw (or averaged raw) value to kg with the current offset/scale"""
+        return (raw_value - self.offset) * self.scale
     
     def tare(self, times=10):
         """Set the current reading as zero offset"""
@@ -125,9 +194,7 @@ class HX711:
     
     def get_weight(self, times=5):
         """Get calibrated weight reading in kg"""
-        raw_value = self.read_average(times)
-        weight = (raw_value - self.offset) * self.scale
-        return weight
+        return self.to_kg(self.read_average(times))
     
     def get_force_newtons(self, times=5):
         """Get force reading in Newtons (weight * 9.81)"""
@@ -139,7 +206,11 @@ class HX711:
         Get comprehensive force analysis with compression/tension breakdown
         Returns: dict with force measurements and analysis
         """
-        weight_kg = self.get_weight(times)
+        return self.analyze(self.get_weight(times))
+
+    @staticmethod
+    def analyze(weight_kg):
+        """Force analysis dict (see get_force_analysis) for an already measured weight"""
         force_n = weight_kg * 9.81
         
         # Determine force type and magnitude
@@ -170,7 +241,182 @@ class HX711:
     
     def cleanup(self):
         """Clean up GPIO"""
-        GPIO.cleanup()
+        if self.edge_triggered:
+            self.gpio.remove_event_detect(self.DOUT)
+        self.gpio.cleanup()
+
+
+class HX711Array:
+    # (channel, gain) -> PD_SCK pulses after the 24 data bits
+    PULSES = {("A", 128): 1, ("B", 32): 2, ("A", 64): 3}
+
+    def __init__(self, dout_pins, pd_sck_pin, channels=(("A", 128),), gpio=None, edge_triggered=True,
+                 dwell=8, settle=SETTLE_CONVERSIONS):
+        """
+        Several HX711 boards sharing one PD_SCK line, read in a single clocking pass
+
+        Every chip sees the same 24 + gain pulses, so one pass clocks all of them
+        out at once: after each falling edge every DOUT pin is sampled. The gain
+        pulses select the channel of the *next* conversion, so with more than one
+        entry in `channels` the array cycles between them (e.g. channel A of every
+        board, then channel B) and each read reports which channel it holds.
+
+        After a channel or gain change the HX711 needs `settle` conversions before
+        its output is valid (50 ms at 80 SPS, 400 ms at 10 SPS). The array therefore
+        dwells on each channel for `dwell` valid reads and silently discards the
+        first `settle` conversions after every switch (and after power-up, when the
+        chips' channel is unknown). With two channels at 80 SPS and the defaults,
+        each channel gets 80 * 8 / (2 * 12) = ~27 samples/s, in bursts.
+
+        Args:
+            dout_pins (list): DOUT pin of each board (BCM numbering)
+            pd_sck_pin (int): Shared PD_SCK pin
+            channels (list): (channel, gain) pairs to cycle through: ("A", 128), ("A", 64), ("B", 32)
+            gpio: Object with the RPi.GPIO API (default: RPi.GPIO)
+            edge_triggered (bool): Wait for DOUT-ready on falling-edge interrupts
+            dwell (int): Valid reads taken on a channel before switching to the next one
+            settle (int): Conversions discarded after each channel switch
+        """
+        if dwell < 1 or settle < 0:
+            raise ValueError("dwell must be >= 1 and settle >= 0")
+        self.gpio = gpio or GPIO
+        if self.gpio is None:
+            raise RuntimeError("RPi.GPIO is not available on this machine")
+        for channel in channels:
+            if tuple(channel) not in self.PULSES:
+                raise ValueError(f"Unsupported channel/gain {channel}; use A/128, A/64 or B/32")
+        self.DOUTS = list(dout_pins)
+        self.PD_SCK = pd_sck_pin
+        self.channels = [tuple(c) for c in channels]
+        self.dwell = dwell
+        self.settle = settle
+        self.discarded = 0               # unsettled conversions thrown away
+        self._ready = threading.Event()
+        self.timing_violations = 0
+        self.last_max_high_s = 0.0
+
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setwarnings(False)
+        self.gpio.setup(self.PD_SCK, self.gpio.OUT, initial=self.gpio.LOW)
+        for dout in self.DOUTS:
+            self.gpio.setup(dout, self.gpio.IN, pull_up_down=self.gpio.PUD_OFF)
+        self.edge_triggered = edge_triggered and self._enable_edge_detect()
+
+        self._converting = ("A", 128)    # power-up default
+        self._index = 0                  # position of the selected channel in `channels`
+        self._age = 0                    # conversions on `_converting` since it was selected
+        self._kept = 0                   # valid reads returned since then
+        time.sleep(0.1)
+        self.gpio.output(self.PD_SCK, False)
+
+        # The chips keep their last channel selection across restarts; the first
+        # read selects channels[0] and waits out its settling, so every later read
+        # knows which channel it is clocking out
+        for _ in range(3):
+            try:
+                self.read()
+                break
+            except Exception:
+                time.sleep(0.1)
+
+    def _enable_edge_detect(self):
+        try:
+            for dout in self.DOUTS:
+                self.gpio.add_event_detect(dout, self.gpio.FALLING, callback=self._on_dout_falling)
+            return True
+        except (RuntimeError, AttributeError, ValueError) as e:
+            for dout in self.DOUTS:
+                try:
+                    self.gpio.remove_event_detect(dout)
+                except Exception:
+                    pass
+            print(f"Edge detection unavailable on GPIO {self.DOUTS} ({e}); polling DOUT instead")
+            return False
+
+    def _on_dout_falling(self, channel):
+        self._ready.set()
+
+    def is_ready(self):
+        """True when every board has a finished conversion"""
+        low, read_pin = self.gpio.LOW, self.gpio.input
+        return all(read_pin(dout) == low for dout in self.DOUTS)
+
+    def wait_ready(self, timeout=1.0):
+        """Block until all boards signal a finished conversion; False on timeout"""
+        deadline = time.time() + timeout
+        while not self.is_ready():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            if self.edge_triggered:
+                self._ready.clear()
+                if not self.is_ready():
+                    self._ready.wait(remaining)
+            else:
+                time.sleep(0.001)
+        return True
+
+    def read(self):
+        """
+        Clock out the next settled conversion from every board
+
+        Returns:
+            (channel, gain) the values were converted on, and a list of signed
+            24-bit values in `dout_pins` order
+        """
+        while True:
+            channel, values, settled = self._clock_out()
+            if settled:
+                return channel, values
+            self.discarded += 1
+
+    def _clock_out(self):
+        """One clocking pass: (channel, values, settled) of the conversion just read"""
+        if not self.wait_ready(1.0):
+            raise Exception("HX711 timeout - check connections")
+
+        output, read_pin = self.gpio.output, self.gpio.input
+        sck, douts = self.PD_SCK, self.DOUTS
+        high, low = self.gpio.HIGH, self.gpio.LOW
+        perf = time.perf_counter
+        max_high = 0.0
+        counts = [0] * len(douts)
+        for _ in range(24):
+            t0 = perf()
+            output(sck, high)
+            output(sck, low)
+            max_high = max(max_high, perf() - t0)
+            # Bits are valid from the rising edge until the next one
+            counts = [(c << 1) | (read_pin(d) == high) for c, d in zip(counts, douts)]
+
+        channel = self._converting
+        settled = self._age >= self.settle
+        self._kept += settled
+        if channel != self.channels[self._index] or (len(self.channels) > 1 and self._kept >= self.dwell):
+            # Switch: the next conversion is the first on the new channel
+            if channel == self.channels[self._index]:
+                self._index = (self._index + 1) % len(self.channels)
+            self._kept = 0
+            self._age = 0
+        else:
+            self._age += 1
+        self._converting = self.channels[self._index]
+        for _ in range(self.PULSES[self._converting]):
+            t0 = perf()
+            output(sck, high)
+            output(sck, low)
+            max_high = max(max_high, perf() - t0)
+
+        self.last_max_high_s = max_high
+        if max_high > MAX_SCK_HIGH_S:
+            self.timing_violations += 1
+        return channel, [c - 0x1000000 if c & 0x800000 else c for c in counts], settled
+
+    def cleanup(self):
+        if self.edge_triggered:
+            for dout in self.DOUTS:
+                self.gpio.remove_event_detect(dout)
+        self.gpio.cleanup()
 
 
 class LoadCellMonitor:
@@ -279,19 +525,27 @@ class LoadCellMonitor:
         print("-" * 80)
         
         start_time = time.time()
+        next_print = start_time + 0.5
+        window = []
         try:
-            while True:
-                analysis = self.hx711.get_force_analysis(3)
-                current_time = time.time() - start_time
+            # Every conversion goes into exactly one printed row (averaged per 0.5 s)
+            for raw in self.hx711.stream():
+                window.append(raw)
+                now = time.time()
+                if now < next_print:
+                    continue
+                next_print = now + 0.5
+                raw_average = statistics.fmean(window)
+                window = []
+                analysis = self.hx711.analyze(self.hx711.to_kg(raw_average))
+                current_time = now - start_time
                 
                 # Format the display
                 magnitude_str = f"{analysis['magnitude_kg']:.3f} / {analysis['magnitude_n']:.1f}"
                 compression_str = f"{analysis['compression_kg']:.3f} / {analysis['compression_n']:.1f}"
                 tension_str = f"{analysis['tension_kg']:.3f} / {analysis['tension_n']:.1f}"
-                raw_reading = self.hx711.read()
                 
-                print(f"{current_time:8.1f} | {analysis['force_type']:<11} | {magnitude_str:<12} | {compression_str:<12} | {tension_str:<12} | {raw_reading:<8d}")
-                time.sleep(0.5)
+                print(f"{current_time:8.1f} | {analysis['force_type']:<11} | {magnitude_str:<12} | {compression_str:<12} | {tension_str:<12} | {raw_average:<8.0f}")
                 
         except KeyboardInterrupt:
             print("\nStopping monitor...")
@@ -305,8 +559,8 @@ class LoadCellMonitor:
         print("\n=== Single Force Reading ===")
         print("Taking measurement...")
         
-        analysis = self.hx711.get_force_analysis(times=10)
         raw = self.hx711.read_average(10)
+        analysis = self.hx711.analyze(self.hx711.to_kg(raw))
         
         print(f"\nDetailed Force Analysis:")
         print(f"{'='*40}")
@@ -334,6 +588,42 @@ class LoadCellMonitor:
         
         return analysis
 
+    def show_system_info(self):
+        """Display system information for debugging"""
+        print("\n=== System Information ===")
+        try:
+            with open('/proc/cpuinfo', 'r') as f:
+                for line in f:
+                    if 'Model' in line:
+                        print(f"Pi Model: {line.split(':')[1].strip()}")
+                        break
+        except:
+            print("Pi Model: Unknown")
+        
+        print(f"Python version: {sys.version.split()[0]}")
+        print(f"GPIO mode: {self.hx711.gpio.getmode()}")
+        print(f"DOUT-ready detection: {'edge interrupt' if self.hx711.edge_triggered else 'polling'}")
+        print(f"Current offset: {self.hx711.offset}")
+        print(f"Current scale: {self.hx711.scale}")
+        
+        # Test GPIO pins
+        print(f"\nGPIO Pin Status:")
+        print(f"DOUT (GPIO {self.hx711.DOUT}): {'Ready' if self.hx711.is_ready() else 'Not Ready'}")
+        
+        # Raw reading test
+        try:
+            raw = self.hx711.read_average(3)
+            analysis = self.hx711.analyze(self.hx711.to_kg(raw))
+            print(f"Current reading: {analysis['force_type']} - {analysis['magnitude_kg']:.3f}kg")
+            print(f"Raw value: {raw:.0f}")
+        except Exception as e:
+            print(f"Reading error: {e}")
+        
+        print(f"\nForce Analysis:")
+        print(f"  Compression threshold: >0.05 kg")
+        print(f"  Tension threshold: <-0.05 kg")
+        print(f"  Neutral zone: ±0.05 kg")
+
 
 def main():
     """Main program optimized for Raspberry Pi 4"""
@@ -408,40 +698,5 @@ def main():
             pass
 
 
-    def show_system_info(self):
-        """Display system information for debugging"""
-        print("\n=== System Information ===")
-        try:
-            with open('/proc/cpuinfo', 'r') as f:
-                for line in f:
-                    if 'Model' in line:
-                        print(f"Pi Model: {line.split(':')[1].strip()}")
-                        break
-        except:
-            print("Pi Model: Unknown")
-        
-        print(f"Python version: {sys.version.split()[0]}")
-        print(f"GPIO mode: {GPIO.getmode()}")
-        print(f"Current offset: {self.hx711.offset}")
-        print(f"Current scale: {self.hx711.scale}")
-        
-        # Test GPIO pins
-        print(f"\nGPIO Pin Status:")
-        print(f"DOUT (GPIO {self.hx711.DOUT}): {'Ready' if self.hx711.is_ready() else 'Not Ready'}")
-        
-        # Raw reading test
-        try:
-            analysis = self.hx711.get_force_analysis(3)
-            print(f"Current reading: {analysis['force_type']} - {analysis['magnitude_kg']:.3f}kg")
-            print(f"Raw value: {self.hx711.read()}")
-        except Exception as e:
-            print(f"Reading error: {e}")
-        
-        print(f"\nForce Analysis:")
-        print(f"  Compression threshold: >0.05 kg")
-        print(f"  Tension threshold: <-0.05 kg")
-        print(f"  Neutral zone: ±0.05 kg")
-
 if __name__ == "__main__":
-    import os
     main()
\ No newline at end of file